@@ -1,8 +1,10 @@
 """Tool-call correction utilities.
 
 Corrects hallucinated tool names and argument names emitted by small open-weight
-models before the tool is actually invoked.  All functions are pure / stateless
-and operate only on the tool-call dict and the tool_map.
+models before the tool is actually invoked.  All functions are pure and operate
+only on the tool-call dict and the tool_map; the only state is a cache of
+compiled lookups (fuzzy_index per tool-name set, schema keys per tool), which
+never changes a result.
 
 Shared core
 -----------
@@ -10,10 +12,15 @@ correct_tool_name(name, tool_map)
     Alias table + difflib fuzzy → used by both exec-time _fix_tool_name
     and plan-time fix_plan_tool_names.  Add new aliases here once and both
     paths benefit automatically.
+
+The fuzzy step goes through agent/base/fuzzy_index.py: same matches as
+difflib.get_close_matches(n=1), with length / character pruning and an LRU.
 """
 
-import difflib
 import re
+import weakref
+
+from agent.base.fuzzy_index import FuzzyIndex, fuzzy_index
 
 # ---------------------------------------------------------------------------
 # Tool name correction
@@ -60,6 +67,9 @@ _TOOL_NAME_ALIAS: dict[str, str] = {
     "fetch_url":                 "fetch_page",
     "open_url":                  "fetch_page",
     "browse_url":                "fetch_page",
+    "fetch_urls":                "fetch_pages",
+    "fetch_multiple_pages":      "fetch_pages",
+    "get_pages":                 "fetch_pages",
     # time
     "current_time":              "get_current_datetime",
     "get_time":                  "get_current_datetime",
@@ -69,11 +79,22 @@ _TOOL_NAME_ALIAS: dict[str, str] = {
     "sql_query":                 "query",
     "execute_sql":               "query",
     "run_sql":                   "query",
+    "insert_many":               "bulk_insert",
+    "insert_rows":               "bulk_insert",
+    "batch_insert":              "bulk_insert",
+    "execute_many":              "bulk_insert",
+    "executemany":               "bulk_insert",
     # memory
     "store_memory":              "remember",
     "save_memory":               "remember",
     "get_memory":                "recall",
+    "get_memories":              "recall_many",
+    "recall_multiple":           "recall_many",
+    "recall_keys":               "recall_many",
     "retrieve_memory":           "recall",
+    "find_memory":               "search_memories",
+    "find_memories":             "search_memories",
+    "query_memories":            "search_memories",
     "delete_memory":             "forget",
     "remove_memory":             "forget",
 }
@@ -99,9 +120,9 @@ def correct_tool_name(name: str, tool_map: dict) -> tuple[str, str | None]:
         if corrected in tool_map:
             return corrected, f"{name} → {corrected}"
 
-    candidates = difflib.get_close_matches(name, tool_map.keys(), n=1, cutoff=_FUZZY_CUTOFF)
-    if candidates:
-        return candidates[0], f"{name} ~> {candidates[0]}"
+    candidate = fuzzy_index(frozenset(tool_map), _FUZZY_CUTOFF).best(name)
+    if candidate is not None:
+        return candidate, f"{name} ~> {candidate}"
 
     return name, None
 
@@ -143,7 +164,7 @@ def fix_plan_tool_names(
                 new_text = f"{prefix}{corrected}{rest}"
                 fixed.append(Step(
                     number=step.number, text=new_text,
-                    status=step.status, note=step.note,
+                    status=step.status, note=step.note, deps=step.deps,
                 ))
                 fixes.append(f"step {step.number}: {fix}")
                 continue
@@ -177,6 +198,19 @@ _ARG_ALIAS: dict[str, str] = {
     "search":       "query",
     "sql_query":    "sql",
     "statement":    "sql",
+    "table_name":   "table",
+    "cols":         "columns",
+    "fields":       "columns",
+    "column_names": "columns",
+    "values":       "rows",
+    "records":      "rows",
+    "params_list":  "rows",
+    "max_rows":     "limit",
+    "page_size":    "limit",
+    "skip":         "offset",
+    "cursor":       "offset",
+    "key_prefix":   "prefix",
+    "key_list":     "keys",
     "url":          "uri",
     "link":         "uri",
 }
@@ -184,6 +218,53 @@ _ARG_ALIAS: dict[str, str] = {
 _ARG_FUZZY_CUTOFF = 0.75
 
 
+def schema_keys(tool) -> tuple[set[str], set[str]] | None:
+    """Return (declared_arg_names, required_arg_names) for a tool, or None if unknown.
+
+    Handles both Pydantic-backed LangChain tools (args_schema.model_fields)
+    and MCP tools that expose a raw JSON Schema dict (args_schema["properties"]).
+    """
+    schema = getattr(tool, "args_schema", None)
+    if isinstance(schema, dict):
+        return set(schema.get("properties", {}).keys()), set(schema.get("required", []))
+    if hasattr(schema, "model_fields"):
+        fields = schema.model_fields
+        required = {k for k, f in fields.items() if getattr(f, "is_required", lambda: False)() is True}
+        return set(fields.keys()), required
+    return None
+
+
+# id(tool) → (weak ref to the tool, declared arg names, their fuzzy index).
+# Tools are unhashable pydantic models, hence id() keys; the weak ref drops the
+# entry when the tool goes away (e.g. a per-run read_result tool bound to its
+# ResultStore), so the cache never keeps a tool or what it references alive.
+_SCHEMA_CACHE: dict[int, tuple[weakref.ref, frozenset[str], FuzzyIndex]] = {}
+
+
+def _forget_schema(ref: weakref.ref, key: int) -> None:
+    entry = _SCHEMA_CACHE.get(key)
+    if entry is not None and entry[0] is ref:
+        del _SCHEMA_CACHE[key]
+
+
+def _compiled_schema(tool) -> tuple[frozenset[str], FuzzyIndex] | None:
+    """schema_keys() + fuzzy index of the declared names, computed once per live tool object."""
+    entry = _SCHEMA_CACHE.get(id(tool))
+    if entry is not None and entry[0]() is tool:
+        return entry[1], entry[2]
+    keys = schema_keys(tool)
+    if keys is None:
+        return None
+    declared = frozenset(keys[0])
+    index = fuzzy_index(declared, _ARG_FUZZY_CUTOFF)
+    try:
+        ref = weakref.ref(tool, lambda r, key=id(tool): _forget_schema(r, key))
+    except TypeError:
+        return declared, index   # not weak-referenceable: recompute the key set next time
+    _SCHEMA_CACHE[id(tool)] = (ref, declared, index)
+    return declared, index
+
+
 def _fix_args(tc: dict, tool_map: dict) -> tuple[dict, list[str]]:
     """Normalize argument names to match the tool's declared schema.
 
@@ -192,20 +273,16 @@ def _fix_args(tc: dict, tool_map: dict) -> tuple[dict, list[str]]:
     2. Alias table lookup  → deterministic, handles short/semantic differences.
     3. difflib fuzzy match against schema keys → catches near-misses not in table.
 
-    Handles both Pydantic-backed LangChain tools (args_schema.model_fields)
-    and MCP tools that expose a raw JSON Schema dict (args_schema["properties"]).
+    Schema shapes are resolved by schema_keys() (cached per tool object).
     """
     tool = tool_map.get(tc["name"])
     if tool is None:
         return tc, []
 
-    schema = tool.args_schema
-    if isinstance(schema, dict):
-        expected_keys: set[str] = set(schema.get("properties", {}).keys())
-    elif hasattr(schema, "model_fields"):
-        expected_keys = set(schema.model_fields.keys())
-    else:
+    compiled = _compiled_schema(tool)
+    if compiled is None:
         return tc, []
+    expected_keys, index = compiled
 
     new_args: dict = {}
     fixes: list[str] = []
@@ -218,11 +295,8 @@ def _fix_args(tc: dict, tool_map: dict) -> tuple[dict, list[str]]:
             new_args[correct] = v
             fixes.append(f"{k} → {correct}")
         else:
-            candidates = difflib.get_close_matches(
-                k, expected_keys, n=1, cutoff=_ARG_FUZZY_CUTOFF
-            )
-            if candidates:
-                correct = candidates[0]
+            correct = index.best(k)
+            if correct is not None:
                 new_args[correct] = v
                 fixes.append(f"{k} ~> {correct}")
             else:
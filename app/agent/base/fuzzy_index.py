@@ -0,0 +1,82 @@
+"""Precompiled difflib close-match lookup for the tool-name / arg-name fixers.
+
+difflib.get_close_matches(word, names, n=1, cutoff) runs SequenceMatcher
+against every name on every call.  FuzzyIndex scores the same way against a
+fixed name set, but skips names that cannot reach the cutoff:
+
+  - length buckets: ratio() ≤ 2·min(la, lb) / (la + lb) (difflib's
+    real_quick_ratio), so whole buckets are ruled out by length alone
+  - (character, count) → names inverted index: one pass over the word gives
+    every name's shared-character count, the quick_ratio() bound
+  - only names passing both bounds get the full ratio(); best() is
+    memoized per word (LRU)
+
+Both bounds are upper bounds of ratio(), so nothing difflib would accept is
+pruned and best() == get_close_matches(word, names, n=1, cutoff)[0] (ties go
+to the larger name, as with heapq.nlargest).  Character n-grams (n ≥ 2) are
+not a safe filter: ratio() also counts matching blocks of a single char.
+"""
+
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+_MEMO_SIZE = 1024
+
+
+def _ratio(matches: int, length: int) -> float:
+    # Same arithmetic as difflib._calculate_ratio, so bounds compare exactly.
+    return 2.0 * matches / length if length else 1.0
+
+
+class FuzzyIndex:
+    """Close-match lookup over a fixed set of names."""
+
+    def __init__(self, names, cutoff: float):
+        self.cutoff = cutoff
+        self._by_len: dict[int, list[str]] = defaultdict(list)
+        # (char, k) → names containing char at least k times.  Counting a word's
+        # postings with Counter.update then yields each name's shared-character
+        # count without a Python-level loop over names.
+        self._by_char: dict[tuple[str, int], list[str]] = defaultdict(list)
+        for name in sorted(set(names)):
+            self._by_len[len(name)].append(name)
+            for ch, count in Counter(name).items():
+                for k in range(1, count + 1):
+                    self._by_char[(ch, k)].append(name)
+        self.best = lru_cache(maxsize=_MEMO_SIZE)(self._best)
+
+    def _best(self, word: str) -> str | None:
+        """The name get_close_matches(word, names, n=1, cutoff) would return, or None."""
+        lw = len(word)
+        lengths = [ln for ln in self._by_len if _ratio(min(ln, lw), ln + lw) >= self.cutoff]
+        if not lengths:
+            return None
+        shared: Counter = Counter()
+        for ch, count in Counter(word).items():
+            for k in range(1, count + 1):
+                postings = self._by_char.get((ch, k))
+                if postings is None:
+                    break
+                shared.update(postings)
+
+        matcher: SequenceMatcher | None = None
+        best: tuple[float, str] | None = None
+        for ln in lengths:
+            for name in self._by_len[ln]:
+                if _ratio(shared[name], ln + lw) < self.cutoff:
+                    continue
+                if matcher is None:
+                    matcher = SequenceMatcher()
+                    matcher.set_seq2(word)   # b = word, as in get_close_matches
+                matcher.set_seq1(name)
+                score = matcher.ratio()
+                if score >= self.cutoff and (best is None or (score, name) > best):
+                    best = (score, name)
+        return best[1] if best else None
+
+
+@lru_cache(maxsize=64)
+def fuzzy_index(names: frozenset[str], cutoff: float) -> FuzzyIndex:
+    """Shared FuzzyIndex per (name set, cutoff): one per tool map / tool schema."""
+    return FuzzyIndex(names, cutoff)
@@ -0,0 +1,207 @@
+"""Side-effect classification for MCP tool calls.
+
+Pure helpers that describe *what a tool call touches*, so callers can decide
+which calls may run concurrently.  Like the fixers, everything here operates
+only on the tool-call dict.
+
+domain(tc)        — resource family ("fs", "sqlite", "shell", "memory", ...)
+is_mutating(tc)   — True when the call may change state in its domain
+conflicts(a, b)   — True when *b* must wait for *a* (emission order is kept)
+affected_domains  — domains whose cached state a call invalidates
+invalidates(w, r) — True when mutating call *w* may change what read *r* returned
+"""
+
+import re
+import sqlite3
+
+# Tool name → resource family.  Unlisted tools form a domain of their own.
+_TOOL_DOMAIN: dict[str, str] = {
+    # filesystem
+    "read_file":             "fs",
+    "read_text_file":        "fs",
+    "read_multiple_files":   "fs",
+    "write_file":            "fs",
+    "edit_file":             "fs",
+    "create_directory":      "fs",
+    "list_directory":        "fs",
+    "list_directory_with_sizes": "fs",
+    "directory_tree":        "fs",
+    "move_file":             "fs",
+    "search_files":          "fs",
+    "get_file_info":         "fs",
+    # shell
+    "execute_command":       "shell",
+    # sqlite
+    "list_tables":           "sqlite",
+    "describe_schema":       "sqlite",
+    "query":                 "sqlite",
+    "bulk_insert":           "sqlite",
+    # memory
+    "remember":              "memory",
+    "recall":                "memory",
+    "recall_many":           "memory",
+    "list_memories":         "memory",
+    "search_memories":       "memory",
+    "forget":                "memory",
+    # websearch / time — read-only, never conflict
+    "web_search":            "web",
+    "fetch_page":            "web",
+    "fetch_pages":           "web",
+    "get_current_datetime":  "time",
+}
+
+_MUTATING_TOOLS: frozenset[str] = frozenset({
+    "write_file", "edit_file", "create_directory", "move_file",
+    "execute_command",
+    "bulk_insert",
+    "remember", "forget",
+})
+
+# A shell command can touch anything under /data (files, agent.db, memory.json).
+_SHELL_REACH: frozenset[str] = frozenset({"fs", "sqlite", "shell", "memory"})
+
+# SQL statements that only read.  Everything else (DDL/DML, ATTACH, ...) mutates.
+_READ_ONLY_SQL_RE = re.compile(r"^\s*(SELECT|EXPLAIN|VALUES)\b", re.IGNORECASE)
+# A CTE is read-only unless its main statement (or any part of it) writes.
+_CTE_RE = re.compile(r"^\s*WITH\b", re.IGNORECASE)
+_DML_WORD_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+# PRAGMA name / PRAGMA name(arg) reads; PRAGMA name = value writes.
+_PRAGMA_RE = re.compile(r"^\s*PRAGMA\s+(?:\w+\.)?(\w+)\s*(\(|=)?", re.IGNORECASE)
+_READ_PRAGMA_FUNCS: frozenset[str] = frozenset({
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+    "foreign_key_list", "foreign_key_check", "integrity_check", "quick_check",
+})
+
+_PATH_KEYS = ("path", "source", "destination")
+
+# Tables a DML statement writes to.  DDL / ATTACH / VACUUM ... have no single target.
+_DML_TARGET_RE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)"
+    r"\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+_SQL_WORD_RE = re.compile(r"\w+")
+
+
+def domain(tc: dict) -> str:
+    return _TOOL_DOMAIN.get(tc["name"], tc["name"])
+
+
+def _split_statements(sql: str) -> list[str]:
+    """Split a SQL script like the sqlite server does (';' inside strings/triggers is kept)."""
+    statements, buf = [], ""
+    for part in sql.split(";"):
+        buf += part + ";"
+        if sqlite3.complete_statement(buf):
+            if buf.strip(" \t\r\n;"):
+                statements.append(buf.strip())
+            buf = ""
+    if buf.strip(" \t\r\n;"):
+        statements.append(buf.strip())
+    return statements
+
+
+def _statement_reads_only(stmt: str) -> bool:
+    if _READ_ONLY_SQL_RE.match(stmt):
+        return True
+    if _CTE_RE.match(stmt):
+        return not _DML_WORD_RE.search(stmt)
+    m = _PRAGMA_RE.match(stmt)
+    if m:
+        return m.group(2) is None or (m.group(2) == "(" and m.group(1).lower() in _READ_PRAGMA_FUNCS)
+    return False
+
+
+def is_mutating(tc: dict) -> bool:
+    if tc["name"] == "query":
+        # Every statement must read: "SELECT 1; DELETE FROM t" runs both.
+        statements = _split_statements(str(tc.get("args", {}).get("sql", "")))
+        return not statements or not all(_statement_reads_only(st) for st in statements)
+    return tc["name"] in _MUTATING_TOOLS
+
+
+def affected_domains(tc: dict) -> set[str]:
+    """Domains whose state may have changed after *tc* ran (empty for read-only calls)."""
+    if not is_mutating(tc):
+        return set()
+    if tc["name"] == "execute_command":
+        return set(_SHELL_REACH)
+    return {domain(tc)}
+
+
+def _paths(tc: dict) -> list[str]:
+    args = tc.get("args", {})
+    paths = [str(args[k]) for k in _PATH_KEYS if isinstance(args.get(k), str)]
+    if isinstance(args.get("paths"), list):   # read_multiple_files
+        paths += [str(p) for p in args["paths"]]
+    return [p.rstrip("/") for p in paths]
+
+
+def _paths_overlap(a: dict, b: dict) -> bool:
+    pa, pb = _paths(a), _paths(b)
+    if not pa or not pb:
+        return True   # unknown target → assume overlap
+    return any(x == y or x.startswith(y + "/") or y.startswith(x + "/") for x in pa for y in pb)
+
+
+def conflicts(a: dict, b: dict) -> bool:
+    """True when *a* and *b* touch the same resource and at least one mutates it."""
+    if a["name"] == "execute_command" or b["name"] == "execute_command":
+        other = b if a["name"] == "execute_command" else a
+        return domain(other) in _SHELL_REACH
+    if domain(a) != domain(b):
+        return False
+    if not (is_mutating(a) or is_mutating(b)):
+        return False
+    if domain(a) == "fs":
+        return _paths_overlap(a, b)
+    return True
+
+
+def _names(tc: dict) -> set[str] | None:
+    """Tables (sqlite) or keys (memory) a call touches; None when it may touch any."""
+    args = tc.get("args", {})
+    name = tc["name"]
+    if name == "query":
+        sql = str(args.get("sql", ""))
+        if is_mutating(tc):
+            targets: set[str] = set()
+            for stmt in _split_statements(sql):
+                if _statement_reads_only(stmt):
+                    continue
+                m = _DML_TARGET_RE.match(stmt)
+                if not m:
+                    return None
+                targets.add(m.group(1).lower())
+            return targets or None
+        # Every word of a read: table names, aliases, columns.  Over-inclusive on
+        # purpose — comma joins, subqueries and CTEs all stay covered.
+        return {w.lower() for w in _SQL_WORD_RE.findall(sql)}
+    if name == "bulk_insert" and isinstance(args.get("table"), str):
+        return {args["table"].strip("\"`[] ").lower()}
+    if name == "describe_schema" and isinstance(args.get("tables"), str) and args["tables"].strip():
+        return {t.strip().lower() for t in args["tables"].split(",") if t.strip()}
+    if name in ("remember", "recall", "forget") and isinstance(args.get("key"), str):
+        return {args["key"]}
+    if name == "recall_many" and isinstance(args.get("keys"), list):
+        return {str(k) for k in args["keys"]}
+    return None
+
+
+def invalidates(writer: dict, reader: dict) -> bool:
+    """True when *writer* may have changed the result of the read-only call *reader*.
+
+    fs compares paths, sqlite compares the DML target table with the words of the
+    read, memory compares keys.  Anything unknown (DDL, list_tables, list_memories,
+    execute_command, ...) invalidates the whole domain.
+    """
+    if domain(reader) not in affected_domains(writer):
+        return False
+    if writer["name"] == "execute_command":
+        return True
+    if domain(reader) == "fs":
+        return _paths_overlap(writer, reader)
+    written, read = _names(writer), _names(reader)
+    if written is None or read is None:
+        return True
+    return bool(written & read)
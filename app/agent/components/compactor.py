@@ -0,0 +1,122 @@
+"""Rolling compaction of history evicted by the context window.
+
+When _apply_window / _apply_token_budget drop old AI + Tool turns, their
+information used to be lost (7b StepCR fell from 63.9% to 47.5% at window=8).
+HistoryCompactor folds evicted turns into a compact "earlier work" digest that
+is placed right after the System + Task head.
+
+The digest is built deterministically from execution_history (one line per
+tool call, in call order) and the Step.note fields.  It is rebuilt only when
+the window slides (the evicted-call count changes), so between slides the
+text is byte-identical and the prompt prefix stays cacheable.
+
+Optionally (FEATURES["compaction_llm_summary"]) a cheap LLM pass rewrites the
+digest in the background; the deterministic text is used until it finishes,
+so the summary never sits on the critical path.
+"""
+
+import asyncio
+import logging
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+
+from config import COMPACTION_LINE_CHARS, COMPACTION_MAX_CHARS, FEATURES, MESSAGE_WINDOW_HEAD
+import core.llm as llm
+from core.models import Step
+
+logger = logging.getLogger("agent")
+
+_SUMMARY_PROMPT = (
+    "Summarise the following agent work log in at most 5 short lines. "
+    "Keep file paths, table names, key values and any errors. Output only the summary."
+)
+
+
+def _shorten(line: str, limit: int) -> str:
+    line = " ".join(line.split())
+    return line if len(line) <= limit else line[:limit - 1] + "…"
+
+
+def evicted_tool_calls(messages: list, ctx_messages: list) -> int:
+    """Number of ToolMessages in *messages* that the window left out of *ctx_messages*."""
+    dropped = messages[MESSAGE_WINDOW_HEAD:len(messages) - (len(ctx_messages) - MESSAGE_WINDOW_HEAD)]
+    return sum(1 for m in dropped if isinstance(m, ToolMessage))
+
+
+def build_digest(history: list[str], steps: list[Step]) -> str:
+    """Deterministic digest of *history* (evicted tool calls) and step outcomes."""
+    icons = {"done": "✅", "failed": "❌"}
+    step_lines = [
+        _shorten(f"{icons[s.status]} {s.text}" + (f" → {s.note}" if s.note else ""), COMPACTION_LINE_CHARS)
+        for s in steps if s.status in icons
+    ]
+    call_lines = [f"- {_shorten(h, COMPACTION_LINE_CHARS)}" for h in history]
+
+    header = f"[Earlier work — {len(history)} tool calls compacted]"
+    parts = [header]
+    if step_lines:
+        parts += ["Steps:", *step_lines]
+    budget = COMPACTION_MAX_CHARS - sum(len(p) + 1 for p in parts) - len("Tool calls:") - 1
+    kept: list[str] = []
+    for line in reversed(call_lines):   # newest evicted calls are the most relevant
+        if budget - len(line) - 1 < 0:
+            break
+        kept.append(line)
+        budget -= len(line) + 1
+    if kept:
+        omitted = len(call_lines) - len(kept)
+        parts.append("Tool calls:" + (f" (+{omitted} older omitted)" if omitted else ""))
+        parts += reversed(kept)
+    return "\n".join(parts)
+
+
+class HistoryCompactor:
+    """Per-loop digest of evicted turns.
+
+    model — LLM for the optional background summary (None → deterministic only).
+    """
+
+    def __init__(self, model=None):
+        self._model = model if FEATURES.get("compaction_llm_summary", False) else None
+        self._evicted_calls = 0
+        self._digest = ""
+        self._summary: tuple[int, str] | None = None   # (evicted_calls, text)
+        self._summary_task: asyncio.Task | None = None
+
+    def _start_summary(self, evicted_calls: int, digest: str) -> None:
+        if self._model is None or (self._summary_task and not self._summary_task.done()):
+            return
+
+        async def _summarise() -> None:
+            try:
+                response = await llm.acall(self._model, [
+                    SystemMessage(content=_SUMMARY_PROMPT),
+                    HumanMessage(content=digest),
+                ], "compact")
+                text = response.content.strip()
+                if text:
+                    self._summary = (evicted_calls, f"[Earlier work — summary]\n{text}")
+            except Exception as e:
+                logger.warning(f"[compact] summary failed: {type(e).__name__}: {e}")
+
+        self._summary_task = asyncio.create_task(_summarise())
+
+    def compact(
+        self,
+        messages: list,
+        ctx_messages: list,
+        execution_history: list[str],
+        steps: list[Step],
+    ) -> HumanMessage | None:
+        """Return the digest message for the turns in *messages* missing from *ctx_messages*."""
+        evicted_calls = evicted_tool_calls(messages, ctx_messages)
+        if evicted_calls == 0:
+            return None
+        if evicted_calls != self._evicted_calls:
+            self._evicted_calls = evicted_calls
+            self._digest = build_digest(execution_history[:evicted_calls], steps)
+            logger.info(f"[compact] {evicted_calls} evicted tool calls → {len(self._digest)} chars")
+            self._start_summary(evicted_calls, self._digest)
+        if self._summary and self._summary[0] == evicted_calls:
+            return HumanMessage(content=self._summary[1])
+        return HumanMessage(content=self._digest)
@@ -1,26 +1,40 @@
 """Execution loop helper utilities.
 
 Low-level helpers used by run_exec_loop() and run_react_loop():
-  - Tool invocation and step status updates
+  - Tool invocation (single call, or several concurrent calls) and step status updates
   - Tool result trimming to prevent context overflow
-  - Sliding window message history management
+  - Sliding window / token-budget message history management (+ compaction digest)
   - Watchdog detection of repeatedly failing tools
   - Replan wrapper with timeout handling
   - apply_fixers: single entry point for all tool-call corrections
 """
 
 import asyncio
+import json
+import re
+from functools import lru_cache
 
+from langchain_core.messages import ToolMessage
 from langchain_core.tools import ToolException
 
 from agent.base.fixers import _fix_args, _fix_content, _fix_tool_name
+from agent.base.tool_effects import conflicts
+from agent.components.compactor import build_digest, evicted_tool_calls
+from agent.components.state_cache import get_state_cache
+from agent.components.tool_memo import get_tool_memo
 from config import (
+    CHARS_PER_TOKEN_ASCII,
     FEATURES,
+    MESSAGE_WINDOW_CHUNK,
     MESSAGE_WINDOW_HEAD,
     MESSAGE_WINDOW_SIZE,
+    TOKENS_PER_CHAR_CJK,
     TOOL_RESULT_DEFAULT_MAX_CHARS,
+    TOOL_RESULT_DEFAULT_TRIM_STRATEGY,
     TOOL_RESULT_MAX_CHARS,
+    TOOL_RESULT_TRIM_STRATEGY,
 )
+from core import events
 from core.models import Step
 
 
@@ -54,20 +68,73 @@ async def _invoke_tool(tc: dict, tool_map: dict) -> tuple[str, bool]:
     return result_str, is_error
 
 
+async def _invoke_tools(
+    tcs: list[dict], tool_map: dict, memo_hits: set[int] | None = None,
+) -> list[tuple[str, bool]]:
+    """複数のツール呼び出しを並列実行し、呼び出し順に (result_str, is_error) を返す。
+
+    同じリソースに触れる呼び出し（tool_effects.conflicts）は出力順に直列化する。
+    例: read_file + list_tables は並列、write_file → read_file（同一パス）は順番通り。
+    With FEATURES["tool_memo"] idempotent calls are answered from the ToolMemo
+    when an identical call ran recently and nothing has touched its target since;
+    their indices are added to *memo_hits* when given.
+    """
+    tasks: list[asyncio.Task] = []
+    memo = get_tool_memo() if FEATURES.get("tool_memo", True) else None
+
+    async def _run(j: int, tc: dict, deps: list[asyncio.Task]) -> tuple[str, bool]:
+        if deps:
+            await asyncio.gather(*deps)
+        events.emit("tool_call", name=tc["name"], args=tc["args"])
+        tool = tool_map.get(tc["name"])
+        cached = memo.get(tc, tool) if memo is not None and tool is not None else None
+        if cached is not None:
+            if memo_hits is not None:
+                memo_hits.add(j)
+            events.emit("tool_result", name=tc["name"], result=cached[:events.RESULT_PREVIEW_CHARS], is_error=False)
+            return cached, False
+        generation = memo.generation() if memo is not None else None
+        result_str, is_error = await _invoke_tool(tc, tool_map)
+        # Even a failed mutating call may have changed something: always invalidate.
+        get_state_cache().invalidate(tc)
+        if memo is not None:
+            memo.invalidate(tc)
+            if not is_error and tool is not None:
+                memo.put(tc, tool, result_str, generation)
+        events.emit("tool_result", name=tc["name"], result=result_str[:events.RESULT_PREVIEW_CHARS], is_error=is_error)
+        return result_str, is_error
+
+    for j, tc in enumerate(tcs):
+        deps = [tasks[i] for i in range(j) if conflicts(tcs[i], tc)]
+        tasks.append(asyncio.create_task(_run(j, tc, deps)))
+    return list(await asyncio.gather(*tasks))
+
+
 # ---------------------------------------------------------------------------
 # Step status
 # ---------------------------------------------------------------------------
 
+def _mark_step(step: Step, is_error: bool, result_str: str) -> None:
+    """ツール結果でステップの状態と note を更新する。"""
+    if is_error:
+        step.status = "failed"
+        step.note = result_str[:120]
+    else:
+        step.status = "done"
+        step.note = result_str[:80]
+
+
 def _update_step(steps: list[Step], idx: int, is_error: bool, result_str: str) -> int:
-    """現在のステップ状態を更新し、次のインデックスを返す。"""
+    """現在のステップ状態を更新し、次のインデックスを返す。
+
+    成功時は、直接実行などで既に完了済みのステップを飛ばして次へ進む。
+    """
     if idx < len(steps):
-        if is_error:
-            steps[idx].status = "failed"
-            steps[idx].note = result_str[:120]
-        else:
-            steps[idx].status = "done"
-            steps[idx].note = result_str[:80]
+        _mark_step(steps[idx], is_error, result_str)
+        if not is_error:
             idx += 1
+            while idx < len(steps) and steps[idx].status == "done":
+                idx += 1
     return idx
 
 
@@ -115,12 +182,36 @@ def apply_fixers(
 # Context management
 # ---------------------------------------------------------------------------
 
+def _history_line(tc: dict, result_str: str, is_error: bool) -> str:
+    """execution_history 用の 1 行（リプラン / コンパクション用）。"""
+    return f"{tc['name']}({tc['args']}) → {'ERROR: ' if is_error else ''}{result_str[:200]}"
+
+
+def _result_message(tc: dict, result_str: str, logger, store=None) -> ToolMessage:
+    """ツール結果を（tool_result_trimming 有効時はトリミングして）ToolMessage にする。
+
+    store (ResultStore) が渡された場合、トリミングした結果の全文を保存し、
+    read_result で続きを読めるようハンドルを末尾に付ける。
+    """
+    ctx_result = result_str
+    if FEATURES.get("tool_result_trimming", True):
+        ctx_result, original_len = _trim_tool_result(tc["name"], result_str)
+        if len(ctx_result) < original_len:
+            if store is not None:
+                handle = store.put(tc["name"], result_str)
+                ctx_result += store.note(handle, original_len)
+            logger.info(f"[trim] {tc['name']}: {original_len} → {len(ctx_result)} chars")
+    return ToolMessage(content=ctx_result, tool_call_id=tc["id"])
+
+
 def _trim_tool_result(tool_name: str, result: str) -> tuple[str, int]:
     """ツール結果をコンテキスト上限に合わせてトリミングする。
 
     TOOL_RESULT_MAX_CHARS でツール別の上限文字数を設定できる。
     未登録ツールは TOOL_RESULT_DEFAULT_MAX_CHARS を使用。
     上限が 0 の場合はトリミングしない。
+    smart_trimming 有効時は TOOL_RESULT_TRIM_STRATEGY で選んだ方式で切る
+    （トレースバックを含む結果は常に "error" 方式）。
 
     Returns:
         (trimmed_result, original_length)
@@ -129,22 +220,280 @@ def _trim_tool_result(tool_name: str, result: str) -> tuple[str, int]:
     limit = TOOL_RESULT_MAX_CHARS.get(tool_name, TOOL_RESULT_DEFAULT_MAX_CHARS)
     if not limit or original_len <= limit:
         return result, original_len
-    trimmed = result[:limit]
-    trimmed += f"\n... [truncated: {original_len - limit} chars omitted]"
-    return trimmed, original_len
+    if not FEATURES.get("smart_trimming", True):
+        return _trim_head(result, limit), original_len
+    return _TRIM_STRATEGIES[_trim_strategy(tool_name, result)](result, limit), original_len
+
+
+def _trim_strategy(tool_name: str, result: str) -> str:
+    if _TRACEBACK_RE.search(result):
+        return "error"
+    return TOOL_RESULT_TRIM_STRATEGY.get(tool_name, TOOL_RESULT_DEFAULT_TRIM_STRATEGY)
+
+
+_TRACEBACK_RE = re.compile(r"^Traceback \(most recent call last\):", re.MULTILINE)
+_ERROR_LINE_RE = re.compile(
+    r"\b\w*(Error|Exception)\b|\berror:|\bERROR\b|\bFAILED\b|fatal:|panic:|"
+    r"No such file|command not found|Permission denied"
+)
+# sqlite query footers: "(N rows)", "(rows a-b of T)", "(rows a-b of T; M more — … offset=b)"
+_ROWS_FOOTER_RE = re.compile(r"^\((?:(\d+) rows|rows (\d+)-\d+ of (\d+)(\+?)(?:;.*)?)\)$")
+
+
+def _trim_head(result: str, limit: int) -> str:
+    return result[:limit] + f"\n... [truncated: {len(result) - limit} chars omitted]"
+
+
+def _take_lines(lines: list[str], indices, budget: int, keep: set[int]) -> int:
+    """Add whole lines from *indices* to *keep* while they fit; returns the budget left."""
+    for i in indices:
+        if i in keep:
+            continue
+        cost = len(lines[i]) + 1
+        if cost > budget:
+            break
+        keep.add(i)
+        budget -= cost
+    return budget
+
+
+def _render_kept(lines: list[str], keep: set[int], unit: str = "lines") -> str:
+    """Kept lines in order, with a "[truncated: …]" marker for every gap."""
+    out: list[str] = []
+    prev = -1
+    for i in sorted(keep):
+        if i > prev + 1:
+            out.append(f"... [truncated: {i - prev - 1} {unit} omitted] ...")
+        out.append(lines[i])
+        prev = i
+    if any(line.strip() for line in lines[prev + 1:]):
+        out.append(f"... [truncated: {len(lines) - prev - 1} {unit} omitted]")
+    return "\n".join(out)
+
+
+def _trim_lines(result: str, limit: int) -> str:
+    """Whole lines from the top (a file is not cut mid-line)."""
+    lines = result.split("\n")
+    keep: set[int] = set()
+    _take_lines(lines, range(len(lines)), limit, keep)
+    return _render_kept(lines, keep) if keep else _trim_head(result, limit)
+
+
+def _trim_head_tail(result: str, limit: int) -> str:
+    """Start and end of the output plus error lines from the middle (shell logs)."""
+    lines = result.split("\n")
+    keep: set[int] = set()
+    budget = _take_lines(lines, range(len(lines) - 1, -1, -1), limit // 2, keep)
+    errors = [i for i, line in enumerate(lines) if _ERROR_LINE_RE.search(line)]
+    budget = _take_lines(lines, errors, budget + limit // 6, keep)
+    _take_lines(lines, range(len(lines)), budget + limit - limit // 2 - limit // 6, keep)
+    return _render_kept(lines, keep) if keep else _trim_head(result, limit)
+
+
+def _trim_error(result: str, limit: int) -> str:
+    """The last traceback from its end backwards, earlier error lines, then the head."""
+    lines = result.split("\n")
+    starts = [i for i, line in enumerate(lines) if _TRACEBACK_RE.match(line)]
+    tb_start = starts[-1] if starts else 0
+    keep: set[int] = set()
+    # Final exception line and innermost frames first (they matter most).
+    end = len(lines) - 1
+    while end > tb_start and not lines[end].strip():
+        end -= 1
+    budget = _take_lines(lines, range(end, tb_start - 1, -1), limit * 2 // 3, keep)
+    errors = [i for i, line in enumerate(lines[:tb_start]) if _ERROR_LINE_RE.search(line)]
+    budget = _take_lines(lines, errors, budget + limit // 6, keep)
+    _take_lines(lines, range(len(lines)), budget + limit - limit * 2 // 3 - limit // 6, keep)
+    return _render_kept(lines, keep) if keep else _trim_head(result, limit)
+
+
+def _rows_footer(footer: str, kept: int) -> str:
+    """Rewrite a query footer for a page cut down to its first *kept* rows, so the
+    next-page offset points right after the last row the model actually sees."""
+    m = _ROWS_FOOTER_RE.match(footer)
+    if m.group(1):
+        first, total, capped = 1, int(m.group(1)), ""
+    else:
+        first, total, capped = int(m.group(2)), int(m.group(3)), m.group(4)
+    last = first + kept - 1
+    return (
+        f"(rows {first}-{last} of {total}{capped}; {total - last}{capped} more — "
+        f"call query again with offset={last})"
+    )
+
+
+def _trim_rows(result: str, limit: int) -> str:
+    """Whole rows of a query result; the header line and the row-count footer are kept
+    (the footer's row range and next offset are rewritten to the rows kept)."""
+    if result.startswith("[{"):
+        # list-of-dicts repr: cut between two rows and close the list
+        cut = result.rfind("}, {", 0, limit)
+        if cut > 0:
+            rows_left = result.count("}, {", cut)
+            return result[:cut + 1] + f"]\n... [truncated: {rows_left} more rows omitted]"
+        return _trim_head(result, limit)
+    lines = result.split("\n")
+    keep = {0}
+    budget = limit - len(lines[0]) - 1
+    has_footer = len(lines) > 2 and bool(_ROWS_FOOTER_RE.match(lines[-1]))
+    if has_footer:
+        budget -= len(_rows_footer(lines[-1], len(lines) - 2)) + 1   # rewritten size
+        budget -= len("... [truncated: 00000 rows omitted] ...") + 1
+    if budget <= 0:
+        return _trim_head(result, limit)
+    end = len(lines) - 1 if has_footer else len(lines)
+    _take_lines(lines, range(1, end), budget, keep)
+    if not has_footer:
+        return _render_kept(lines, keep, unit="rows")
+    kept_rows = len(keep) - 1
+    lines = lines[:end] + [_rows_footer(lines[-1], kept_rows) if kept_rows < end - 1 else lines[-1]]
+    return _render_kept(lines, keep | {end}, unit="rows")
+
+
+_TRIM_STRATEGIES = {
+    "head":      _trim_head,
+    "head_tail": _trim_head_tail,
+    "error":     _trim_error,
+    "rows":      _trim_rows,
+    "lines":     _trim_lines,
+}
+
+
+def _turn_boundary(tail: list, idx: int) -> int:
+    """idx 以降で ToolMessage 以外から始まる最初の位置を返す（AI+Tool ペアを分断しない）。"""
+    while idx < len(tail) and isinstance(tail[idx], ToolMessage):
+        idx += 1
+    return idx
 
 
 def _apply_window(messages: list) -> tuple[list, bool]:
-    """直近 MESSAGE_WINDOW_SIZE 件のみ保持したメッセージリストを返す。
+    """直近 MESSAGE_WINDOW_SIZE 件以内のメッセージリストを返す。
 
     先頭 MESSAGE_WINDOW_HEAD 件（System + Task）は常に保持する。
+    超過分は MESSAGE_WINDOW_CHUNK 件単位でまとめて捨てるため、スライドしない
+    ターンではコンテキストが追記のみとなり Ollama のプロンプトキャッシュが効く。
     ウィンドウが適用された場合は True を返す（ログ用）。
     """
     head = messages[:MESSAGE_WINDOW_HEAD]
     tail = messages[MESSAGE_WINDOW_HEAD:]
-    if len(tail) <= MESSAGE_WINDOW_SIZE:
+    overflow = len(tail) - MESSAGE_WINDOW_SIZE
+    if overflow <= 0:
         return messages, False
-    return head + tail[-MESSAGE_WINDOW_SIZE:], True
+    chunk = max(MESSAGE_WINDOW_CHUNK, 1)
+    drop = _turn_boundary(tail, -(-overflow // chunk) * chunk)
+    return head + tail[drop:], True
+
+
+@lru_cache(maxsize=4096)
+def _estimate_tokens(text: str) -> int:
+    """トークン数の概算（ASCII は CHARS_PER_TOKEN_ASCII 文字/トークン、それ以外は 1 文字ごと）。
+
+    実トークナイザを呼ばずに済むよう文字種だけで見積もる。同じ文字列は毎ターン
+    再計算されるため結果をキャッシュする。
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / CHARS_PER_TOKEN_ASCII + other_chars * TOKENS_PER_CHAR_CJK) + 1
+
+
+def _message_tokens(msg) -> int:
+    """1 メッセージ分の概算トークン数（ロール等のテンプレート分 4 トークンを含む）。"""
+    content = msg.content if isinstance(msg.content, str) else str(msg.content)
+    tokens = 4 + _estimate_tokens(content)
+    for tc in getattr(msg, "tool_calls", None) or []:
+        tokens += _estimate_tokens(f"{tc['name']}{json.dumps(tc['args'], ensure_ascii=False)}")
+    return tokens
+
+
+def _tools_tokens(tools: list) -> int:
+    """bind_tools でプロンプトに埋め込まれるツールスキーマの概算トークン数。"""
+    total = 0
+    for t in tools:
+        schema = getattr(t, "args_schema", None)
+        if not isinstance(schema, dict):
+            schema = getattr(schema, "model_json_schema", lambda: {})()
+        total += _estimate_tokens(f"{t.name}{t.description}{json.dumps(schema, ensure_ascii=False)}")
+    return total
+
+
+def _group_turns(tail: list) -> list[int]:
+    """tail 内の各ターン（AI + 後続 ToolMessage 群）の開始インデックスを返す。"""
+    return [i for i, m in enumerate(tail) if not isinstance(m, ToolMessage)]
+
+
+def _apply_token_budget(messages: list, budget: int) -> tuple[list, bool]:
+    """概算トークン数が budget に収まるよう、新しいターンから詰めたリストを返す。
+
+    先頭 MESSAGE_WINDOW_HEAD 件（System + Task）は常に保持し、残りの予算に
+    直近のターンを丸ごと詰める。切り出し位置は MESSAGE_WINDOW_CHUNK / 2 ターン
+    単位に揃えるため、位置が変わらないターンではプレフィックスが維持される。
+    最新ターンは予算を超えても必ず残す。
+    """
+    head = messages[:MESSAGE_WINDOW_HEAD]
+    tail = messages[MESSAGE_WINDOW_HEAD:]
+    remaining = budget - sum(_message_tokens(m) for m in head)
+    starts = _group_turns(tail)
+    if not starts or sum(_message_tokens(m) for m in tail) <= remaining:
+        return messages, False
+
+    # Smallest turn index whose suffix fits the budget (newest turn always kept).
+    used = 0
+    first = len(starts) - 1
+    for g in range(len(starts) - 1, -1, -1):
+        end = starts[g + 1] if g + 1 < len(starts) else len(tail)
+        used += sum(_message_tokens(m) for m in tail[starts[g]:end])
+        if used > remaining:
+            break
+        first = g
+
+    step = max(MESSAGE_WINDOW_CHUNK // 2, 1)
+    aligned = min(-(-first // step) * step, len(starts) - 1)
+    return head + tail[starts[aligned]:], True
+
+
+def _build_context(
+    messages: list,
+    budget: int,
+    logger,
+    compactor=None,
+    execution_history: list[str] | None = None,
+    steps: list[Step] | None = None,
+) -> list:
+    """LLM に渡すメッセージ列を組み立てる（ウィンドウ + 退避履歴のダイジェスト）。
+
+    token_budget_window → message_window → 全件 の順で選択する。
+    compactor が渡された場合、ウィンドウから外れたターンを要約した
+    ダイジェストを System + Task の直後に挿入し、その分の予算を確保する。
+    """
+    use_budget = FEATURES.get("token_budget_window", False)
+    if use_budget:
+        ctx, truncated = _apply_token_budget(messages, budget)
+    elif FEATURES.get("message_window", False):
+        ctx, truncated = _apply_window(messages)
+    else:
+        return messages
+    if not truncated:
+        return ctx
+
+    digest = None
+    if compactor is not None:
+        history = execution_history or []
+        steps = steps or []
+        if use_budget:
+            # Reserve room for the digest, then re-fit the history around it.
+            draft = build_digest(history[:evicted_tool_calls(messages, ctx)], steps)
+            ctx, _ = _apply_token_budget(messages, budget - _estimate_tokens(draft) - 4)
+        digest = compactor.compact(messages, ctx, history, steps)
+
+    logger.info(
+        f"[window] {len(messages)} → {len(ctx)} messages"
+        f" (dropped {len(messages) - len(ctx)} oldest,"
+        f" ~{sum(_message_tokens(m) for m in ctx)}/{budget} tok"
+        f"{', digest' if digest else ''})"
+    )
+    if digest is not None:
+        ctx = ctx[:MESSAGE_WINDOW_HEAD] + [digest] + ctx[MESSAGE_WINDOW_HEAD:]
+    return ctx
 
 
 # ---------------------------------------------------------------------------
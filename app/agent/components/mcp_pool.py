@@ -0,0 +1,166 @@
+"""Process-wide MCP session pool.
+
+Every MCP server in servers/ is a ``bash -c "docker exec -i ..."`` stdio
+subprocess.  ``MultiServerMCPClient.get_tools()`` opens a fresh session
+(process spawn + MCP handshake) per tool call, and run() used to rebuild the
+client for every prompt, so each request paid six spawns before the first
+LLM token.
+
+The pool keeps one long-lived session per server and hands out tools bound
+to those sessions:
+
+  start()    — connect every server (web_server startup, or first acquire)
+  acquire()  — health-check (ping), reconnect dead sessions, return tools
+  close()    — tear down all sessions (shutdown / end of CLI run)
+
+Each session lives inside its own runner task because the stdio transport is
+built on anyio cancel scopes, which must be entered and exited by the same
+task.  Request tasks only talk to the session through its memory streams.
+"""
+
+import asyncio
+import logging
+import time
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+from config import MCP_CONNECT_TIMEOUT, MCP_HEALTHCHECK_TIMEOUT
+from servers import MCP_SERVERS
+
+logger = logging.getLogger("agent")
+
+
+class _ServerSession:
+    """One persistent MCP session, owned by a dedicated runner task."""
+
+    def __init__(self, name: str, client: MultiServerMCPClient):
+        self.name = name
+        self._client = client
+        self._task: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self.session = None
+        self.tools: list = []
+        self.error: Exception | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        try:
+            async with self._client.session(self.name) as session:
+                self.tools = await load_mcp_tools(session, server_name=self.name)
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def connect(self) -> bool:
+        """Start the runner task and wait for the handshake. Returns True on success."""
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self.error = None
+        self.tools = []
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session-{self.name}")
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=MCP_CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.error = TimeoutError(f"connect timed out after {MCP_CONNECT_TIMEOUT}s")
+            await self.close()
+        if not self.alive:
+            logger.warning(f"[mcp_pool] {self.name}: connect failed: {self.error}")
+            return False
+        return True
+
+    async def healthy(self) -> bool:
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=MCP_HEALTHCHECK_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.warning(f"[mcp_pool] {self.name}: health check failed: {type(e).__name__}: {e}")
+            return False
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=MCP_HEALTHCHECK_TIMEOUT)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+        self._task = None
+        self.session = None
+        self.tools = []
+
+
+class MCPSessionPool:
+    """Long-lived MCP sessions shared by every request in the process."""
+
+    def __init__(self, connections: dict[str, dict], client: MultiServerMCPClient | None = None):
+        self._client = client or MultiServerMCPClient(connections)
+        self._servers = {name: _ServerSession(name, self._client) for name in connections}
+        self._lock = asyncio.Lock()
+        self._started = False
+
+    async def _ensure(self, server: _ServerSession) -> bool:
+        """Reconnect *server* if it is down or fails a ping. Returns True if reconnected."""
+        if server.alive and await server.healthy():
+            return False
+        if server._task is not None:
+            await server.close()
+        await server.connect()
+        return True
+
+    async def start(self) -> None:
+        """Connect every server. Safe to call more than once."""
+        await self.acquire()
+
+    async def acquire(self) -> tuple[list, dict, dict]:
+        """Return (tools, tool_map, stats) backed by live sessions.
+
+        stats — {"mcp_startup_sec", "mcp_cold_start", "mcp_reconnects"} for metrics.
+        Servers that cannot be reached are left out; they are retried on the
+        next acquire() instead of failing the whole request.
+        """
+        t0 = time.perf_counter()
+        async with self._lock:
+            cold = not self._started
+            reconnected = await asyncio.gather(*(self._ensure(s) for s in self._servers.values()))
+            self._started = True
+        tools = [t for s in self._servers.values() if s.alive for t in s.tools]
+        elapsed = time.perf_counter() - t0
+        reconnects = sum(reconnected) if not cold else 0
+        logger.info(
+            f"[mcp_pool] {'cold' if cold else 'warm'} acquire: {len(tools)} tools"
+            f" in {elapsed:.2f}s (reconnects={reconnects})"
+        )
+        stats = {
+            "mcp_startup_sec": round(elapsed, 3),
+            "mcp_cold_start":  cold,
+            "mcp_reconnects":  reconnects,
+        }
+        return tools, {t.name: t for t in tools}, stats
+
+    async def close(self) -> None:
+        async with self._lock:
+            await asyncio.gather(*(s.close() for s in self._servers.values()))
+            self._started = False
+
+
+_POOL: MCPSessionPool | None = None
+
+
+def get_mcp_pool() -> MCPSessionPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _POOL
+    if _POOL is None:
+        _POOL = MCPSessionPool(MCP_SERVERS)
+    return _POOL
@@ -1,13 +1,20 @@
 import ast
 import asyncio
+import json
 import logging
 import re
+import sqlite3
 import time
+import uuid
+import zlib
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
-from agent.base.fixers import fix_plan_tool_names
-from config import FEATURES
+import core.llm as llm
+from agent.base.fixers import _fix_args, fix_plan_tool_names, schema_keys
+from agent.components.state_cache import get_state_cache
+from config import FEATURES, STATE_MEMORY_MATCHES
+from core import events
 from core.models import Step, format_checklist, parse_steps
 from core.prompts import PLAN_PROMPT, REPLAN_PROMPT
 from core.utils import _tool_descriptions
@@ -50,28 +57,180 @@ def _parse_tables(result) -> list[str]:
     return []
 
 
+# "N. tool_name" or "N. tool_name: <args or description>"
+_STEP_CALL_RE = re.compile(r"^\d+\.\s*([A-Za-z_]\w*)\s*(?::\s*(.*?))?\s*$", re.DOTALL)
+
+# Literal argument forms recognised by the fast path (step_fast_path).
+# Only text that is unambiguously an argument compiles; prose ("Select the top
+# 5 products", "/data/a.txt and summarise") is left to the exec LLM.
+_KV_ARG_RE = re.compile(r'(\w+)\s*=\s*("(?:[^"\\]|\\.)*"|\'[^\']*\'|\S+)')
+_QUOTED_RE = re.compile(r'^(?:"([^"]*)"|\'([^\']*)\'|`([^`]*)`)$', re.DOTALL)
+_PATH_LITERAL_RE = re.compile(r"^/[^\s,;()]*$")
+_SQL_LITERAL_RE = re.compile(r"^(?:SELECT|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|PRAGMA|WITH|REPLACE)\b")
+
+
+def _is_sql(text: str) -> bool:
+    """One complete SQL statement with an upper-case leading keyword.
+
+    The statement is compiled (EXPLAIN, never run) against an empty in-memory
+    database: unknown tables / columns are fine, a syntax error means prose.
+    """
+    if not _SQL_LITERAL_RE.match(text) or not sqlite3.complete_statement(text.rstrip().rstrip(";") + ";"):
+        return False
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute(f"EXPLAIN {text}")
+    except sqlite3.OperationalError as e:
+        return str(e).startswith("no such ")
+    except (sqlite3.Error, sqlite3.Warning):
+        return False   # several statements, or not compilable
+    finally:
+        conn.close()
+    return True
+
+
+def _kv_args(rest: str) -> dict | None:
+    """'path=/data/a.txt content="hi"' → dict, or None unless the whole text is key=value pairs."""
+    pairs = _KV_ARG_RE.findall(rest)
+    if not pairs or _KV_ARG_RE.sub("", rest).strip(" ,"):
+        return None
+    return {k: v[1:-1] if v[:1] in "\"'" and len(v) > 1 else v for k, v in pairs}
+
+
+def _literal_args(rest: str, declared: set[str], required: set[str]) -> dict | None:
+    """Map a single literal (quoted string, /path or SQL) onto the tool's only required arg.
+
+    The literal must be the whole text: nothing may be left over.  sql / path
+    values are checked whether quoted or not; a command is taken only from a
+    `code span`, never from quoted prose.
+    """
+    if len(required) != 1:
+        return None
+    key = next(iter(required))
+    if m := _QUOTED_RE.match(rest):
+        value = next(g for g in m.groups() if g is not None)
+        if key == "command" and m.group(3) is None:
+            return None
+    else:
+        value = rest
+        if key not in ("sql", "path"):
+            return None
+    if key == "sql" and not _is_sql(value):
+        return None
+    if key == "path" and not _PATH_LITERAL_RE.match(value):
+        return None
+    return {key: value}
+
+
+def compile_step(step: Step, tool_map: dict) -> dict | None:
+    """Compile a plan step into a tool-call dict when no LLM reasoning is needed.
+
+    Accepted forms:
+      N. tool: {"json": "args"}          (always)
+      N. tool: key=value key2="value"    (step_fast_path)
+      N. tool: /data/path | "text" | SELECT ...  → the tool's only required arg
+                                          (nothing else on the line)
+      N. tool[: description]             → tools that take no arguments at all
+
+    The tool name is corrected with fix_plan_tool_names and arg names with
+    _fix_args, as on the LLM path.  Returns None unless the resulting args
+    exactly satisfy the tool schema (no unknown keys, every required key present).
+    """
+    (step,), _ = fix_plan_tool_names([step], tool_map)
+    m = _STEP_CALL_RE.match(step.text)
+    if not m or m.group(1) not in tool_map:
+        return None
+    name, rest = m.group(1), (m.group(2) or "")
+    keys = schema_keys(tool_map[name])
+    if keys is None:
+        return None
+    declared, required = keys
+
+    args: dict | None = None
+    if rest.startswith("{"):
+        try:
+            args = json.loads(rest)
+        except ValueError:
+            return None
+    elif FEATURES.get("step_fast_path", True):
+        if not declared:
+            args = {}      # the rest of the line is only a description
+        elif rest:
+            args = _kv_args(rest) or _literal_args(rest, declared, required)
+    if not isinstance(args, dict):
+        return None
+
+    tc = {"name": name, "args": args, "id": f"plan_step_{step.number}_{uuid.uuid4().hex[:8]}", "type": "tool_call"}
+    tc, _ = _fix_args(tc, tool_map)
+    if not set(tc["args"]) <= declared or not required <= set(tc["args"]):
+        return None
+    return tc
+
+
 async def gather_current_state(tool_map: dict, prompt: str = "") -> str:
+    """Snapshot of tables / schemas, /data and memories for the plan prompt.
+
+    With FEATURES["state_cache"] unchanged parts are served from the
+    versioned StateCache, and the snapshot starts with a line saying which
+    parts were refreshed and which are cached.
+    """
     if FEATURES.get("state_skip_optimization", True) and prompt and not _STATE_NEEDED_RE.search(prompt):
         logger.info("[gather_state] skipped (no filesystem/DB keywords in prompt)")
         return "(state gathering skipped)"
 
-    async def _fetch(tool_name: str, label: str, args: dict) -> str | None:
+    cache = get_state_cache() if FEATURES.get("state_cache", True) else None
+    refreshed: list[str] = []
+    cached: list[str] = []
+
+    async def _cached_call(domain: str, key: str, tool_name: str, args: dict):
+        """Invoke tool_name(args) through the cache. Errors propagate and are not cached."""
+        tool = tool_map[tool_name]
+        if cache is not None:
+            hit = cache.get(domain, key, tool)
+            if hit is not None:
+                cached.append(key)
+                return hit
+        version = cache.version(domain) if cache is not None else 0
+        result = await tool.ainvoke(args)
+        if cache is not None:
+            cache.put(domain, key, tool, result, version)
+        refreshed.append(key)
+        return result
+
+    async def _fetch(tool_name: str, label: str, args: dict, domain: str, key: str) -> str | None:
         if tool_name not in tool_map:
             return None
         try:
-            result = await tool_map[tool_name].ainvoke(args)
+            result = await _cached_call(domain, key, tool_name, args)
             return f"[{label}]\n{result}"
         except Exception as e:
             return f"[{label}]\n(error: {e})"
 
+    def _fetch_memories():
+        # search_memories があればプロンプトに関係するメモリだけを載せる（全件ダンプしない）
+        if prompt and "search_memories" in tool_map:
+            key = f"memories:{zlib.crc32(prompt.encode()):08x}"
+            return _fetch("search_memories", "Memories related to the request",
+                          {"query": prompt, "limit": STATE_MEMORY_MATCHES}, "memory", key)
+        return _fetch("list_memories", "Stored memories", {}, "memory", "memories")
+
     t0 = time.perf_counter()
     logger.info("[gather_state] start")
 
+    # describe_schema があれば 1 回の呼び出しで全テーブルのスキーマを取得する
+    if "describe_schema" in tool_map:
+        parallel_results = await asyncio.gather(
+            _fetch("describe_schema", "SQLite schema (columns, ~rows, indexes)", {}, "sqlite", "schema"),
+            _fetch("list_directory", "Files in /data", {"path": "/data"}, "fs", "files"),
+            _fetch_memories(),
+        )
+        return _state_text([r for r in parallel_results if r is not None], refreshed, cached, t0)
+
     # list_tables を先に取得してスキーマ探索に使う
     tables_raw = None
     if "list_tables" in tool_map:
         try:
-            tables_raw = await tool_map["list_tables"].ainvoke({})
+            tables_raw = await _cached_call("sqlite", "tables", "list_tables", {})
         except Exception:
             pass
 
@@ -79,13 +238,14 @@ async def gather_current_state(tool_map: dict, prompt: str = "") -> str:
 
     # ディレクトリ・メモリ・各テーブルスキーマを並列取得
     schema_fetches = [
-        _fetch("query", f"Schema of '{t}' (column names/types)", {"sql": f"PRAGMA table_info({t})"})
+        _fetch("query", f"Schema of '{t}' (column names/types)", {"sql": f"PRAGMA table_info({t})"},
+               "sqlite", f"schema:{t}")
         for t in table_names
         if "query" in tool_map
     ]
     parallel_results = await asyncio.gather(
-        _fetch("list_directory", "Files in /data", {"path": "/data"}),
-        _fetch("list_memories",  "Stored memories", {}),
+        _fetch("list_directory", "Files in /data", {"path": "/data"}, "fs", "files"),
+        _fetch_memories(),
         *schema_fetches,
     )
 
@@ -93,13 +253,41 @@ async def gather_current_state(tool_map: dict, prompt: str = "") -> str:
     if tables_raw is not None:
         parts.append(f"[SQLite tables]\n{tables_raw}")
     parts.extend(r for r in parallel_results if r is not None)
+    return _state_text(parts, refreshed, cached, t0)
 
-    logger.info(f"[gather_state] done in {time.perf_counter() - t0:.1f}s")
-    return "\n\n".join(parts) if parts else "(no state available)"
+
+def _state_text(parts: list[str], refreshed: list[str], cached: list[str], t0: float) -> str:
+    logger.info(
+        f"[gather_state] done in {time.perf_counter() - t0:.1f}s"
+        f" (refreshed={len(refreshed)}, cached={len(cached)})"
+    )
+    if not parts:
+        return "(no state available)"
+    if cached:
+        parts.insert(0, _cache_note(refreshed, cached))
+    return "\n\n".join(parts)
 
 
-async def make_plan(prompt: str, tools: list, tool_map: dict, model) -> str:
-    current_state = await gather_current_state(tool_map, prompt)
+def _cache_note(refreshed: list[str], cached: list[str]) -> str:
+    """One line for the plan prompt: which state parts are fresh, which are cached."""
+    def _names(keys: list[str]) -> str:
+        schemas = [k.split(":", 1)[1] for k in keys if k.startswith("schema:")]
+        names = [k.split(":", 1)[0] for k in keys if not k.startswith("schema:")]
+        if schemas:
+            names.append(f"schemas({', '.join(sorted(schemas))})")
+        return ", ".join(names) or "none"
+    return (
+        f"[State] refreshed: {_names(refreshed)}; "
+        f"unchanged since last check (cached): {_names(cached)}"
+    )
+
+
+async def make_plan(
+    prompt: str, tools: list, tool_map: dict, model, current_state: str | None = None,
+) -> str:
+    """current_state — pre-gathered state (speculative prefetch); gathered here when None."""
+    if current_state is None:
+        current_state = await gather_current_state(tool_map, prompt)
     messages = [
         SystemMessage(content=PLAN_PROMPT.format(
             current_state=current_state,
@@ -109,7 +297,7 @@ async def make_plan(prompt: str, tools: list, tool_map: dict, model) -> str:
     ]
     logger.info("[plan:llm] start")
     t0 = time.perf_counter()
-    result = (await model.ainvoke(messages)).content
+    result = (await llm.acall(model, messages, "plan")).content
     logger.info(f"[plan:llm] done in {time.perf_counter() - t0:.1f}s")
     return result
 
@@ -120,6 +308,7 @@ async def make_plan_steps(
     tool_map: dict,
     model,
     run_logger=None,
+    current_state: str | None = None,
 ) -> list[Step]:
     """Plan, parse, and fix tool names in one call.
 
@@ -127,16 +316,18 @@ async def make_plan_steps(
     previously lived in executor.py.  Keeps executor at Layer 4 with no direct
     dependency on agent.base.fixers.
 
-    run_logger — caller's logger for fix/plan log lines (falls back to module logger).
+    run_logger    — caller's logger for fix/plan log lines (falls back to module logger).
+    current_state — state already gathered by the caller (see make_plan).
     """
     log = run_logger or logger
-    plan_text = await make_plan(prompt, tools, tool_map, model)
+    plan_text = await make_plan(prompt, tools, tool_map, model, current_state)
     steps = parse_steps(plan_text)
     if tool_map and FEATURES.get("plan_tool_name_fixer", True):
         steps, plan_fixes = fix_plan_tool_names(steps, tool_map)
         for fix in plan_fixes:
             log.warning(f"[plan_fix] {fix}")
     log.info(f"[plan]\n{format_checklist(steps)}")
+    events.emit("plan", checklist=format_checklist(steps))
     return steps
 
 
@@ -166,7 +357,7 @@ async def replan(
     ]
     logger.info("[replan:llm] start")
     t0 = time.perf_counter()
-    result = (await model.ainvoke(messages)).content
+    result = (await llm.acall(model, messages, "replan")).content
     logger.info(f"[replan:llm] done in {time.perf_counter() - t0:.1f}s")
     return result
 
@@ -188,4 +379,5 @@ async def _apply_replan(
     done_steps = [s for s in steps if s.status == "done"]
     merged = done_steps + new_steps
     logger.info(f"[replan]\n{format_checklist(merged)}")
+    events.emit("plan", checklist=format_checklist(merged))
     return merged, len(done_steps)
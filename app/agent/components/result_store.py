@@ -0,0 +1,76 @@
+"""Session-scoped store of full tool results (FEATURES["result_store"]).
+
+_trim_tool_result() cuts long results to fit the context, and the cut part
+used to be gone for good — the model could only call the tool again.  With
+the store, every trimmed result is kept in full under a short handle ("r3")
+and the ToolMessage ends with a pointer to it.  The built-in read_result
+tool pages in more of it on demand:
+
+  read_result(handle="r3", offset=1500, length=1500)
+
+One store lives for one exec / react loop run.  It holds at most
+RESULT_STORE_MAX_CHARS; the oldest results are dropped first.
+"""
+
+from collections import OrderedDict
+
+from langchain_core.tools import StructuredTool
+
+from config import READ_RESULT_DEFAULT_CHARS, READ_RESULT_MAX_CHARS, RESULT_STORE_MAX_CHARS
+
+READ_RESULT_TOOL_NAME = "read_result"
+
+
+class ResultStore:
+    """Full tool results by handle, bounded by total size."""
+
+    def __init__(self, max_chars: int = RESULT_STORE_MAX_CHARS):
+        self._max_chars = max_chars
+        self._results: OrderedDict[str, tuple[str, str]] = OrderedDict()   # handle → (tool, text)
+        self._size = 0
+        self._seq = 0
+        self.tool = StructuredTool.from_function(
+            func=self.read,
+            name=READ_RESULT_TOOL_NAME,
+            description=(
+                "Read more of an earlier tool result that was truncated. "
+                "handle: the handle shown in the truncation note (e.g. \"r3\"); "
+                "offset: character position to start from; length: number of characters."
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def put(self, tool_name: str, text: str) -> str:
+        """Store *text* and return its handle."""
+        self._seq += 1
+        handle = f"r{self._seq}"
+        self._results[handle] = (tool_name, text)
+        self._size += len(text)
+        while self._size > self._max_chars and len(self._results) > 1:
+            _, (_, dropped) = self._results.popitem(last=False)
+            self._size -= len(dropped)
+        return handle
+
+    def read(self, handle: str, offset: int = 0, length: int = READ_RESULT_DEFAULT_CHARS) -> str:
+        """Return characters offset..offset+length of the stored result *handle*."""
+        handle = handle.strip().strip("\"'")
+        if handle not in self._results:
+            known = ", ".join(self._results) or "none"
+            return f"Error: unknown result handle '{handle}' (available: {known})"
+        tool_name, text = self._results[handle]
+        offset = max(0, min(int(offset), len(text)))
+        end = min(len(text), offset + max(1, min(int(length), READ_RESULT_MAX_CHARS)))
+        header = f"[{handle}: {tool_name} result, chars {offset}-{end} of {len(text)}]"
+        footer = (
+            f"\n[more: read_result(handle=\"{handle}\", offset={end})]" if end < len(text) else "\n[end of result]"
+        )
+        return f"{header}\n{text[offset:end]}{footer}"
+
+    def note(self, handle: str, total_chars: int) -> str:
+        """Pointer appended to a trimmed ToolMessage."""
+        return (
+            f"\n[full result stored as {handle} ({total_chars} chars); "
+            f"call read_result(handle=\"{handle}\", offset=0) to read the omitted parts]"
+        )
@@ -0,0 +1,217 @@
+"""Tiered intent router: decision cache and local n-gram classifier.
+
+classify_intent() costs a full LLM round trip (router prompt prefill plus
+generation) for every prompt _quick_classify's regex does not catch.  The
+tiers in front of it, cheapest first:
+
+  1. cache       — LRU of past decisions keyed by the normalized prompt
+  2. classifier  — multinomial naive Bayes over hashed character n-grams,
+                   trained from logged LLM decisions (ROUTER_LOG_FILE);
+                   answers only when its posterior ≥ ROUTER_CLASSIFIER_THRESHOLD
+  3. LLM         — classify_intent() in agent/executor.py; its decision is
+                   cached, learned online and appended to the log
+
+Character n-grams work for Japanese without a tokenizer.  Only LLM outputs
+that contained CHAT/AGENT explicitly are used as training labels.
+
+The log (FEATURES["router_log"]) is appended off the event loop and rotated
+at ROUTER_LOG_MAX_BYTES into one backup (router.jsonl.1), which is loaded
+too, so training data stays bounded.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import re
+import threading
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+
+from config import (
+    FEATURES,
+    LOG_DIR,
+    ROUTER_CACHE_SIZE,
+    ROUTER_CLASSIFIER_THRESHOLD,
+    ROUTER_HASH_BUCKETS,
+    ROUTER_LOG_MAX_BYTES,
+    ROUTER_MIN_EXAMPLES,
+    ROUTER_NGRAM_MAX,
+)
+
+logger = logging.getLogger("agent")
+
+ROUTER_LOG_FILE = LOG_DIR / "router.jsonl"
+_INTENTS = ("chat", "agent")
+_NB_ALPHA = 0.5
+
+_TRAILING_PUNCT_RE = re.compile(r"[\s。．.!！?？、,，~〜ー]+$")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """NFKC + lower-case + collapsed whitespace, trailing punctuation removed."""
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    text = " ".join(text.split())
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+def _features(text: str) -> Counter:
+    """Hashed character 1..ROUTER_NGRAM_MAX-grams of *text* (with boundary marks)."""
+    padded = f"\x02{text}\x03"
+    feats: Counter = Counter()
+    for n in range(1, ROUTER_NGRAM_MAX + 1):
+        for i in range(len(padded) - n + 1):
+            feats[zlib.crc32(padded[i:i + n].encode()) % ROUTER_HASH_BUCKETS] += 1
+    return feats
+
+
+class NgramClassifier:
+    """Online multinomial naive Bayes over hashed character n-grams."""
+
+    def __init__(self):
+        self._docs = {c: 0 for c in _INTENTS}
+        self._totals = {c: 0 for c in _INTENTS}
+        self._counts: dict[str, Counter] = {c: Counter() for c in _INTENTS}
+        self._vocab: set[int] = set()
+
+    @property
+    def examples(self) -> dict[str, int]:
+        return dict(self._docs)
+
+    def learn(self, text: str, intent: str) -> None:
+        feats = _features(text)
+        self._docs[intent] += 1
+        self._totals[intent] += sum(feats.values())
+        self._counts[intent].update(feats)
+        self._vocab.update(feats)
+
+    def predict(self, text: str) -> tuple[str, float] | None:
+        """Return (intent, posterior), or None until every class has enough examples."""
+        if min(self._docs.values()) < ROUTER_MIN_EXAMPLES:
+            return None
+        feats = _features(text)
+        n_docs = sum(self._docs.values())
+        vocab = len(self._vocab) + 1
+        # Overlapping n-grams are far from independent, so raw NB posteriors
+        # are ~1.0 for almost any text.  Tempering the likelihood by
+        # sqrt(#n-grams) keeps the confidence threshold meaningful.
+        temper = math.sqrt(sum(feats.values()) or 1)
+        scores = {}
+        for c in _INTENTS:
+            denom = math.log(self._totals[c] + _NB_ALPHA * vocab)
+            scores[c] = math.log(self._docs[c] / n_docs) + sum(
+                k * (math.log(self._counts[c][f] + _NB_ALPHA) - denom) for f, k in feats.items()
+            ) / temper
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / norm
+
+
+class IntentRouter:
+    """Cache + classifier tiers in front of the router LLM (process-wide)."""
+
+    def __init__(self, log_file=ROUTER_LOG_FILE, cache_size: int = ROUTER_CACHE_SIZE,
+                 max_log_bytes: int = ROUTER_LOG_MAX_BYTES):
+        self._log_file = log_file
+        self._backup_file = log_file.with_name(log_file.name + ".1")
+        self._max_log_bytes = max_log_bytes
+        self._log_lock = threading.Lock()   # appends run in worker threads
+        self._cache_size = cache_size
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self.classifier = NgramClassifier()
+        self._llm_sec = 0.0          # EWMA of router LLM latency
+        self.stats = {"keyword": 0, "cache": 0, "classifier": 0, "llm": 0, "saved_sec": 0.0}
+        self._load()
+
+    def _load(self) -> None:
+        lines: list[str] = []
+        for path in (self._backup_file, self._log_file):   # oldest first
+            try:
+                lines += path.read_text(encoding="utf-8").splitlines()
+            except OSError:
+                pass
+        if not lines:
+            return
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("intent") in _INTENTS and rec.get("prompt"):
+                self._remember(rec["prompt"], rec["intent"])
+                if rec.get("llm_sec"):
+                    self._observe_llm(rec["llm_sec"])
+        logger.info(f"[router] loaded {len(lines)} logged decisions {self.classifier.examples}")
+
+    def _remember(self, key: str, intent: str) -> None:
+        self._cache[key] = intent
+        self._cache.move_to_end(key)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        self.classifier.learn(key, intent)
+
+    def _observe_llm(self, sec: float) -> None:
+        self._llm_sec = sec if self._llm_sec == 0.0 else 0.8 * self._llm_sec + 0.2 * sec
+
+    def _hit(self, tier: str) -> None:
+        self.stats[tier] += 1
+        self.stats["saved_sec"] += self._llm_sec
+
+    def lookup(self, prompt: str, use_classifier: bool = True) -> tuple[str, str] | None:
+        """Return (intent, tier) from the cache or a confident classifier, else None."""
+        key = normalize_prompt(prompt)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self._hit("cache")
+            return self._cache[key], "cache"
+        if use_classifier:
+            pred = self.classifier.predict(key)
+            if pred and pred[1] >= ROUTER_CLASSIFIER_THRESHOLD:
+                self._hit("classifier")
+                logger.info(f"[router] classifier → {pred[0]} (p={pred[1]:.3f})")
+                return pred[0], "classifier"
+        return None
+
+    def count(self, tier: str) -> None:
+        """Count a decision made outside lookup() ("keyword" / "llm")."""
+        self.stats[tier] += 1
+
+    async def record(self, prompt: str, intent: str, llm_sec: float, *, confident: bool = True) -> None:
+        """Learn from a router LLM decision and append it to the training log."""
+        self.count("llm")
+        self._observe_llm(llm_sec)
+        if not confident:
+            return   # fallback "agent" on unparseable output is not a label
+        key = normalize_prompt(prompt)
+        self._remember(key, intent)
+        if FEATURES.get("router_log", True):
+            line = json.dumps({"prompt": key, "intent": intent, "llm_sec": round(llm_sec, 3)},
+                              ensure_ascii=False) + "\n"
+            await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        """Append one decision, first rotating the log once it reaches max_log_bytes."""
+        with self._log_lock:
+            try:
+                self._log_file.parent.mkdir(exist_ok=True)
+                try:
+                    if self._log_file.stat().st_size >= self._max_log_bytes:
+                        self._log_file.replace(self._backup_file)
+                except FileNotFoundError:
+                    pass
+                with self._log_file.open("a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                logger.warning(f"[router] could not append to {self._log_file}: {e}")
+
+
+_ROUTER: IntentRouter | None = None
+
+
+def get_router() -> IntentRouter:
+    """Return the process-wide router, loading the decision log on first use."""
+    global _ROUTER
+    if _ROUTER is None:
+        _ROUTER = IntentRouter()
+    return _ROUTER
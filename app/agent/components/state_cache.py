@@ -0,0 +1,93 @@
+"""Versioned cache of the environment state shown to the planner.
+
+gather_current_state() fans out into list_tables, one PRAGMA table_info per
+table, list_directory /data and list_memories before every plan.  Most of
+that is unchanged between plans (and between requests), so each result is
+cached with the version of the domain it describes:
+
+  sqlite  — table list and per-table schemas
+  fs      — /data listing
+  memory  — stored memories (or search_memories results, keyed per prompt)
+
+Every tool call dispatched by the loops goes through invalidate(); a
+mutating call (tool_effects.affected_domains: write_file, DDL/DML query,
+remember / forget, execute_command, ...) bumps its domain's version, which
+makes the entries of that domain stale.  STATE_CACHE_TTL bounds how long a
+change made outside the agent (e.g. a file copied into /data) can go unseen.
+
+Entries also remember the tool object that produced them, so a reconnected
+MCP server (new tool objects) is never answered from the old session's data.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from agent.base.tool_effects import affected_domains
+from config import STATE_CACHE_TTL
+
+# Per-prompt entries (memory search results) would otherwise grow without bound.
+_MAX_ENTRIES = 256
+
+
+@dataclass
+class _Entry:
+    tool: object
+    version: int
+    value: object
+    fetched_at: float
+
+
+class StateCache:
+    """Process-wide state snapshot, invalidated per domain by mutating tool calls."""
+
+    def __init__(self, ttl: float = STATE_CACHE_TTL):
+        self._ttl = ttl
+        self._versions: dict[str, int] = defaultdict(int)
+        self._entries: dict[tuple[str, str], _Entry] = {}
+
+    def version(self, domain: str) -> int:
+        return self._versions[domain]
+
+    def get(self, domain: str, key: str, tool) -> object | None:
+        """Cached value for (domain, key) produced by *tool*, or None when stale / missing."""
+        entry = self._entries.get((domain, key))
+        if (
+            entry is None
+            or entry.tool is not tool
+            or entry.version != self._versions[domain]
+            or time.monotonic() - entry.fetched_at > self._ttl
+        ):
+            return None
+        return entry.value
+
+    def put(self, domain: str, key: str, tool, value: object, version: int | None = None) -> None:
+        """Store *value*; pass the version read before fetching so a mutation that
+        lands while the fetch is in flight leaves the entry stale."""
+        if version is None:
+            version = self._versions[domain]
+        self._entries[(domain, key)] = _Entry(tool, version, value, time.monotonic())
+        if len(self._entries) > _MAX_ENTRIES:
+            oldest = min(self._entries, key=lambda k: self._entries[k].fetched_at)
+            del self._entries[oldest]
+
+    def invalidate(self, tc: dict) -> set[str]:
+        """Bump the version of every domain *tc* may have changed; returns those domains."""
+        domains = affected_domains(tc)
+        for d in domains:
+            self._versions[d] += 1
+        return domains
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_CACHE: StateCache | None = None
+
+
+def get_state_cache() -> StateCache:
+    """Return the process-wide state cache."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = StateCache()
+    return _CACHE
@@ -0,0 +1,146 @@
+"""Memoized results of idempotent tool calls (FEATURES["tool_memo"]).
+
+Across replans (and across requests) the agent keeps re-running the same
+read-only calls: list_directory /data, read_file of a file nothing touched,
+web_search with the same query.  Each of those is an MCP round trip, and a
+web_search is seconds of network.  _invoke_tools() asks this memo first:
+
+  key    — tool name + canonical JSON of the args (sorted keys)
+  TTL    — per tool, TOOL_MEMO_TTL; tools not listed there (and mutating
+           calls such as write_file or a DML query) are never memoized,
+           nor is SQL whose result depends on when it runs ('now',
+           CURRENT_TIMESTAMP, random(), changes(), ...)
+  value  — the result string; errors are not memoized
+
+Every dispatched call also goes through invalidate(): a mutating call drops
+the entries whose result it may have changed (tool_effects.invalidates —
+overlapping path, written table, same memory key; execute_command drops
+everything it can reach).  Changes made outside the agent (or through SQL
+views / triggers) are bounded by the TTL only, as with the StateCache.
+
+Entries remember the tool object that produced them, so a reconnected MCP
+server (new tool objects) is never answered from the old session's results.
+"""
+
+import json
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from agent.base.tool_effects import invalidates, is_mutating
+from config import TOOL_MEMO_MAX_ENTRIES, TOOL_MEMO_TTL
+
+_REQUEST_STATS: ContextVar[dict | None] = ContextVar("tool_memo_stats", default=None)
+
+# Read-only SQL that still returns something different on every run.
+# ('now' covers date / time / datetime / julianday / strftime / unixepoch.)
+_NONDETERMINISTIC_SQL_RE = re.compile(
+    r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\("
+    r"|\bCURRENT_(?:TIMESTAMP|DATE|TIME)\b"
+    r"|'now'",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class _Entry:
+    tool: object
+    tc: dict
+    value: str
+    expires_at: float
+
+
+def memo_key(tc: dict) -> str:
+    """Canonical cache key: argument order and JSON spacing do not matter."""
+    args = json.dumps(tc.get("args", {}), sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"{tc['name']}:{args}"
+
+
+class ToolMemo:
+    """Process-wide LRU of idempotent tool results, invalidated by mutating calls."""
+
+    def __init__(self, ttl: dict[str, float] | None = None, max_entries: int = TOOL_MEMO_MAX_ENTRIES):
+        self._ttl = TOOL_MEMO_TTL if ttl is None else ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ttl(self, tc: dict) -> float:
+        """Seconds a result of *tc* may be reused; 0 for tools that are not memoized."""
+        if is_mutating(tc) or _NONDETERMINISTIC_SQL_RE.search(str(tc.get("args", {}).get("sql", ""))):
+            return 0.0
+        return self._ttl.get(tc["name"], 0.0)
+
+    def generation(self) -> int:
+        """Read before invoking the tool and pass to put(): a mutation that lands
+        while the call is in flight keeps its (possibly stale) result out."""
+        return self._generation
+
+    def get(self, tc: dict, tool) -> str | None:
+        """Memoized result of *tc* produced by *tool*, or None (counted as a miss)."""
+        if not self.ttl(tc):
+            return None
+        key = memo_key(tc)
+        entry = self._entries.get(key)
+        if entry is not None and (entry.tool is not tool or time.monotonic() > entry.expires_at):
+            del self._entries[key]
+            entry = None
+        self._count("hits" if entry is not None else "misses")
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, tc: dict, tool, value: str, generation: int | None = None) -> None:
+        ttl = self.ttl(tc)
+        if not ttl or (generation is not None and generation != self._generation):
+            return
+        key = memo_key(tc)
+        self._entries[key] = _Entry(tool, tc, value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, tc: dict) -> int:
+        """Drop every entry *tc* may have made stale; returns how many were dropped."""
+        if not is_mutating(tc):
+            return 0
+        self._generation += 1
+        stale = [k for k, e in self._entries.items() if invalidates(tc, e.tc)]
+        for k in stale:
+            del self._entries[k]
+        self.stats["invalidated"] += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _count(self, field: str) -> None:
+        self.stats[field] += 1
+        request_stats = _REQUEST_STATS.get()
+        if request_stats is not None:
+            request_stats[f"tool_memo_{field}"] += 1
+
+
+def track_request() -> dict:
+    """Start counting memo hits / misses for the current request; returns the live dict."""
+    stats = {"tool_memo_hits": 0, "tool_memo_misses": 0}
+    _REQUEST_STATS.set(stats)
+    return stats
+
+
+_MEMO: ToolMemo | None = None
+
+
+def get_tool_memo() -> ToolMemo:
+    """Return the process-wide tool memo."""
+    global _MEMO
+    if _MEMO is None:
+        _MEMO = ToolMemo()
+    return _MEMO
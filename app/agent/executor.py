@@ -1,3 +1,4 @@
+import asyncio
 import re
 import time
 
@@ -5,20 +6,17 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
 import core.llm as llm
-from agent.components.planner import make_plan_steps
+from agent.components import tool_memo
+from agent.components.mcp_pool import get_mcp_pool
+from agent.components.planner import gather_current_state, make_plan_steps
+from agent.components.router import IntentRouter, get_router
 from agent.loops.exec_loop import run_exec_loop
 from agent.loops.react_loop import run_react_loop
 from config import AGENT_MODE, FEATURES
+from core import events, scheduler
 from core.prompts import CHAT_PROMPT, ROUTER_PROMPT
-from core.utils import _sanitize, setup_logging
-from servers import (
-    FILESYSTEM_CONFIG,
-    MEMORY_CONFIG,
-    SHELL_CONFIG,
-    SQLITE_CONFIG,
-    TIME_CONFIG,
-    WEBSEARCH_CONFIG,
-)
+from core.utils import MetricsLogger, _sanitize, setup_logging
+from servers import MCP_SERVERS
 
 
 # Patterns that are unambiguously conversational — no LLM call needed.
@@ -37,27 +35,78 @@ def _quick_classify(prompt: str) -> str | None:
     return None
 
 
-async def classify_intent(prompt: str, model, logger) -> str:
+async def classify_intent(prompt: str, model, logger, router: IntentRouter | None = None) -> str:
     """Classify prompt as 'chat' or 'agent' with a single lightweight LLM call.
 
     Defaults to 'agent' on any ambiguous or unexpected output to ensure
     tool-requiring tasks are never silently dropped.
+
+    router — when given, the decision is cached and learned (only explicit
+             CHAT/AGENT outputs are used as training labels).
     """
     t0 = time.perf_counter()
     logger.info("[router] classifying intent...")
-    response = await model.ainvoke([
+    response = await llm.acall(model, [
         SystemMessage(content=ROUTER_PROMPT),
         HumanMessage(content=prompt),
-    ])
+    ], "router")
     # Strip <think>...</think> blocks emitted by reasoning models (deepseek-r1, etc.)
     # before checking for CHAT/AGENT, then search anywhere in the response.
     raw = re.sub(r"<think>.*?</think>", "", response.content, flags=re.DOTALL).strip().upper()
     m = re.search(r"\b(CHAT|AGENT)\b", raw)
     intent = "chat" if (m and m.group(1) == "CHAT") else "agent"
-    logger.info(f"[router] raw={raw[:120]!r} → intent={intent} ({time.perf_counter() - t0:.1f}s)")
+    elapsed = time.perf_counter() - t0
+    logger.info(f"[router] raw={raw[:120]!r} → intent={intent} ({elapsed:.1f}s)")
+    if router is not None:
+        await router.record(prompt, intent, elapsed, confident=m is not None)
     return intent
 
 
+async def _load_tools(logger) -> tuple[list, dict, dict]:
+    """Return (tools, tool_map, startup_stats) for the agent path.
+
+    Uses the process-wide session pool when FEATURES["mcp_session_pool"] is on;
+    otherwise spawns a one-off MultiServerMCPClient (cold start every request).
+    """
+    if FEATURES.get("mcp_session_pool", True):
+        return await get_mcp_pool().acquire()
+
+    t0 = time.perf_counter()
+    client = MultiServerMCPClient(MCP_SERVERS)
+    tools = await client.get_tools()
+    elapsed = time.perf_counter() - t0
+    logger.info(f"[mcp] cold start: {len(tools)} tools in {elapsed:.2f}s")
+    stats = {"mcp_startup_sec": round(elapsed, 3), "mcp_cold_start": True, "mcp_reconnects": 0}
+    return tools, {t.name: t for t in tools}, stats
+
+
+# Process-wide totals for speculative agent preparation (see _prepare_agent).
+SPECULATION_STATS: dict = {"started": 0, "used": 0, "cancelled": 0, "saved_sec": 0.0, "wasted_sec": 0.0}
+
+
+async def _prepare_agent(prompt: str, logger, plan_model=None) -> dict:
+    """Agent-path setup that does not depend on the router's answer.
+
+    Loads tools and, in plan_exec mode, gathers the current state (and plans
+    when *plan_model* is given).  Run speculatively alongside the router LLM
+    by run(); cancelled if the router says "chat".  The MCP acquire is
+    shielded so a cancelled speculation still leaves the pool warm.
+    """
+    t0 = time.perf_counter()
+    tools, tool_map, mcp_stats = await asyncio.shield(_load_tools(logger))
+    current_state = steps = None
+    if AGENT_MODE != "react":
+        current_state = await gather_current_state(tool_map, prompt)
+        if plan_model is not None:
+            steps = await make_plan_steps(prompt, tools, tool_map, plan_model, logger,
+                                          current_state=current_state)
+    return {
+        "tools": tools, "tool_map": tool_map, "mcp_stats": mcp_stats,
+        "current_state": current_state, "steps": steps,
+        "elapsed": time.perf_counter() - t0,
+    }
+
+
 async def run(prompt: str) -> str | None:
     logger = setup_logging()
 
@@ -70,41 +119,82 @@ async def run(prompt: str) -> str | None:
     replan_model = llm.get_llm("replan")
 
     logger.info(f"prompt: {prompt}")
-
-    # --- Router: keyword pre-filter, then LLM fallback ---
-    intent = _quick_classify(prompt)
+    queue_stats = scheduler.track_request()
+    memo_stats = tool_memo.track_request()
+
+    # --- Router: keyword pre-filter → decision cache → n-gram classifier → LLM ---
+    router = get_router() if FEATURES.get("router_cache", True) else None
+    spec: asyncio.Task | None = None
+    t_router = time.perf_counter()
+    intent, tier = _quick_classify(prompt), "keyword"
     if intent:
         logger.info(f"[router] quick_classify → {intent}")
+        if router:
+            router.count("keyword")
+    elif router and (hit := router.lookup(prompt, FEATURES.get("router_classifier", True))):
+        intent, tier = hit
+        logger.info(f"[router] {tier} → {intent}")
     else:
-        intent = await classify_intent(prompt, router_model, logger)
+        # Most LLM-routed prompts end up "agent": prepare it while the router runs.
+        if FEATURES.get("speculative_agent", True):
+            spec_plan = plan_model if FEATURES.get("speculative_plan", False) else None
+            spec = asyncio.create_task(_prepare_agent(prompt, logger, spec_plan))
+            SPECULATION_STATS["started"] += 1
+        try:
+            intent, tier = await classify_intent(prompt, router_model, logger, router), "llm"
+        except BaseException:
+            # Router failed or the request was cancelled (client disconnect):
+            # the speculation must not keep running (or holding a scheduler slot).
+            if spec is not None:
+                spec.cancel()
+                SPECULATION_STATS["cancelled"] += 1
+            raise
+    router_sec = time.perf_counter() - t_router
+    events.emit("router", intent=intent, source=tier)
 
     if intent == "chat":
-        response = await chat_model.ainvoke([
+        if spec is not None:
+            wasted = spec.result()["elapsed"] if spec.done() and not spec.exception() else router_sec
+            spec.cancel()
+            SPECULATION_STATS["cancelled"] += 1
+            SPECULATION_STATS["wasted_sec"] += wasted
+            logger.info(f"[speculate] cancelled (chat); wasted {wasted:.1f}s of agent prep")
+        response = await llm.acall(chat_model, [
             SystemMessage(content=CHAT_PROMPT),
             HumanMessage(content=prompt),
-        ])
+        ], "chat")
         answer = _sanitize(response.content)
         logger.info(f"[chat] answer: {answer}")
         return answer
 
     # --- Agent mode: route by AGENT_MODE ---
-    client = MultiServerMCPClient({
-        "filesystem": FILESYSTEM_CONFIG,
-        "shell":      SHELL_CONFIG,
-        "websearch":  WEBSEARCH_CONFIG,
-        "time":       TIME_CONFIG,
-        "sqlite":     SQLITE_CONFIG,
-        "memory":     MEMORY_CONFIG,
-    })
-    tools = await client.get_tools()
-    tool_map = {t.name: t for t in tools}
+    metrics = MetricsLogger(model_name=getattr(exec_model, "model", "unknown"), prompt=prompt)
+    if spec is not None:
+        prep = await spec
+        # Prep work that overlapped the router call no longer sits on the critical path.
+        saved = min(prep["elapsed"], router_sec)
+        SPECULATION_STATS["used"] += 1
+        SPECULATION_STATS["saved_sec"] += saved
+        metrics.log_speculation(saved)
+        logger.info(f"[speculate] used; saved {saved:.1f}s")
+    else:
+        prep = await _prepare_agent(prompt, logger)
+    tools, tool_map = prep["tools"], prep["tool_map"]
+    metrics.log_mcp_startup(prep["mcp_stats"])
+    metrics.log_llm_queue(queue_stats)
+    metrics.log_tool_memo(memo_stats)
+    metrics.log_router(tier, router_sec)
 
     logger.info(f"[executor] agent_mode={AGENT_MODE}")
 
     if AGENT_MODE == "react":
-        return await run_react_loop(prompt, tools, tool_map, exec_model, logger)
+        return await run_react_loop(prompt, tools, tool_map, exec_model, logger,
+                                    metrics=metrics)
 
     # plan_exec (default): Plan-and-Execute
-    steps = await make_plan_steps(prompt, tools, tool_map, plan_model, logger)
+    steps = prep["steps"]
+    if steps is None:
+        steps = await make_plan_steps(prompt, tools, tool_map, plan_model, logger,
+                                      current_state=prep["current_state"])
     return await run_exec_loop(prompt, steps, tools, tool_map, exec_model, logger,
-                               replan_model=replan_model)
+                               replan_model=replan_model, metrics=metrics)
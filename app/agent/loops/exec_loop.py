@@ -6,13 +6,14 @@ updates step status, and triggers replanning on failures.
 Helpers are split across:
   agent/base/fixers.py           — tool name / arg / content correction (via apply_fixers)
   agent/components/loop_helpers  — tool invocation, step status, trimming, window, watchdog
+  agent/components/compactor     — digest of turns evicted by the window
 """
 
 import asyncio
 import time
 from collections import defaultdict
 
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 from config import (
     EXEC_TIMEOUT,
@@ -21,40 +22,107 @@ from config import (
     MAX_REPLANS,
     MAX_STEPS,
 )
+from agent.components.compactor import HistoryCompactor
+from agent.components.result_store import ResultStore
+from agent.components.planner import compile_step
 from agent.components.loop_helpers import (
-    _apply_window,
+    _build_context,
     _build_watchdog_hint,
     _do_replan,
-    _invoke_tool,
-    _trim_tool_result,
+    _history_line,
+    _invoke_tools,
+    _mark_step,
+    _result_message,
+    _tools_tokens,
     _update_step,
     apply_fixers,
 )
-from core.models import Step, format_checklist
+import core.llm as llm
+from core import events
+from core.llm import context_budget
+from core.models import Step, format_checklist, ready_steps
 from core.prompts import SYSTEM_PROMPT
-from core.utils import MetricsLogger, _sanitize, _task_message
+from core.utils import MetricsLogger, _llm_usage, _sanitize, _task_message
+
+
+async def _run_direct_steps(
+    steps: list[Step], tool_map: dict, messages: list,
+    execution_history: list[str], metrics: MetricsLogger, logger,
+    store: ResultStore | None = None,
+    tool_failure_counts: dict[str, int] | None = None,
+    concurrent: bool = True,
+) -> tuple[int, bool]:
+    """Run plan steps whose tool call compiles without the LLM.
+
+    concurrent=True (step_dag): each wave of ready steps is dispatched together
+    through _invoke_tools, so independent steps run concurrently; completing a
+    wave may unlock the next.  concurrent=False (step_fast_path only): just the
+    next step in plan order, one at a time.
+    Failed calls are counted in tool_failure_counts as on the LLM path.
+    Returns (number of steps executed, whether the last batch had a failure).
+    """
+    executed = 0
+    while True:
+        if concurrent:
+            candidates = ready_steps(steps)
+        else:
+            nxt = next((s for s in steps if s.status != "done"), None)
+            candidates = [nxt] if nxt is not None and nxt.status == "pending" else []
+        batch = [(s, tc) for s in candidates if (tc := compile_step(s, tool_map))]
+        if not batch:
+            return executed, False
+        tcs = [tc for _, tc in batch]
+        for tc in tcs:
+            logger.info(f"[direct] {tc['name']}({tc['args']})")
+        messages.append(AIMessage(content="", tool_calls=tcs))
+
+        results = await _invoke_tools(tcs, tool_map)
+
+        for (step, tc), (result_str, is_error) in zip(batch, results):
+            logger.info(f"[Tool Result] {result_str[:500]}")
+            _mark_step(step, is_error, result_str)
+            metrics.log_direct_step(step.number, tc["name"], is_error)
+            execution_history.append(_history_line(tc, result_str, is_error))
+            messages.append(_result_message(tc, result_str, logger, store))
+            if is_error and tool_failure_counts is not None:
+                tool_failure_counts[tc["name"]] += 1
+        executed += len(batch)
+        # A failed step is left to the LLM turn (fixers / replan), not retried here.
+        if any(is_error for _, is_error in results):
+            return executed, True
 
 
 async def run_exec_loop(
     prompt: str, steps: list[Step], tools: list, tool_map: dict,
     model, logger, replan_model=None,
+    metrics: MetricsLogger | None = None,
 ) -> str | None:
     """Execute the plan loop.
 
     model        — LLM for exec turns (tool calling).
     replan_model — LLM for replan calls (defaults to model when None).
                    Use a model with higher num_predict for better replan quality.
+    metrics      — session MetricsLogger from run() (created here when None).
     """
     if replan_model is None:
         replan_model = model
-    llm_with_tools = model.bind_tools(tools)
+    # Full text of trimmed results, paged back in by the read_result tool.
+    store = ResultStore() if FEATURES.get("result_store", True) else None
+    exec_tools = tools + [store.tool] if store is not None else tools
+    if store is not None:
+        tool_map = {**tool_map, store.tool.name: store.tool}
+    llm_with_tools = llm.bind_tools(model, exec_tools)
+    # Prompt tokens available for System + Task + history (token_budget_window).
+    budget = context_budget("exec") - _tools_tokens(exec_tools)
+    compactor = HistoryCompactor(model) if FEATURES.get("history_compaction", True) else None
     execution_history: list[str] = []
     consecutive_failures = 0
     replan_count = 0
     current_step_idx = 0
 
-    model_name: str = getattr(model, "model", "unknown")
-    metrics = MetricsLogger(model_name=model_name, prompt=prompt)
+    if metrics is None:
+        model_name: str = getattr(model, "model", "unknown")
+        metrics = MetricsLogger(model_name=model_name, prompt=prompt)
     # Tracks total failures per tool name across all replans (never resets).
     # Used by the Execution Watchdog to detect tools that keep failing.
     tool_failure_counts: dict[str, int] = defaultdict(int)
@@ -77,20 +145,35 @@ async def run_exec_loop(
             metrics.write_summary(steps, termination="timeout")
             return None
 
-        ctx_messages = messages
-        if FEATURES.get("message_window", False):
-            ctx_messages, truncated = _apply_window(messages)
-            if truncated:
-                logger.info(
-                    f"[window] {len(messages)} → {len(ctx_messages)} messages"
-                    f" (dropped {len(messages) - len(ctx_messages)} oldest)"
-                )
+        # step_dag runs ready steps in concurrent waves; step_fast_path alone
+        # runs only the next step in plan order.
+        concurrent = FEATURES.get("step_dag", True)
+        direct = concurrent or FEATURES.get("step_fast_path", True)
+        executed, direct_failed = 0, False
+        if direct:
+            executed, direct_failed = await _run_direct_steps(
+                steps, tool_map, messages, execution_history, metrics, logger, store,
+                tool_failure_counts=tool_failure_counts, concurrent=concurrent,
+            )
+        if executed:
+            consecutive_failures = consecutive_failures + 1 if direct_failed else 0
+            logger.info(f"[checklist]\n{format_checklist(steps)}")
+            events.emit("checklist", checklist=format_checklist(steps))
+            messages.append(HumanMessage(content=_task_message(prompt, steps)))
+            current_step_idx = next(
+                (i for i, s in enumerate(steps) if s.status != "done"), len(steps)
+            )
+
+        ctx_messages = _build_context(
+            messages, budget, logger,
+            compactor=compactor, execution_history=execution_history, steps=steps,
+        )
 
         logger.info(f"[exec:llm] start (turn {turn + 1}, step {current_step_idx + 1}/{len(steps)})")
         t0 = time.perf_counter()
         try:
             response = await asyncio.wait_for(
-                llm_with_tools.ainvoke(ctx_messages), timeout=_remaining()
+                llm.acall(llm_with_tools, ctx_messages, "exec"), timeout=_remaining()
             )
         except asyncio.TimeoutError:
             elapsed = time.perf_counter() - loop_start
@@ -101,10 +184,14 @@ async def run_exec_loop(
             logger.error(f"[exec:llm] LLM呼び出しエラー: {type(e).__name__}: {e}")
             metrics.write_summary(steps, termination="llm_error")
             return f"[エラー] このモデルはツール呼び出しに非対応か、LLM呼び出しに失敗しました: {e}"
-        logger.info(f"[exec:llm] done in {time.perf_counter() - t0:.1f}s")
+        usage = _llm_usage(response)
+        logger.info(
+            f"[exec:llm] done in {time.perf_counter() - t0:.1f}s"
+            + (f" (prefill {usage['prompt_eval_count']} tok / {usage['prompt_eval_ms']}ms)" if usage else "")
+        )
 
         if not response.tool_calls:
-            metrics.log_turn(turn=turn + 1, tool_called=False)
+            metrics.log_turn(turn=turn + 1, tool_called=False, llm_stats=usage)
             pending_steps = [s for s in steps if s.status == "pending"]
             if (pending_steps or consecutive_failures > 0) and replan_count < MAX_REPLANS:
                 replan_count += 1
@@ -130,44 +217,57 @@ async def run_exec_loop(
             metrics.write_summary(steps, termination="answer")
             return answer
 
-        tc = response.tool_calls[0]
-        tc, tool_name_fix, arg_fixes = apply_fixers(tc, tool_map, logger)
+        # --- Dispatch every tool call of this turn (concurrently where safe) ---
+        tool_calls = response.tool_calls
+        if not FEATURES.get("parallel_tool_calls", True):
+            tool_calls = tool_calls[:1]
+        fixed = [apply_fixers(tc, tool_map, logger) for tc in tool_calls]
+        tcs = [tc for tc, _, _ in fixed]
 
-        logger.info(f"[Tool Call] {tc['name']}({tc['args']})")
-        messages.append(AIMessage(content=response.content, tool_calls=[tc]))
+        for tc in tcs:
+            logger.info(f"[Tool Call] {tc['name']}({tc['args']})")
+        messages.append(AIMessage(content=response.content, tool_calls=tcs))
 
-        result_str, is_error = await _invoke_tool(tc, tool_map)
-        logger.info(f"[Tool Result] {result_str[:500]}")
+        memo_hits: set[int] = set()
+        results = await _invoke_tools(tcs, tool_map, memo_hits)
 
-        metrics.log_turn(
-            turn=turn + 1,
-            tool_called=True,
-            tool_name=tc["name"],
-            tool_name_fix=tool_name_fix,
-            arg_fixes=arg_fixes,
-            is_error=is_error,
-        )
+        turn_error = False
+        for i, (fix, (result_str, is_error)) in enumerate(zip(fixed, results)):
+            tc, tool_name_fix, arg_fixes = fix
+            logger.info(f"[Tool Result] {result_str[:500]}")
+            # --- Tool Result Trimming: prevent context overflow ---
+            tool_msg = _result_message(tc, result_str, logger, store)
 
-        execution_history.append(
-            f"{tc['name']}({tc['args']}) → {'ERROR: ' if is_error else ''}{result_str[:200]}"
-        )
+            metrics.log_turn(
+                turn=turn + 1,
+                tool_called=True,
+                tool_name=tc["name"],
+                tool_name_fix=tool_name_fix,
+                arg_fixes=arg_fixes,
+                is_error=is_error,
+                llm_stats=usage if i == 0 else None,
+                args=tc["args"],
+                trimmed=len(tool_msg.content) < len(result_str),
+                cached=i in memo_hits,
+            )
 
-        # --- Tool Result Trimming: prevent context overflow ---
-        ctx_result = result_str
-        if FEATURES.get("tool_result_trimming", True):
-            ctx_result, original_len = _trim_tool_result(tc["name"], result_str)
-            if len(ctx_result) < original_len:
-                logger.info(
-                    f"[trim] {tc['name']}: {original_len} → {len(ctx_result)} chars"
-                )
-        messages.append(ToolMessage(content=ctx_result, tool_call_id=tc["id"]))
+            execution_history.append(_history_line(tc, result_str, is_error))
+            messages.append(tool_msg)
 
-        current_step_idx = _update_step(steps, current_step_idx, is_error, result_str)
+            if is_error:
+                turn_error = True
+                tool_failure_counts[tc["name"]] += 1
+        # A turn works on the current step as a whole: any failed call fails it,
+        # otherwise it advances exactly one step however many calls succeeded.
+        errors = [result_str for result_str, is_error in results if is_error]
+        current_step_idx = _update_step(
+            steps, current_step_idx, turn_error, errors[0] if errors else results[-1][0],
+        )
         logger.info(f"[checklist]\n{format_checklist(steps)}")
+        events.emit("checklist", checklist=format_checklist(steps))
 
-        if is_error:
+        if turn_error:
             consecutive_failures += 1
-            tool_failure_counts[tc["name"]] += 1
 
             if consecutive_failures >= MAX_FAILURES_BEFORE_REPLAN and replan_count < MAX_REPLANS:
                 replan_count += 1
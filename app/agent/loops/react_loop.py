@@ -14,15 +14,26 @@ Differences from plan_exec:
 import asyncio
 import time
 
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 from agent.base.termination import get_termination_strategy
 from agent.base.watchdog import get_react_watchdog
-from agent.components.loop_helpers import _apply_window, _invoke_tool, _trim_tool_result, apply_fixers
+from agent.components.compactor import HistoryCompactor
+from agent.components.loop_helpers import (
+    _build_context,
+    _history_line,
+    _invoke_tools,
+    _result_message,
+    _tools_tokens,
+    apply_fixers,
+)
 from agent.components.planner import gather_current_state
+from agent.components.result_store import ResultStore
 from config import EXEC_TIMEOUT, FEATURES, MAX_STEPS, PROMPT_VARIANT, REACT_TERMINATION, REACT_WATCHDOG
+import core.llm as llm
+from core.llm import context_budget
 from core.prompts import build_system_prompt
-from core.utils import MetricsLogger, _sanitize
+from core.utils import MetricsLogger, _llm_usage, _sanitize
 
 
 def _react_variant() -> str:
@@ -42,11 +53,13 @@ async def run_react_loop(
     tool_map: dict,
     model,
     logger,
+    metrics: MetricsLogger | None = None,
 ) -> str | None:
     """Execute the ReAct loop.
 
     Gathers initial state, then runs an observe-think-act loop until the model
     emits a final text answer (no tool call) or the timeout / step limit hits.
+    metrics — session MetricsLogger from run() (created here when None).
 
     Returns the final answer string, or None on timeout / max_steps.
     """
@@ -61,9 +74,19 @@ async def run_react_loop(
 
     strategy = get_termination_strategy(REACT_TERMINATION)
     watchdog = get_react_watchdog(REACT_WATCHDOG)
-    llm_with_tools = model.bind_tools(tools + strategy.extra_tools)
-    model_name: str = getattr(model, "model", "unknown")
-    metrics = MetricsLogger(model_name=model_name, prompt=prompt)
+    # Full text of trimmed results, paged back in by the read_result tool.
+    store = ResultStore() if FEATURES.get("result_store", True) else None
+    extra_tools = strategy.extra_tools + ([store.tool] if store is not None else [])
+    if store is not None:
+        tool_map = {**tool_map, store.tool.name: store.tool}
+    llm_with_tools = llm.bind_tools(model, tools + extra_tools)
+    budget = context_budget("exec") - _tools_tokens(tools + extra_tools)
+    compactor = HistoryCompactor(model) if FEATURES.get("history_compaction", True) else None
+    # One line per tool call; feeds the compaction digest for evicted turns.
+    execution_history: list[str] = []
+    if metrics is None:
+        model_name: str = getattr(model, "model", "unknown")
+        metrics = MetricsLogger(model_name=model_name, prompt=prompt)
 
     messages = [
         SystemMessage(content=system_prompt),
@@ -84,20 +107,16 @@ async def run_react_loop(
             metrics.write_summary([], termination="timeout")
             return None
 
-        ctx_messages = messages
-        if FEATURES.get("message_window", False):
-            ctx_messages, truncated = _apply_window(messages)
-            if truncated:
-                logger.info(
-                    f"[window] {len(messages)} → {len(ctx_messages)} messages"
-                    f" (dropped {len(messages) - len(ctx_messages)} oldest)"
-                )
+        ctx_messages = _build_context(
+            messages, budget, logger,
+            compactor=compactor, execution_history=execution_history,
+        )
 
         logger.info(f"[react:llm] start (turn {turn + 1})")
         t0 = time.perf_counter()
         try:
             response = await asyncio.wait_for(
-                llm_with_tools.ainvoke(ctx_messages), timeout=_remaining()
+                llm.acall(llm_with_tools, ctx_messages, "exec"), timeout=_remaining()
             )
         except asyncio.TimeoutError:
             elapsed = time.perf_counter() - loop_start
@@ -108,53 +127,65 @@ async def run_react_loop(
             logger.error(f"[react:llm] LLM呼び出しエラー: {type(e).__name__}: {e}")
             metrics.write_summary([], termination="llm_error")
             return f"[エラー] このモデルはツール呼び出しに非対応か、LLM呼び出しに失敗しました: {e}"
-        logger.info(f"[react:llm] done in {time.perf_counter() - t0:.1f}s")
+        usage = _llm_usage(response)
+        logger.info(
+            f"[react:llm] done in {time.perf_counter() - t0:.1f}s"
+            + (f" (prefill {usage['prompt_eval_count']} tok / {usage['prompt_eval_ms']}ms)" if usage else "")
+        )
 
         result = strategy.check(response)
         if result.should_stop:
-            metrics.log_turn(turn=turn + 1, tool_called=False)
+            metrics.log_turn(turn=turn + 1, tool_called=False, llm_stats=usage)
             logger.info(f"final answer:\n{result.answer}")
             metrics.write_summary([], termination="answer")
             return result.answer
 
         if result.feedback:
-            metrics.log_turn(turn=turn + 1, tool_called=False)
+            metrics.log_turn(turn=turn + 1, tool_called=False, llm_stats=usage)
             messages.append(AIMessage(content=response.content or ""))
             messages.append(HumanMessage(content=result.feedback))
             continue
 
-        tc = response.tool_calls[0]
-        tc, tool_name_fix, arg_fixes = apply_fixers(tc, tool_map, logger)
-
-        logger.info(f"[Tool Call] {tc['name']}({tc['args']})")
-        messages.append(AIMessage(content=response.content, tool_calls=[tc]))
-
-        result_str, is_error = await _invoke_tool(tc, tool_map)
-        logger.info(f"[Tool Result] {result_str[:500]}")
-
-        metrics.log_turn(
-            turn=turn + 1,
-            tool_called=True,
-            tool_name=tc["name"],
-            tool_name_fix=tool_name_fix,
-            arg_fixes=arg_fixes,
-            is_error=is_error,
-        )
-
-        # --- Tool Result Trimming ---
-        ctx_result = result_str
-        if FEATURES.get("tool_result_trimming", True):
-            ctx_result, original_len = _trim_tool_result(tc["name"], result_str)
-            if len(ctx_result) < original_len:
-                logger.info(
-                    f"[trim] {tc['name']}: {original_len} → {len(ctx_result)} chars"
-                )
+        # --- Dispatch every tool call of this turn (concurrently where safe) ---
+        tool_calls = response.tool_calls
+        if not FEATURES.get("parallel_tool_calls", True):
+            tool_calls = tool_calls[:1]
+        fixed = [apply_fixers(tc, tool_map, logger) for tc in tool_calls]
+        tcs = [tc for tc, _, _ in fixed]
+
+        for tc in tcs:
+            logger.info(f"[Tool Call] {tc['name']}({tc['args']})")
+        messages.append(AIMessage(content=response.content, tool_calls=tcs))
+
+        results = await _invoke_tools(tcs, tool_map)
+
+        last_error = None
+        for i, (fix, (result_str, is_error)) in enumerate(zip(fixed, results)):
+            tc, tool_name_fix, arg_fixes = fix
+            logger.info(f"[Tool Result] {result_str[:500]}")
+            # --- Tool Result Trimming: prevent context overflow ---
+            tool_msg = _result_message(tc, result_str, logger, store)
+
+            metrics.log_turn(
+                turn=turn + 1,
+                tool_called=True,
+                tool_name=tc["name"],
+                tool_name_fix=tool_name_fix,
+                arg_fixes=arg_fixes,
+                is_error=is_error,
+                llm_stats=usage if i == 0 else None,
+                args=tc["args"],
+                trimmed=len(tool_msg.content) < len(result_str),
+            )
 
-        messages.append(ToolMessage(content=ctx_result, tool_call_id=tc["id"]))
+            execution_history.append(_history_line(tc, result_str, is_error))
+            messages.append(tool_msg)
+            if is_error:
+                last_error = result_str
 
-        if is_error:
+        if last_error is not None:
             consecutive_errors += 1
-            hint = watchdog.check(consecutive_errors, result_str)
+            hint = watchdog.check(consecutive_errors, last_error)
             if hint:
                 logger.warning(f"[watchdog] {hint}")
                 messages.append(HumanMessage(content=hint))
@@ -36,6 +36,10 @@ MAX_STEPS = 30
 MAX_FAILURES_BEFORE_REPLAN = 1
 MAX_REPLANS = 3
 EXEC_TIMEOUT = 1200  # seconds; exec loop is aborted when this is exceeded
+MCP_CONNECT_TIMEOUT = 30      # seconds; per-server spawn + handshake in the session pool
+MCP_HEALTHCHECK_TIMEOUT = 5   # seconds; ping before a pooled session is handed out
+STATE_CACHE_TTL = 300         # seconds; max age of cached planner state (external changes)
+STATE_MEMORY_MATCHES = 5      # memories shown to the planner (search_memories with the prompt)
 LOG_DIR = Path("/app/logs")
 
 # ---------------------------------------------------------------------------
@@ -49,6 +53,16 @@ FEATURES: dict[str, bool] = {
     # Prevents context overflow when fetch_page / read_file return large text.
     "tool_result_trimming": True,
 
+    # Cut over-long tool results with a per-tool strategy (TOOL_RESULT_TRIM_STRATEGY)
+    # instead of keeping only the first N chars: tracebacks keep their last lines,
+    # query results keep whole rows.  Requires tool_result_trimming.
+    "smart_trimming": True,
+
+    # Keep the full text of every trimmed tool result in a per-run ResultStore
+    # (agent/components/result_store.py) and give the model a read_result tool
+    # to page in the omitted parts instead of re-running the tool.
+    "result_store": True,
+
     # Correct hallucinated tool names via alias table + fuzzy match (exec-time).
     "tool_name_fixer": True,
 
@@ -77,6 +91,74 @@ FEATURES: dict[str, bool] = {
     # Reduces prefill time as conversation grows (prefill is the main bottleneck
     # on CPU: 29 tok/s → 3000 token context costs ~103s just for prefill).
     "message_window": True,
+
+    # Token-budget window: pack the newest tool turns into num_ctx minus the
+    # generation reserve instead of keeping a fixed message count.
+    # Takes precedence over message_window when both are on.
+    "token_budget_window": True,
+
+    # Fold turns evicted by the window into a deterministic "earlier work"
+    # digest placed after the System + Task head (agent/components/compactor.py).
+    "history_compaction": True,
+
+    # Rewrite the digest with a background LLM call (off the critical path).
+    # Competes with the exec call for the Ollama backend on CPU, so off by default.
+    "compaction_llm_summary": False,
+
+    # Dispatch every tool call of a response (not just the first) concurrently.
+    # Calls touching the same resource keep their order (agent/base/tool_effects.py).
+    "parallel_tool_calls": True,
+
+    # Step DAG: the planner may annotate dependencies ([after: N]) and spell out
+    # arguments as JSON.  Ready steps with fully specified arguments are run
+    # directly (no exec LLM turn), in concurrent waves where the DAG allows.
+    "step_dag": True,
+
+    # Fast path: plan steps with literal arguments ("2. list_directory: /data",
+    # "3. get_current_datetime", key=value) are compiled into tool calls and run
+    # without an exec LLM turn.  See compile_step() in agent/components/planner.py.
+    # Without step_dag only the next step in plan order is run this way.
+    "step_fast_path": True,
+
+    # Keep one long-lived MCP session per server for the whole process instead
+    # of building a MultiServerMCPClient (6 docker exec spawns) per request.
+    # See agent/components/mcp_pool.py.
+    "mcp_session_pool": True,
+
+    # Put every LLM call behind a per-model scheduler (bounded concurrency,
+    # router/chat ahead of agent phases) and reject requests with 429 when
+    # too many are in flight.  See core/scheduler.py.
+    "llm_scheduler": True,
+
+    # Cache ChatOllama instances by options and bind_tools() results by tool
+    # schema hash, with one shared keep-alive HTTP pool (core/llm.py).
+    "llm_registry": True,
+
+    # Router tiers in front of the router LLM: LRU cache of past decisions,
+    # then a local n-gram classifier trained on logged LLM decisions
+    # (agent/components/router.py).  router_classifier needs router_cache.
+    "router_cache": True,
+    "router_classifier": True,
+    # Append router LLM decisions to LOG_DIR/router.jsonl so the classifier is
+    # trained across restarts (rotated at ROUTER_LOG_MAX_BYTES).  Off: learn in
+    # memory only.
+    "router_log": True,
+
+    # While the router LLM decides, speculatively acquire MCP tools and gather
+    # the current state; cancelled if the router says "chat".
+    "speculative_agent": True,
+    # Also plan speculatively.  The plan LLM call queues behind the router on
+    # the scheduler and is thrown away on "chat", so off by default on CPU.
+    "speculative_plan": False,
+
+    # Serve unchanged parts of gather_current_state from a versioned cache;
+    # mutating tool calls invalidate their domain (agent/components/state_cache.py).
+    "state_cache": True,
+
+    # Reuse results of idempotent read-only tool calls (list_directory, read_file,
+    # web_search, ...) within and across requests; mutating calls drop the entries
+    # they touch (agent/components/tool_memo.py, TOOL_MEMO_TTL).
+    "tool_memo": True,
 }
 
 # ---------------------------------------------------------------------------
@@ -115,8 +197,39 @@ FEATURES: dict[str, bool] = {
 #   window=6  → ~1050 tok → prefill ~36s
 #   window=4  → ~  700 tok → prefill ~24s  (risk: forgets earlier errors)
 #
+# Ollama reuses its KV cache only up to the first token that differs from the
+# previous request.  Sliding the window by one pair every turn changes the
+# first tail message every turn, so the whole tail is re-prefilled each time.
+# The window therefore slides in MESSAGE_WINDOW_CHUNK-sized jumps: between
+# jumps the context is append-only and only the newest messages are prefilled.
+#   chunk=6 with size=12 → tail oscillates between 7 and 12 messages,
+#                          one cache-breaking slide every 3 tool-call turns
+#
 MESSAGE_WINDOW_HEAD: int = 2    # System + Task; never dropped
 MESSAGE_WINDOW_SIZE: int = 12   # tail messages to keep (must be even: AI+Tool pairs)
+MESSAGE_WINDOW_CHUNK: int = 6   # messages dropped per slide (must be even)
+
+# ---------------------------------------------------------------------------
+# Token-budget window (used when FEATURES["token_budget_window"] is True)
+# ---------------------------------------------------------------------------
+# Budget = num_ctx (core/llm._MODEL_CONFIGS) − NUM_PREDICT_PER_PHASE[phase]
+#          − CONTEXT_SAFETY_TOKENS − estimated tool-schema tokens.
+# History is packed newest-first in whole turns (AI + its ToolMessages).
+# The estimate is a character heuristic, not the model tokenizer, so the
+# safety margin absorbs its error (roughly ±15% on mixed JP/EN text).
+#
+# Tuning guide (num_ctx=4096, exec num_predict=768):
+#   safety=128 → ~3200 tokens for System + Task + history
+#   safety=256 → ~3070 tokens (use for CJK-heavy prompts)
+#
+CONTEXT_SAFETY_TOKENS: int = 128
+CHARS_PER_TOKEN_ASCII: float = 3.5   # English / code / JSON
+TOKENS_PER_CHAR_CJK:   float = 1.0   # Japanese / Chinese (roughly one token per char)
+
+# History compaction digest (used when FEATURES["history_compaction"] is True)
+#   1200 chars ≈ 300-400 tokens: step outcomes + the newest evicted calls
+COMPACTION_MAX_CHARS:  int = 1200
+COMPACTION_LINE_CHARS: int = 160    # per tool-call / step line
 
 NUM_PREDICT_PER_PHASE: dict[str, int] = {
     "router": 32,
@@ -126,6 +239,50 @@ NUM_PREDICT_PER_PHASE: dict[str, int] = {
     "replan": 1024,
 }
 
+# ---------------------------------------------------------------------------
+# LLM scheduler (used when FEATURES["llm_scheduler"] is True)
+# ---------------------------------------------------------------------------
+# SCHEDULER_CONCURRENCY should match OLLAMA_NUM_PARALLEL on the server (1 on
+# CPU): extra concurrent calls only time-slice the same cores.
+# SCHEDULER_MAX_PENDING bounds requests in flight per model; the next one
+# gets HTTP 429 with Retry-After instead of queueing past EXEC_TIMEOUT.
+#
+# PHASE_PRIORITY: lower is served first when calls are waiting for a slot.
+#
+SCHEDULER_CONCURRENCY: int = int(os.environ.get("SCHEDULER_CONCURRENCY", "1"))
+SCHEDULER_CONCURRENCY_PER_MODEL: dict[str, int] = {}   # e.g. {"qwen2.5:7b": 2}
+SCHEDULER_MAX_PENDING: int = int(os.environ.get("SCHEDULER_MAX_PENDING", "8"))
+
+# Shared HTTP pool to Ollama (used when FEATURES["llm_registry"] is True).
+# Streaming calls hold a connection for the whole generation, so allow a few
+# more than SCHEDULER_CONCURRENCY.
+OLLAMA_HTTP_MAX_CONNECTIONS: int = 8
+OLLAMA_HTTP_KEEPALIVE_SEC: float = 300.0
+
+PHASE_PRIORITY: dict[str, int] = {
+    "router":  0,
+    "chat":    0,
+    "plan":    1,
+    "replan":  1,
+    "exec":    2,
+    "compact": 3,   # background digest summary
+}
+
+# ---------------------------------------------------------------------------
+# Router cache / classifier (used when FEATURES["router_cache"] is True)
+# ---------------------------------------------------------------------------
+# The classifier answers only when its posterior is at least the threshold
+# and it has seen ROUTER_MIN_EXAMPLES LLM decisions for each intent;
+# otherwise the router LLM decides.  Misrouting to chat drops a task, so keep
+# the threshold high.
+#
+ROUTER_CACHE_SIZE:           int   = 512
+ROUTER_CLASSIFIER_THRESHOLD: float = 0.95
+ROUTER_MIN_EXAMPLES:         int   = 5
+ROUTER_NGRAM_MAX:            int   = 3       # character 1..3-grams
+ROUTER_HASH_BUCKETS:         int   = 2 ** 18
+ROUTER_LOG_MAX_BYTES:        int   = 1_000_000   # router.jsonl → router.jsonl.1 beyond this
+
 # ---------------------------------------------------------------------------
 # Tool result trimming (used when FEATURES["tool_result_trimming"] is True)
 # ---------------------------------------------------------------------------
@@ -146,6 +303,7 @@ TOOL_RESULT_DEFAULT_MAX_CHARS: int = 2000
 TOOL_RESULT_MAX_CHARS: dict[str, int] = {
     # Web content tends to be very long; limit aggressively.
     "fetch_page":        1500,
+    "fetch_pages":       3000,   # several pages share a 2× fetch_page budget server-side
     "web_search":        1000,
     # File / command output can also be large.
     "read_file":         2000,
@@ -158,4 +316,65 @@ TOOL_RESULT_MAX_CHARS: dict[str, int] = {
     "create_directory":   500,
     "remember":           500,
     "recall":            1000,
+    # Paged reads of stored results are already bounded by READ_RESULT_MAX_CHARS.
+    "read_result":          0,
+}
+
+# Full text of trimmed results kept per loop run (FEATURES["result_store"]).
+RESULT_STORE_MAX_CHARS: int = 2_000_000
+READ_RESULT_DEFAULT_CHARS: int = 1500   # read_result length when the model omits it
+READ_RESULT_MAX_CHARS: int = 2000
+
+# How a result over its limit is cut (FEATURES["smart_trimming"]); keyed like
+# TOOL_RESULT_MAX_CHARS, unlisted tools use TOOL_RESULT_DEFAULT_TRIM_STRATEGY.
+#   head       — first N chars (the old behaviour)
+#   head_tail  — start and end of the output; the end of a log is where it failed
+#   rows       — whole rows of a query result, header and "(rows … of …)" footer kept
+#   lines      — whole lines from the top, with the number of lines left out
+# Any result containing a Python traceback ("Traceback (most recent call last):")
+# is cut with the "error" strategy instead: the end of the traceback and the
+# error lines before it are always kept.
+TOOL_RESULT_DEFAULT_TRIM_STRATEGY: str = "head"
+
+TOOL_RESULT_TRIM_STRATEGY: dict[str, str] = {
+    "execute_command":   "head_tail",
+    "query":             "rows",
+    "read_file":         "lines",
+    "read_text_file":    "lines",
+    "fetch_page":        "lines",
+    "fetch_pages":       "lines",
+}
+
+# ---------------------------------------------------------------------------
+# Tool result memoization (used when FEATURES["tool_memo"] is True)
+# ---------------------------------------------------------------------------
+# Seconds a result may be reused, per idempotent tool.  Unlisted tools (and
+# mutating calls, e.g. a DML query) are never memoized.  Mutations made by the
+# agent invalidate precisely; the TTL only bounds changes made outside it.
+TOOL_MEMO_TTL: dict[str, float] = {
+    # filesystem
+    "read_file":                 60,
+    "read_text_file":            60,
+    "read_multiple_files":       60,
+    "list_directory":            60,
+    "list_directory_with_sizes": 60,
+    "directory_tree":            60,
+    "search_files":              60,
+    "get_file_info":             60,
+    # sqlite (read-only SQL only)
+    "list_tables":               60,
+    "describe_schema":           60,
+    "query":                     60,
+    # memory
+    "recall":                    60,
+    "recall_many":               60,
+    "list_memories":             60,
+    "search_memories":           60,
+    # web — the server keeps its own disk cache; this saves the MCP hop + extraction
+    "web_search":               900,
+    "fetch_page":               900,
+    "fetch_pages":              900,
+    # the clock only ticks once a second
+    "get_current_datetime":       1,
 }
+TOOL_MEMO_MAX_ENTRIES: int = 512
@@ -0,0 +1,47 @@
+"""Per-request progress events for streaming clients (web_server /chat/stream).
+
+The agent pipeline reports what it is doing through emit(); a request that
+wants a live feed installs a sink with event_sink().  The sink lives in a
+ContextVar, so concurrent requests never see each other's events and code
+running without a sink (CLI, tests, /chat) pays only a lookup.
+
+Event types (all dicts with a "type" key):
+  router      {"intent", "source"}          chat / agent decision
+  plan        {"checklist"}                 initial plan or replan
+  checklist   {"checklist"}                 step status after tool results
+  token       {"phase", "text"}             LLM output as it is generated
+  tool_call   {"name", "args"}              before a tool is invoked
+  tool_result {"name", "result", "is_error"}
+  answer      {"answer"}                    final answer (sanitized)
+"""
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_SINK: ContextVar[Callable[[dict], None] | None] = ContextVar("event_sink", default=None)
+
+# Tool results are previews only; the full text stays in the agent's context.
+RESULT_PREVIEW_CHARS = 500
+
+
+def streaming() -> bool:
+    """True when the current request has an event sink installed."""
+    return _SINK.get() is not None
+
+
+def emit(event_type: str, **data) -> None:
+    """Send one event to the current request's sink (no-op without a sink)."""
+    sink = _SINK.get()
+    if sink is not None:
+        sink({"type": event_type, **data})
+
+
+@contextmanager
+def event_sink(callback: Callable[[dict], None]) -> Iterator[None]:
+    """Route emit() calls made in this context (and tasks created in it) to *callback*."""
+    token = _SINK.set(callback)
+    try:
+        yield
+    finally:
+        _SINK.reset(token)
@@ -1,11 +1,26 @@
+import hashlib
+import json
 import os
+from collections import OrderedDict
 
+import httpx
 from langchain_ollama import ChatOllama
 
-from config import FEATURES, NUM_PREDICT_PER_PHASE
+from config import (
+    CONTEXT_SAFETY_TOKENS,
+    FEATURES,
+    NUM_PREDICT_PER_PHASE,
+    OLLAMA_HTTP_KEEPALIVE_SEC,
+    OLLAMA_HTTP_MAX_CONNECTIONS,
+)
+from core import events
+from core.scheduler import get_scheduler, phase_priority
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 OLLAMA_MODEL    = os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
+# How long Ollama keeps the model (and its prompt KV cache) loaded between calls.
+# Long exec turns would otherwise let the default 5m expire and lose the cached prefix.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
 # Per-model recommended settings derived from benchmark runs.
 # temperature=0.0 maximises determinism for tool-calling tasks.
@@ -28,14 +43,41 @@ _MODEL_CONFIGS: dict[str, dict] = {
 _DEFAULT_CONFIG: dict = {"temperature": 0.0, "num_ctx": 4096}
 
 
+# ---------------------------------------------------------------------------
+# Process-wide registry
+# ---------------------------------------------------------------------------
+# run() asks for five phase models per request.  Instances are cached by
+# their effective options, so with num_predict_limit off every phase shares
+# one ChatOllama, and no request builds a new one.  All instances share one
+# httpx transport (connection pool), so keep-alive connections to Ollama are
+# reused across phases and requests instead of being opened per client.
+
+_REGISTRY: dict[tuple, ChatOllama] = {}
+_BOUND: OrderedDict[tuple[int, str], tuple[object, object]] = OrderedDict()
+_BOUND_MAX = 16
+_TRANSPORT: httpx.AsyncHTTPTransport | None = None
+
+
+def _shared_transport() -> httpx.AsyncHTTPTransport:
+    global _TRANSPORT
+    if _TRANSPORT is None:
+        _TRANSPORT = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+            max_connections=OLLAMA_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=OLLAMA_HTTP_KEEPALIVE_SEC,
+        ))
+    return _TRANSPORT
+
+
 def get_llm(phase: str = "exec") -> ChatOllama:
-    """Return a ChatOllama instance configured for the given execution phase.
+    """Return the shared ChatOllama instance configured for the given execution phase.
 
     phase values: "router" | "chat" | "plan" | "exec" | "replan"
 
     When FEATURES["num_predict_limit"] is True, num_predict is set from
     NUM_PREDICT_PER_PHASE[phase], capping token generation per call and
     preventing runaway stuck turns (most impactful on 14b w/ CPU inference).
+    Phases with identical options share one instance.
     """
     cfg = _MODEL_CONFIGS.get(OLLAMA_MODEL, _DEFAULT_CONFIG)
     kwargs: dict = {
@@ -43,7 +85,95 @@ def get_llm(phase: str = "exec") -> ChatOllama:
         "base_url":    OLLAMA_BASE_URL,
         "temperature": cfg["temperature"],
         "num_ctx":     cfg["num_ctx"],
+        "keep_alive":  OLLAMA_KEEP_ALIVE,
     }
     if FEATURES.get("num_predict_limit", False):
         kwargs["num_predict"] = NUM_PREDICT_PER_PHASE.get(phase, 512)
-    return ChatOllama(**kwargs)
+    if not FEATURES.get("llm_registry", True):
+        return ChatOllama(**kwargs)
+
+    key = tuple(sorted(kwargs.items()))
+    if key not in _REGISTRY:
+        _REGISTRY[key] = ChatOllama(**kwargs, async_client_kwargs={"transport": _shared_transport()})
+    return _REGISTRY[key]
+
+
+def _tools_key(tools: list) -> str:
+    """Content hash of the tool schemas (name, description, args)."""
+    def _schema(tool) -> object:
+        schema = getattr(tool, "args_schema", None)
+        if hasattr(schema, "model_json_schema"):
+            return schema.model_json_schema()
+        return schema
+    payload = [(t.name, getattr(t, "description", ""), _schema(t)) for t in tools]
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def bind_tools(model, tools: list):
+    """model.bind_tools(tools), cached per (model, tool-schema hash).
+
+    The pooled MCP sessions hand out the same tool set on every request, so
+    the schema conversion runs once per process instead of once per loop.
+    """
+    if not FEATURES.get("llm_registry", True):
+        return model.bind_tools(tools)
+    key = (id(model), _tools_key(tools))
+    entry = _BOUND.get(key)
+    if entry is not None and entry[0] is model:   # id() may be reused after GC
+        _BOUND.move_to_end(key)
+        return entry[1]
+    bound = model.bind_tools(tools)
+    _BOUND[key] = (model, bound)
+    if len(_BOUND) > _BOUND_MAX:
+        _BOUND.popitem(last=False)
+    return bound
+
+
+def context_budget(phase: str = "exec") -> int:
+    """Prompt-side token budget for *phase*: num_ctx minus room for generation.
+
+    The generation reserve is NUM_PREDICT_PER_PHASE[phase] whether or not
+    num_predict_limit is on — Ollama silently drops the oldest tokens when
+    prompt + output exceeds num_ctx, so the reserve is needed either way.
+    """
+    cfg = _MODEL_CONFIGS.get(OLLAMA_MODEL, _DEFAULT_CONFIG)
+    reserve = NUM_PREDICT_PER_PHASE.get(phase, 512) + CONTEXT_SAFETY_TOKENS
+    return max(cfg["num_ctx"] - reserve, 0)
+
+
+async def acall(model, messages: list, phase: str = "exec"):
+    """Invoke *model* on *messages*, streaming tokens to the event sink when present.
+
+    Without a sink (CLI, /chat) this is a plain ainvoke().  With one, the reply
+    is read through astream() and every content chunk is emitted as a "token"
+    event; the merged chunk is returned, so tool_calls and response_metadata
+    (prefill counters) are available exactly as with ainvoke().
+
+    With FEATURES["llm_scheduler"] the call first waits for a slot on the
+    model's scheduler, ordered by PHASE_PRIORITY[phase].
+    """
+    if not FEATURES.get("llm_scheduler", True):
+        return await _call(model, messages, phase)
+    scheduler = get_scheduler(_model_name(model))
+    async with scheduler.slot(phase_priority(phase)):
+        return await _call(model, messages, phase)
+
+
+def _model_name(model) -> str:
+    # bind_tools() wraps the ChatOllama in a RunnableBinding.
+    return getattr(model, "model", None) or getattr(getattr(model, "bound", None), "model", None) or OLLAMA_MODEL
+
+
+async def _call(model, messages: list, phase: str):
+    if not events.streaming():
+        return await model.ainvoke(messages)
+    response = None
+    async for chunk in model.astream(messages):
+        if chunk.content:
+            events.emit("token", phase=phase, text=chunk.content)
+        response = chunk if response is None else response + chunk
+    if response is None:
+        # An empty stream (dropped connection, backend quirk) would hand callers
+        # None instead of a message; ask again without streaming.
+        return await model.ainvoke(messages)
+    return response
@@ -8,6 +8,20 @@ class Step:
     text: str
     status: str = "pending"   # pending | done | failed
     note: str = ""            # 結果の要約 or エラーメッセージ
+    deps: list[int] | None = None   # 依存ステップ番号。None = 直前のステップに依存（従来の逐次実行）
+
+
+# Optional dependency annotation at the end of a plan line:
+#   "3. write_file: ... [after: 1, 2]"  → depends on steps 1 and 2
+#   "2. get_current_datetime [after: -]" → no dependencies
+_DEPS_RE = re.compile(r"\s*\[(?:after|deps?)\s*:\s*([^\]]*)\]\s*$", re.IGNORECASE)
+
+
+def _parse_deps(line: str) -> tuple[str, list[int] | None]:
+    m = _DEPS_RE.search(line)
+    if not m:
+        return line, None
+    return line[:m.start()].rstrip(), [int(n) for n in re.findall(r"\d+", m.group(1))]
 
 
 def parse_steps(plan: str) -> list[Step]:
@@ -16,10 +30,37 @@ def parse_steps(plan: str) -> list[Step]:
         line = line.strip()
         m = re.match(r"^(\d+)\.", line)
         if m:
-            steps.append(Step(number=int(m.group(1)), text=line))
+            text, deps = _parse_deps(line)
+            steps.append(Step(number=int(m.group(1)), text=text, deps=deps))
     return steps
 
 
+def _resolve_deps(steps: list[Step], idx: int) -> list[Step]:
+    """steps[idx] の依存先 Step を返す。
+
+    リプラン後は完了済みステップと新ステップで番号が重複するため、
+    番号は「自分より前にある同じ番号の最後のステップ」に解決する。
+    """
+    step = steps[idx]
+    if step.deps is None:
+        return [steps[idx - 1]] if idx > 0 else []
+    resolved = []
+    for number in step.deps:
+        for prev in reversed(steps[:idx]):
+            if prev.number == number:
+                resolved.append(prev)
+                break
+    return resolved
+
+
+def ready_steps(steps: list[Step]) -> list[Step]:
+    """依存ステップがすべて完了している pending ステップを返す（DAG の実行可能集合）。"""
+    return [
+        s for i, s in enumerate(steps)
+        if s.status == "pending" and all(d.status == "done" for d in _resolve_deps(steps, i))
+    ]
+
+
 def format_checklist(steps: list[Step]) -> str:
     icons = {"pending": "⏳", "done": "✅", "failed": "❌"}
     lines = []
@@ -17,6 +17,8 @@ SENTENCES: dict[str, str] = {
     # Planner
     "plan_format":      "For each step, write: <number>. <tool_name>: <具体的な内容>\nBe specific about arguments. Do NOT execute — only plan.",
     "plan_use_state":   "Use the current state information to make informed decisions (e.g. don't create a table that already exists).",
+    # plan_deps*: braces are doubled because plan / replan prompts go through str.format().
+    "plan_deps":        'When every argument is already known, write them as JSON after the colon, e.g. 2. list_directory: {{"path": "/data"}}\nIf a step does not need the previous step, end it with [after: -] or [after: N, M] listing the steps it needs.',
 
     # Replanner
     "replan_task":      "The execution encountered failures. Review the checklist below and create a REVISED plan for the REMAINING steps only.",
@@ -34,6 +36,7 @@ SENTENCES: dict[str, str] = {
     "arg_names_zh":     '重要：使用完全正确的参数名称。不要使用"cmd"、"dir"、"filepath"、"text"或任何其他变体。',
     "plan_format_zh":   "输出编号步骤列表，格式示例：\n1. list_tables: 确认数据库中的表\n2. write_file: 将结果写入/data/result.txt\n请具体说明每步参数。不要执行——只做计划。",
     "plan_use_state_zh":"利用当前状态信息做出明智决策（例如：不要创建已存在的表）。",
+    "plan_deps_zh":     '如果所有参数都已确定，请在冒号后用JSON写出，例如：2. list_directory: {{"path": "/data"}}\n如果某步骤不依赖上一步，请在末尾加上 [after: -] 或 [after: N, M]（列出它需要的步骤）。',
     "replan_task_zh":   "执行过程中遇到了错误。请查看下面的清单，仅为剩余步骤创建修订计划。",
     "replan_no_done_zh":"绝对不要重新包含已完成（✅）的步骤。",
     "replan_fix_zh":    "根据错误详情修正失败（❌）步骤的方法。",
@@ -50,22 +53,24 @@ You are a helpful AI assistant with the following tools:
 - filesystem (read_file, write_file, etc.): paths must start with /data/
 - shell (execute_command): use cwd=/workspace or cwd=/data, shell=bash.
   To run a Python file, use: python3 /data/<filename> (never ./filename)
-- websearch (web_search, fetch_page): search the internet.
-  After web_search, call fetch_page on the best URL to get actual content.
+- websearch (web_search, fetch_page, fetch_pages): search the internet.
+  After web_search, call fetch_page on the best URL with query=<what you need> to get the relevant content (fetch_pages for several URLs in one call).
 - time (get_current_datetime): get the current date/time in JST.
-- sqlite (list_tables, query): SQLite DB at /data/agent.db for structured data.
-- memory (remember, recall, list_memories, forget): persist key-value notes across sessions. Do NOT use as a substitute for write_file — always save task outputs to /data/ files."""
+- sqlite (list_tables, describe_schema, query, bulk_insert): SQLite DB at /data/agent.db for structured data.
+  To insert several rows, call bulk_insert ONCE with all rows (not query once per row).
+- memory (remember, recall, recall_many, search_memories, list_memories, forget): persist key-value notes across sessions. Fetch several keys with ONE recall_many call; list_memories(prefix=...) lists only matching keys. If you do not know the key, use search_memories(query=...). Do NOT use as a substitute for write_file — always save task outputs to /data/ files."""
 
 _TOOL_LIST_ZH = """\
 你是一个有用的AI助手，拥有以下工具：
 - 文件系统 (read_file, write_file等)：路径必须以 /data/ 开头。
 - Shell (execute_command)：使用 cwd=/workspace 或 cwd=/data，shell=bash。
   运行Python文件时，使用：python3 /data/<文件名>（不要用 ./文件名）。
-- 网络搜索 (web_search, fetch_page)：搜索互联网。
-  web_search后，对最佳URL调用fetch_page获取实际内容。
+- 网络搜索 (web_search, fetch_page, fetch_pages)：搜索互联网。
+  web_search后，对最佳URL调用fetch_page并传入 query=<要找的内容> 获取相关内容（多个URL时用一次 fetch_pages）。
 - 时间 (get_current_datetime)：获取日本标准时间（JST）的当前日期/时间。
-- SQLite (list_tables, query)：/data/agent.db 中的SQLite数据库，用于结构化数据。
-- 内存 (remember, recall, list_memories, forget)：在会话间持久化键值笔记。不要用来代替 write_file——任务输出必须保存到 /data/ 文件。"""
+- SQLite (list_tables, describe_schema, query, bulk_insert)：/data/agent.db 中的SQLite数据库，用于结构化数据。
+  插入多行时，只调用一次 bulk_insert 并传入所有行（不要每行调用一次 query）。
+- 内存 (remember, recall, recall_many, search_memories, list_memories, forget)：在会话间持久化键值笔记。需要多个键时只调用一次 recall_many；list_memories(prefix=...) 只列出匹配的键。不知道键名时使用 search_memories(query=...)。不要用来代替 write_file——任务输出必须保存到 /data/ 文件。"""
 
 _TOOL_EXAMPLES = """\
 ## Tool call examples (correct argument names)
@@ -78,6 +83,11 @@ Example 1 — Run a shell command:
 Example 2 — Write a file:
 <tool_call>
 {"name": "write_file", "arguments": {"path": "/data/hello.py", "content": "print('hello')"}}
+</tool_call>
+
+Example 3 — Insert several rows at once:
+<tool_call>
+{"name": "bulk_insert", "arguments": {"table": "sales", "columns": ["item", "amount"], "rows": [["apple", 100], ["banana", 80]]}}
 </tool_call>"""
 
 # ── System prompt variant definitions ───────────────────────────────────────
@@ -151,11 +161,14 @@ def build_system_prompt(variant: str = "default") -> str:
 
 def build_plan_prompt(variant: str = "default") -> str:
     s = SENTENCES
+    # Dependency / JSON-argument hints feed the step DAG executor (FEATURES["step_dag"]).
+    with_deps = FEATURES.get("step_dag", False)
     if variant == "zh":
         return (
             s["lang_plan_zh"] + "\n\n"
             "你是一个任务规划师。根据用户请求、当前系统状态和可用工具，输出具体的编号执行计划。\n"
             + s["plan_format_zh"] + "\n"
+            + (s["plan_deps_zh"] + "\n" if with_deps else "")
             + s["plan_use_state_zh"] + "\n\n"
             "当前系统状态：\n{current_state}\n\n"
             "可用工具：\n{tool_descriptions}"
@@ -165,6 +178,7 @@ def build_plan_prompt(variant: str = "default") -> str:
         "You are a task planner. Given a user request, the current system state, "
         "and available tools, output a concrete numbered execution plan.\n"
         + s["plan_format"] + "\n"
+        + (s["plan_deps"] + "\n" if with_deps else "")
         + s["plan_use_state"] + "\n\n"
         "Current system state:\n{current_state}\n\n"
         "Available tools:\n{tool_descriptions}"
@@ -173,8 +187,11 @@ def build_plan_prompt(variant: str = "default") -> str:
 
 def build_replan_prompt(variant: str = "default") -> str:
     s = SENTENCES
+    with_deps = FEATURES.get("step_dag", False)
     if variant == "zh":
         rules = [s["replan_no_done_zh"], s["replan_fix_zh"], s["replan_alt_zh"]]
+        if with_deps:
+            rules.append(s["plan_deps_zh"])
         return (
             s["lang_plan_zh"] + "\n\n"
             "你是一个任务规划师。" + s["replan_task_zh"] + "\n"
@@ -183,6 +200,8 @@ def build_replan_prompt(variant: str = "default") -> str:
             "可用工具：\n{tool_descriptions}"
         )
     rules = [s["replan_no_done"], s["replan_fix"], s["replan_alt"]]
+    if with_deps:
+        rules.append(s["plan_deps"])
     return (
         s["lang_plan"] + "\n\n"
         "You are a task planner. " + s["replan_task"] + "\n"
@@ -217,6 +236,7 @@ You are a friendly and helpful AI assistant.
 # Built at import time from PROMPT_VARIANT in config.
 # All existing `from core.prompts import SYSTEM_PROMPT` calls continue to work.
 
+from config import FEATURES  # noqa: E402
 from config import PROMPT_VARIANT as _VARIANT  # noqa: E402
 
 SYSTEM_PROMPT = build_system_prompt(_VARIANT)
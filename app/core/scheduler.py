@@ -0,0 +1,184 @@
+"""Request admission and prioritised LLM slots in front of the Ollama backend.
+
+One CPU-bound Ollama instance serves every request.  Letting all requests
+call it at once only makes each call slower (and blows EXEC_TIMEOUT), so
+calls are funnelled through a scheduler per model:
+
+  admit()          — request-level admission (web_server).  Raises QueueFull
+                     (→ HTTP 429 + Retry-After) when SCHEDULER_MAX_PENDING
+                     requests are already in flight.
+  slot(priority)   — LLM-call level.  At most SCHEDULER_CONCURRENCY calls run
+                     at once; waiters are served by PHASE_PRIORITY (lower
+                     first), FIFO within a priority.  core.llm.acall() takes a
+                     slot for every call, so a chat reply or router decision
+                     does not wait behind a queue of exec turns.
+
+Per-request queue stats (wait time, calls) are collected through a
+ContextVar, like core/events.py, and merged into the metrics summary.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from config import (
+    PHASE_PRIORITY,
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_CONCURRENCY_PER_MODEL,
+    SCHEDULER_MAX_PENDING,
+)
+
+# Initial guess for one request's duration, used for Retry-After until measured.
+_DEFAULT_REQUEST_SEC = 60.0
+_RETRY_AFTER_MAX = 600
+
+_REQUEST_STATS: ContextVar[dict | None] = ContextVar("llm_queue_stats", default=None)
+
+
+class QueueFull(Exception):
+    """Raised by admit() when the backend is saturated."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Admission:
+    """An admitted request.  Use as a context manager and/or call release().
+
+    scheduler=None gives an untracked admission (llm_scheduler disabled).
+    """
+
+    def __init__(self, scheduler: "LLMScheduler | None"):
+        self._scheduler = scheduler
+        self._start = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released and self._scheduler is not None:
+            self._released = True
+            self._scheduler._finish_request(time.perf_counter() - self._start)
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class LLMScheduler:
+    """Bounded, prioritised access to one model on the Ollama backend."""
+
+    def __init__(self, concurrency: int = SCHEDULER_CONCURRENCY, max_pending: int = SCHEDULER_MAX_PENDING):
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max(1, max_pending)
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []   # (priority, seq, future)
+        self._seq = itertools.count()
+        self._pending_requests = 0
+        self._avg_request_sec = _DEFAULT_REQUEST_SEC
+        self.stats = {
+            "admitted":        0,
+            "rejected":        0,
+            "llm_calls":       0,
+            "max_queue_depth": 0,
+            "total_wait_sec":  0.0,
+        }
+
+    # --- request admission ------------------------------------------------
+
+    @property
+    def pending_requests(self) -> int:
+        return self._pending_requests
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+    def retry_after(self) -> int:
+        """Seconds until the requests in flight are expected to have drained.
+
+        pending requests share `concurrency` LLM slots, each taking about
+        _avg_request_sec, so the backlog clears in avg · pending / concurrency.
+        """
+        estimate = self._avg_request_sec * self._pending_requests / self.concurrency
+        return min(_RETRY_AFTER_MAX, max(1, math.ceil(estimate)))
+
+    def admit(self) -> Admission:
+        """Admit a request or raise QueueFull (never waits)."""
+        if self._pending_requests >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise QueueFull(self.retry_after())
+        self._pending_requests += 1
+        self.stats["admitted"] += 1
+        return Admission(self)
+
+    def _finish_request(self, elapsed: float) -> None:
+        self._pending_requests -= 1
+        self._avg_request_sec = 0.8 * self._avg_request_sec + 0.2 * elapsed
+
+    # --- LLM call slots ---------------------------------------------------
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the best waiter; _active stays the same.
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0):
+        """Hold one of the model's concurrency slots for the duration of an LLM call."""
+        t0 = time.perf_counter()
+        if self._active < self.concurrency and not self.queue_depth:
+            self._active += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release_slot()   # slot was handed over just as we were cancelled
+                raise
+        wait = time.perf_counter() - t0
+        self.stats["llm_calls"] += 1
+        self.stats["total_wait_sec"] += wait
+        request_stats = _REQUEST_STATS.get()
+        if request_stats is not None:
+            request_stats["llm_calls"] += 1
+            request_stats["llm_queue_wait_sec"] += wait
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+
+_SCHEDULERS: dict[str, LLMScheduler] = {}
+
+
+def get_scheduler(model: str) -> LLMScheduler:
+    """Return the process-wide scheduler for *model*, creating it on first use."""
+    if model not in _SCHEDULERS:
+        _SCHEDULERS[model] = LLMScheduler(
+            concurrency=SCHEDULER_CONCURRENCY_PER_MODEL.get(model, SCHEDULER_CONCURRENCY)
+        )
+    return _SCHEDULERS[model]
+
+
+def phase_priority(phase: str) -> int:
+    return PHASE_PRIORITY.get(phase, max(PHASE_PRIORITY.values(), default=0))
+
+
+def track_request() -> dict:
+    """Start collecting queue stats for the current request; returns the live dict."""
+    stats = {"llm_calls": 0, "llm_queue_wait_sec": 0.0}
+    _REQUEST_STATS.set(stats)
+    return stats
@@ -25,6 +25,23 @@ def _task_message(prompt: str, steps: list[Step]) -> str:
     )
 
 
+def _llm_usage(response) -> dict:
+    """Ollama の prefill / generation カウンタを response_metadata から取り出す。
+
+    prompt_eval_count は実際に再評価されたトークン数のみを数えるため、
+    コンテキスト長より十分小さければキャッシュ済みプレフィックスが再利用されている。
+    """
+    meta = getattr(response, "response_metadata", None)
+    if not isinstance(meta, dict) or "prompt_eval_count" not in meta:
+        return {}
+    return {
+        "prompt_eval_count": meta.get("prompt_eval_count"),
+        "prompt_eval_ms":    round((meta.get("prompt_eval_duration") or 0) / 1e6),
+        "eval_count":        meta.get("eval_count"),
+        "eval_ms":           round((meta.get("eval_duration") or 0) / 1e6),
+    }
+
+
 def _sanitize(text: str) -> str:
     text = re.sub(r"<tool_call>.*?</tool_call>", "", text, flags=re.DOTALL)
     lines = [line for line in text.splitlines() if not re.match(r'\s*\{"name":', line)]
@@ -45,6 +62,12 @@ class MetricsLogger:
         self._start = datetime.now()
         self._turns: list[dict] = []
         self._replan_count: int = 0
+        self._mcp_startup: dict = {}
+        self._direct_steps: list[dict] = []
+        self._llm_queue: dict = {}
+        self._tool_memo: dict = {}
+        self._router: dict = {}
+        self._speculative_saved_sec: float | None = None
         # Capture test context from env at construction time
         self._prompt_variant = PROMPT_VARIANT
         self._task_tier = TASK_TIER
@@ -58,8 +81,19 @@ class MetricsLogger:
         tool_name_fix: str | None = None,
         arg_fixes: list[str] | None = None,
         is_error: bool | None = None,
+        llm_stats: dict | None = None,
+        args: dict | None = None,
+        trimmed: bool = False,
+        cached: bool = False,
     ) -> None:
-        """Record one LLM turn."""
+        """Record one LLM turn.
+
+        llm_stats — prefill/generation counters from _llm_usage(response).
+        args      — tool arguments; a call repeating an earlier (name, args) is a retry.
+        trimmed   — the tool result was cut before it went into the context.
+        cached    — answered from the tool memo: counted as a memo hit, not as
+                    an executed tool call or a retry.
+        """
         self._turns.append({
             "turn": turn,
             "tool_called": tool_called,
@@ -67,12 +101,41 @@ class MetricsLogger:
             "tool_name_fix": tool_name_fix,
             "arg_fixes": arg_fixes or [],
             "is_error": is_error,
+            "call_key": f"{tool_name}:{json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)}"
+                        if tool_called and args is not None else None,
+            "trimmed": trimmed,
+            "cached": cached,
+            **(llm_stats or {}),
         })
 
     def log_replan(self) -> None:
         """Increment the replan counter."""
         self._replan_count += 1
 
+    def log_direct_step(self, step: int, tool_name: str, is_error: bool) -> None:
+        """Record a plan step executed directly from its compiled args (no LLM turn)."""
+        self._direct_steps.append({"step": step, "tool_name": tool_name, "is_error": is_error})
+
+    def log_llm_queue(self, stats: dict) -> None:
+        """Attach the request's live scheduler stats (core.scheduler.track_request)."""
+        self._llm_queue = stats
+
+    def log_tool_memo(self, stats: dict) -> None:
+        """Attach the request's live tool memo hit/miss counts (tool_memo.track_request)."""
+        self._tool_memo = stats
+
+    def log_router(self, tier: str, sec: float) -> None:
+        """Record which router tier decided the intent (keyword/cache/classifier/llm)."""
+        self._router = {"router_tier": tier, "router_sec": round(sec, 3)}
+
+    def log_speculation(self, saved_sec: float) -> None:
+        """Record agent prep time hidden behind the router LLM call (speculative_agent)."""
+        self._speculative_saved_sec = round(saved_sec, 3)
+
+    def log_mcp_startup(self, stats: dict) -> None:
+        """Record MCP tool acquisition latency (cold spawn vs warm pooled sessions)."""
+        self._mcp_startup = dict(stats)
+
     def write_summary(
         self,
         steps: list[Step],
@@ -93,13 +156,27 @@ class MetricsLogger:
             return  # production mode: skip metrics
         elapsed_sec = (datetime.now() - self._start).total_seconds()
 
-        total_turns = len(self._turns)
+        # A turn with several tool calls is logged once per call (same turn number).
+        total_turns = len({t["turn"] for t in self._turns})
         tool_turns = [t for t in self._turns if t["tool_called"]]
         name_fix_turns = [t for t in tool_turns if t.get("tool_name_fix")]
         arg_fix_turns  = [t for t in tool_turns if t["arg_fixes"]]
-        error_turns    = [t for t in tool_turns if t.get("is_error")]
+        # Calls the tool memo answered never reached the tool.
+        executed_turns = [t for t in tool_turns if not t.get("cached")]
+        error_turns    = [t for t in executed_turns if t.get("is_error")]
+
+        # Retry calls: the same tool with the same args again (the model re-asks
+        # for output it could not use, e.g. a cut-off traceback).
+        seen_calls: set[str] = set()
+        retry_calls = 0
+        for t in executed_turns:
+            key = t.get("call_key")
+            if key is None:
+                continue
+            retry_calls += key in seen_calls
+            seen_calls.add(key)
 
-        tca = len(tool_turns) / total_turns if total_turns > 0 else 0.0
+        tca = len({t["turn"] for t in tool_turns}) / total_turns if total_turns > 0 else 0.0
 
         # Tool-Name Accuracy: fraction of tool calls with correct name on first try
         tool_name_accuracy = (
@@ -112,7 +189,11 @@ class MetricsLogger:
             if tool_turns else 1.0
         )
         # Error Rate: fraction of tool calls that returned an error
-        error_rate = len(error_turns) / len(tool_turns) if tool_turns else 0.0
+        error_rate = len(error_turns) / len(executed_turns) if executed_turns else 0.0
+
+        # Prefill cost actually paid: low totals vs context size = prefix cache hits
+        prompt_eval_tokens = sum(t.get("prompt_eval_count") or 0 for t in self._turns)
+        prompt_eval_sec = sum(t.get("prompt_eval_ms") or 0 for t in self._turns) / 1000
 
         total_steps = len(steps)
         done_count  = sum(1 for s in steps if s.status == "done")
@@ -136,10 +217,30 @@ class MetricsLogger:
             "step_completion_rate": step_completion_rate,
             "replan_count":         self._replan_count,
             "total_turns":          total_turns,
+            "tool_calls":           len(executed_turns),
+            "memo_hit_calls":       len(tool_turns) - len(executed_turns),
+            "retry_calls":          retry_calls,
+            "trimmed_results":      sum(1 for t in tool_turns if t.get("trimmed")),
             "total_steps":          total_steps,
             "done_steps":           done_count,
+            "prompt_eval_tokens":   prompt_eval_tokens,
+            "prompt_eval_sec":      round(prompt_eval_sec, 1),
+            "direct_steps":         len(self._direct_steps),
+            "direct_step_errors":   sum(1 for d in self._direct_steps if d["is_error"]),
+            # Exec LLM turns saved: a failed direct step is retried by the LLM.
+            "llm_turns_skipped":    sum(1 for d in self._direct_steps if not d["is_error"]),
             "tool_name_fixes":      len(name_fix_turns),
             "arg_fixes":            len(arg_fix_turns),
+            "router_tier":          self._router.get("router_tier"),
+            "router_sec":           self._router.get("router_sec"),
+            "spec_saved_sec":       self._speculative_saved_sec,
+            "llm_calls":            self._llm_queue.get("llm_calls"),
+            "llm_queue_wait_sec":   round(self._llm_queue.get("llm_queue_wait_sec", 0.0), 1),
+            "tool_memo_hits":       self._tool_memo.get("tool_memo_hits", 0),
+            "tool_memo_misses":     self._tool_memo.get("tool_memo_misses", 0),
+            "mcp_startup_sec":      self._mcp_startup.get("mcp_startup_sec"),
+            "mcp_cold_start":       self._mcp_startup.get("mcp_cold_start"),
+            "mcp_reconnects":       self._mcp_startup.get("mcp_reconnects", 0),
             "turns":                self._turns,
         }
 
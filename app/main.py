@@ -2,9 +2,18 @@ import argparse
 import asyncio
 
 from agent import run
+from agent.components.mcp_pool import get_mcp_pool
+
+
+async def _main(prompt: str) -> str | None:
+    try:
+        return await run(prompt)
+    finally:
+        await get_mcp_pool().close()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="MCP オーケストレーター")
     parser.add_argument("prompt", help="LLM へのプロンプト")
     args = parser.parse_args()
-    print(asyncio.run(run(args.prompt)) or "")
+    print(asyncio.run(_main(args.prompt)) or "")
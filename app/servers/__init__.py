@@ -5,7 +5,18 @@ from .sqlite import SERVER_CONFIG as SQLITE_CONFIG
 from .time import SERVER_CONFIG as TIME_CONFIG
 from .websearch import SERVER_CONFIG as WEBSEARCH_CONFIG
 
+# Connection table passed to MultiServerMCPClient (server name → stdio config).
+MCP_SERVERS: dict[str, dict] = {
+    "filesystem": FILESYSTEM_CONFIG,
+    "shell":      SHELL_CONFIG,
+    "websearch":  WEBSEARCH_CONFIG,
+    "time":       TIME_CONFIG,
+    "sqlite":     SQLITE_CONFIG,
+    "memory":     MEMORY_CONFIG,
+}
+
 __all__ = [
+    "MCP_SERVERS",
     "FILESYSTEM_CONFIG",
     "MEMORY_CONFIG",
     "SHELL_CONFIG",
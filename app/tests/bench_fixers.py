@@ -0,0 +1,87 @@
+"""
+Microbenchmark: fixer fuzzy matching, difflib vs the compiled FuzzyIndex.
+
+Usage:
+    python app/tests/bench_fixers.py [n_tools]
+
+Builds a synthetic catalog of n_tools MCP tool names (default 200, i.e. a few
+dozen servers), checks that both paths give identical corrections and prints
+µs per correct_tool_name-style lookup for:
+  difflib   — difflib.get_close_matches on every call (the old code path)
+  cold      — FuzzyIndex, new index and empty LRU per round (pruning only)
+  warm      — FuzzyIndex with the LRU filled (repeated hallucinations)
+"""
+
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent.base.fuzzy_index import FuzzyIndex  # noqa: E402  (import after path fix)
+
+CUTOFF = 0.80
+VERBS = ["get", "list", "read", "write", "create", "delete", "update", "search", "fetch", "run", "describe"]
+NOUNS = ["file", "directory", "table", "schema", "memory", "page", "issue", "commit", "branch", "user",
+         "calendar_event", "message", "channel", "ticket", "invoice", "contact", "document", "image"]
+
+
+def _catalog(n: int, rng: random.Random) -> list[str]:
+    names: set[str] = set()
+    while len(names) < n:
+        name = f"{rng.choice(VERBS)}_{rng.choice(NOUNS)}"
+        names.add(name if rng.random() < 0.5 else f"{name}s" if rng.random() < 0.5 else f"{name}_{rng.randint(1, 9)}")
+    return sorted(names)
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    op = rng.choice(("drop", "swap", "insert", "alias"))
+    if op == "drop":
+        return name[:i] + name[i + 1:]
+    if op == "swap" and i < len(name) - 1:
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    if op == "insert":
+        return name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz_") + name[i:]
+    return f"{rng.choice(VERBS)}_{rng.choice(NOUNS)}_tool"
+
+
+def _time(fn, words: list[str], rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(words)
+    return (time.perf_counter() - t0) / (rounds * len(words)) * 1e6
+
+
+def main(n_tools: int = 200) -> None:
+    rng = random.Random(42)
+    names = _catalog(n_tools, rng)
+    # Small models repeat the same few wrong names, so lookups repeat too.
+    distinct = [_typo(rng.choice(names), rng) for _ in range(50)]
+    words = [rng.choice(distinct) for _ in range(500)]
+
+    def _difflib(ws):
+        return [(difflib.get_close_matches(w, names, n=1, cutoff=CUTOFF) or [None])[0] for w in ws]
+
+    def _cold(ws):
+        index = FuzzyIndex(names, CUTOFF)
+        return [index._best(w) for w in ws]
+
+    warm_index = FuzzyIndex(names, CUTOFF)
+
+    def _warm(ws):
+        return [warm_index.best(w) for w in ws]
+
+    assert _difflib(words) == _cold(words) == _warm(words), "FuzzyIndex disagrees with difflib"
+    base = _time(_difflib, words, 3)
+    print(f"{n_tools} tools, {len(words)} lookups ({len(distinct)} distinct misspellings)")
+    print(f"  {'difflib':<8} {base:9.1f} µs/lookup")
+    for label, fn in (("cold", _cold), ("warm", _warm)):
+        us = _time(fn, words, 3)
+        print(f"  {label:<8} {us:9.1f} µs/lookup  ({base / us:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent.components.compactor import HistoryCompactor, build_digest, evicted_tool_calls
+from agent.components.loop_helpers import _build_context
+from core.models import Step
+
+
+def _conversation(n: int, size: int = 10) -> tuple[list, list[str]]:
+    messages = [SystemMessage(content="sys"), HumanMessage(content="task")]
+    history = []
+    for i in range(n):
+        tc = {"name": "read_file", "args": {"path": f"/data/{i}.txt"}, "id": str(i)}
+        messages.append(AIMessage(content="", tool_calls=[tc]))
+        messages.append(ToolMessage(content=f"content {i} " + "x" * size, tool_call_id=str(i)))
+        history.append(f"read_file({tc['args']}) → content {i}")
+    return messages, history
+
+
+# ── build_digest ───────────────────────────────────────────────────
+
+def test_build_digest_lists_calls_and_finished_steps():
+    steps = [
+        Step(number=1, text="1. list_tables: check", status="done", note="['sales']"),
+        Step(number=2, text="2. query: insert", status="failed", note="SQL error"),
+        Step(number=3, text="3. write_file: report", status="pending"),
+    ]
+    digest = build_digest(["list_tables({}) → ['sales']"], steps)
+    assert "1 tool calls compacted" in digest
+    assert "✅ 1. list_tables: check → ['sales']" in digest
+    assert "❌ 2. query: insert → SQL error" in digest
+    assert "3. write_file" not in digest           # pending steps are not history
+    assert "- list_tables({}) → ['sales']" in digest
+
+
+def test_build_digest_keeps_newest_calls_within_cap():
+    history = [f"call_{i}(" + "a" * 150 + ")" for i in range(50)]
+    digest = build_digest(history, [])
+    assert "call_49(" in digest
+    assert "call_0(" not in digest
+    assert "older omitted" in digest
+
+
+# ── HistoryCompactor ───────────────────────────────────────────────
+
+def test_evicted_tool_calls_counts_dropped_tool_messages():
+    messages, _ = _conversation(5)
+    ctx = messages[:2] + messages[-4:]
+    assert evicted_tool_calls(messages, ctx) == 3
+
+
+def test_compactor_digest_is_stable_between_slides():
+    messages, history = _conversation(5)
+    ctx = messages[:2] + messages[-4:]
+    steps = [Step(number=1, text="1. read_file: a", status="done", note="ok")]
+    compactor = HistoryCompactor()
+
+    first = compactor.compact(messages, ctx, history, steps)
+    steps.append(Step(number=2, text="2. read_file: b", status="done", note="ok"))
+    second = compactor.compact(messages, ctx, history, steps)
+
+    assert first.content == second.content      # no change until the window slides
+    assert "content 0" in first.content
+    assert "content 3" not in first.content     # still in the window, not compacted
+
+
+def test_compactor_returns_none_without_eviction():
+    messages, history = _conversation(2)
+    assert HistoryCompactor().compact(messages, messages, history, []) is None
+
+
+# ── _build_context ────────────────────────────────────────────────
+
+def test_build_context_inserts_digest_after_head():
+    messages, history = _conversation(12, size=600)
+    ctx = _build_context(messages, 1200, MagicMock(), compactor=HistoryCompactor(),
+                         execution_history=history, steps=[])
+    assert ctx[:2] == messages[:2]
+    assert isinstance(ctx[2], HumanMessage)
+    assert "Earlier work" in ctx[2].content
+    assert ctx[-1] is messages[-1]
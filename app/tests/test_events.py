@@ -0,0 +1,86 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import core.llm as llm
+from core import events
+
+
+def test_emit_without_sink_is_noop():
+    assert not events.streaming()
+    events.emit("router", intent="chat")   # must not raise
+
+
+def test_event_sink_collects_and_resets():
+    received = []
+    with events.event_sink(received.append):
+        events.emit("plan", checklist="⏳ 1. list_tables")
+    events.emit("plan", checklist="ignored")
+    assert received == [{"type": "plan", "checklist": "⏳ 1. list_tables"}]
+
+
+@pytest.mark.asyncio
+async def test_sink_is_inherited_by_tasks_and_isolated_between_requests():
+    a, b = [], []
+
+    async def _request(name):
+        await asyncio.sleep(0)
+        events.emit("router", intent=name)
+
+    with events.event_sink(a.append):
+        t1 = asyncio.create_task(_request("a"))
+    with events.event_sink(b.append):
+        t2 = asyncio.create_task(_request("b"))
+    await asyncio.gather(t1, t2)
+
+    assert a == [{"type": "router", "intent": "a"}]
+    assert b == [{"type": "router", "intent": "b"}]
+
+
+@pytest.mark.asyncio
+async def test_acall_uses_ainvoke_without_sink():
+    model = MagicMock()
+    model.ainvoke = AsyncMock(return_value=AIMessage(content="hi"))
+    response = await llm.acall(model, [], "chat")
+    assert response.content == "hi"
+    model.astream.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_acall_streams_tokens_and_merges_chunks():
+    async def _astream(messages):
+        yield AIMessageChunk(content="Hel")
+        yield AIMessageChunk(content="lo", response_metadata={"prompt_eval_count": 12})
+
+    model = MagicMock()
+    model.astream = _astream
+    received = []
+    with events.event_sink(received.append):
+        response = await llm.acall(model, [], "chat")
+
+    assert response.content == "Hello"
+    assert response.response_metadata["prompt_eval_count"] == 12
+    assert [e["text"] for e in received] == ["Hel", "lo"]
+    assert all(e["type"] == "token" and e["phase"] == "chat" for e in received)
+
+
+@pytest.mark.asyncio
+async def test_acall_falls_back_to_ainvoke_on_empty_stream():
+    async def _astream(messages):
+        return
+        yield
+
+    model = MagicMock()
+    model.astream = _astream
+    model.ainvoke = AsyncMock(return_value=AIMessage(content="hi"))
+    with events.event_sink(lambda e: None):
+        response = await llm.acall(model, [], "chat")
+
+    assert response.content == "hi"
+    model.ainvoke.assert_awaited_once()
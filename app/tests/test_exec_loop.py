@@ -1,8 +1,10 @@
 import sys
+from collections import defaultdict
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import ToolException
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -10,13 +12,18 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from unittest.mock import MagicMock
 
 from agent.components.loop_helpers import (
+    _apply_token_budget,
     _apply_window,
+    _estimate_tokens,
     _invoke_tool,
+    _invoke_tools,
     _trim_tool_result,
     _update_step,
     apply_fixers,
 )
-from core.models import Step
+from agent.loops import exec_loop
+from agent.loops.exec_loop import _run_direct_steps
+from core.models import Step, parse_steps
 
 
 def _make_tool(return_value=None, side_effect=None):
@@ -56,6 +63,45 @@ async def test_invoke_tool_tool_exception():
     assert "Tool error:" in result_str
 
 
+@pytest.mark.asyncio
+async def test_invoke_tools_runs_independent_calls_concurrently():
+    import asyncio
+    started, release = [], asyncio.Event()
+
+    async def _slow(args):
+        started.append(args)
+        await release.wait()
+        return "ok"
+
+    async def _release(args):
+        while len(started) < 1:
+            await asyncio.sleep(0)
+        release.set()
+        return "tables"
+
+    tool_map = {"read_file": _make_tool(side_effect=_slow), "list_tables": _make_tool(side_effect=_release)}
+    tcs = [{"name": "read_file", "args": {"path": "/data/a"}}, {"name": "list_tables", "args": {}}]
+    results = await asyncio.wait_for(_invoke_tools(tcs, tool_map), timeout=2)
+    assert results == [("ok", False), ("tables", False)]   # results stay in call order
+
+
+@pytest.mark.asyncio
+async def test_invoke_tools_orders_conflicting_calls():
+    order = []
+
+    async def _record(args):
+        order.append(args["path"] if "content" not in args else "write")
+        return "ok"
+
+    tool_map = {"write_file": _make_tool(side_effect=_record), "read_file": _make_tool(side_effect=_record)}
+    tcs = [
+        {"name": "write_file", "args": {"path": "/data/a", "content": "x"}},
+        {"name": "read_file", "args": {"path": "/data/a"}},
+    ]
+    await _invoke_tools(tcs, tool_map)
+    assert order == ["write", "/data/a"]
+
+
 # ── _update_step ───────────────────────────────────────────────────
 
 def test_update_step_success_advances_index():
@@ -77,12 +123,141 @@ def test_update_step_failure_keeps_index():
     assert new_idx == 0
 
 
+def test_update_step_skips_steps_already_done():
+    steps = [
+        Step(number=1, text="1. a", status="pending"),
+        Step(number=2, text="2. b", status="done"),
+        Step(number=3, text="3. c", status="pending"),
+    ]
+    assert _update_step(steps, 0, False, "ok") == 2
+
+
 def test_update_step_out_of_bounds_is_noop():
     steps = [Step(number=1, text="1. step one", status="done")]
     new_idx = _update_step(steps, 1, False, "extra result")
     assert new_idx == 1  # unchanged, no IndexError
 
 
+# ── run_exec_loop: step status per turn ───────────────────────────
+
+def _loop_env(monkeypatch, turns):
+    """Script the exec LLM: one AIMessage per turn, then a final answer."""
+    replies = iter(turns + [AIMessage(content="answer")])
+
+    async def _acall(model, messages, phase="exec"):
+        return next(replies)
+    monkeypatch.setattr(exec_loop.llm, "acall", _acall)
+    monkeypatch.setattr(exec_loop.llm, "bind_tools", lambda model, tools: model)
+    monkeypatch.setattr(exec_loop, "MAX_REPLANS", 0)
+
+
+def _read_tool(results: dict):
+    tool = _make_tool(side_effect=lambda args: results[args["path"]])
+    tool.name, tool.description = "read_file", "read a file"
+    tool.args_schema = {"properties": {"path": {}}, "required": ["path"]}
+    return tool
+
+
+def _read_calls(*paths):
+    return AIMessage(content="", tool_calls=[
+        {"name": "read_file", "args": {"path": p}, "id": f"c{i}"} for i, p in enumerate(paths)
+    ])
+
+
+@pytest.mark.asyncio
+async def test_exec_loop_multi_call_turn_with_error_fails_the_step(monkeypatch):
+    _loop_env(monkeypatch, [_read_calls("/data/missing.txt", "/data/a.txt")])
+    tool = _read_tool({"/data/missing.txt": "Error: file not found", "/data/a.txt": "aaa"})
+    steps = parse_steps("1. read_file: read both files\n2. write_file: save the summary")
+
+    await exec_loop.run_exec_loop("p", steps, [tool], {"read_file": tool}, MagicMock(), MagicMock(), metrics=MagicMock())
+
+    assert [s.status for s in steps] == ["failed", "pending"]
+    assert "file not found" in steps[0].note
+
+
+@pytest.mark.asyncio
+async def test_exec_loop_multi_call_turn_advances_one_step(monkeypatch):
+    _loop_env(monkeypatch, [_read_calls("/data/a.txt", "/data/b.txt", "/data/c.txt")])
+    tool = _read_tool({"/data/a.txt": "a", "/data/b.txt": "b", "/data/c.txt": "c"})
+    steps = parse_steps(
+        "1. read_file: read the three files\n2. query: load them\n3. write_file: save the report"
+    )
+
+    await exec_loop.run_exec_loop("p", steps, [tool], {"read_file": tool}, MagicMock(), MagicMock(), metrics=MagicMock())
+
+    assert [s.status for s in steps] == ["done", "pending", "pending"]
+
+
+# ── _run_direct_steps ──────────────────────────────────────────────
+
+def _schema_tool(properties: dict, required: list[str], return_value="ok"):
+    tool = _make_tool(return_value=return_value)
+    tool.args_schema = {"properties": properties, "required": required}
+    return tool
+
+
+@pytest.mark.asyncio
+async def test_run_direct_steps_runs_compiled_waves():
+    tool_map = {
+        "query": _schema_tool({"sql": {}}, ["sql"], return_value="[(3,)]"),
+        "write_file": _schema_tool({"path": {}, "content": {}}, ["path", "content"]),
+    }
+    steps = parse_steps(
+        '1. query: {"sql": "SELECT 1"} [after: -]\n'
+        '2. query: {"sql": "SELECT 2"} [after: -]\n'
+        '3. write_file: {"path": "/data/r.txt", "content": "x"} [after: 1, 2]\n'
+        "4. write_file: summarise the result"
+    )
+    messages, history, metrics = [], [], MagicMock()
+
+    executed, failed = await _run_direct_steps(steps, tool_map, messages, history, metrics, MagicMock())
+
+    assert (executed, failed) == (3, False)
+    assert [s.status for s in steps] == ["done", "done", "done", "pending"]
+    assert len(messages[0].tool_calls) == 2                # steps 1 and 2 in one wave
+    assert isinstance(messages[3], AIMessage) and messages[3].tool_calls[0]["name"] == "write_file"
+    assert len(history) == 3
+    assert metrics.log_direct_step.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_run_direct_steps_stops_after_failure():
+    tool_map = {"query": _schema_tool({"sql": {}}, ["sql"], return_value="Error: no such table")}
+    steps = parse_steps('1. query: {"sql": "SELECT * FROM x"}\n2. query: {"sql": "SELECT 2"}')
+
+    failures = defaultdict(int)
+
+    executed, failed = await _run_direct_steps(
+        steps, tool_map, [], [], MagicMock(), MagicMock(), tool_failure_counts=failures,
+    )
+
+    assert (executed, failed) == (1, True)
+    assert steps[0].status == "failed"
+    assert steps[1].status == "pending"
+    assert failures == {"query": 1}
+
+
+@pytest.mark.asyncio
+async def test_run_direct_steps_sequential_runs_one_step_at_a_time():
+    tool_map = {"query": _schema_tool({"sql": {}}, ["sql"], return_value="[(1,)]")}
+    steps = parse_steps(
+        '1. query: {"sql": "SELECT 1"} [after: -]\n'
+        '2. query: {"sql": "SELECT 2"} [after: -]\n'
+        "3. query: summarise the result\n"
+        '4. query: {"sql": "SELECT 4"} [after: -]'
+    )
+    messages = []
+
+    executed, failed = await _run_direct_steps(
+        steps, tool_map, messages, [], MagicMock(), MagicMock(), concurrent=False,
+    )
+
+    assert (executed, failed) == (2, False)
+    assert [s.status for s in steps] == ["done", "done", "pending", "pending"]   # stops at step 3
+    assert [len(m.tool_calls) for m in messages if isinstance(m, AIMessage)] == [1, 1]
+
+
 # ── _trim_tool_result ──────────────────────────────────────────────
 
 def test_trim_result_within_limit():
@@ -107,6 +282,65 @@ def test_trim_result_uses_per_tool_limit():
     assert len(result_fetch) < len(result_read)
 
 
+def test_trim_shell_output_keeps_tail_and_error_lines():
+    log = "\n".join(f"step {i} ok" for i in range(300))
+    log += "\nERROR: config missing\n" + "\n".join(f"more {i}" for i in range(300)) + "\nexit code 2"
+    result, _ = _trim_tool_result("execute_command", log)
+    assert result.startswith("step 0 ok")
+    assert result.endswith("exit code 2")
+    assert "ERROR: config missing" in result
+    assert "[truncated:" in result
+
+
+def test_trim_traceback_keeps_final_exception():
+    out = "\n".join(f"line {i}" for i in range(400)) + "\nTraceback (most recent call last):\n"
+    out += "\n".join(f'  File "/data/x.py", line {i}, in f' for i in range(80))
+    out += "\nZeroDivisionError: division by zero\n"
+    result, _ = _trim_tool_result("read_file", out)     # any tool: traceback wins
+    assert "ZeroDivisionError: division by zero" in result
+    assert 'line 79, in f' in result
+
+
+def test_trim_query_rows_keeps_header_footer_and_whole_rows():
+    rows = "\n".join(f"{i} | value {i}" for i in range(500))
+    footer = "(rows 1-500 of 9000; 8500 more — call query again with offset=500)"
+    result, _ = _trim_tool_result("query", f"id | name\n{rows}\n{footer}")
+    lines = result.split("\n")
+    assert lines[0] == "id | name"
+    assert all(" | value " in line for line in lines[1:-2])
+    assert "rows omitted" in lines[-2]
+    kept = len(lines) - 3
+    # The footer points the next page right after the last row shown.
+    assert lines[-1] == f"(rows 1-{kept} of 9000; {9000 - kept} more — call query again with offset={kept})"
+
+
+def test_trim_query_rows_rewrites_footer_of_complete_and_later_pages():
+    rows = "\n".join(f"{i} | {'x' * 60}" for i in range(51, 101))
+    result, _ = _trim_tool_result("query", f"id | name\n{rows}\n(rows 51-100 of 100)")
+    kept = len(result.split("\n")) - 3
+    assert result.endswith(f"(rows 51-{50 + kept} of 100; {50 - kept} more — call query again with offset={50 + kept})")
+    rows = "\n".join(f"{i} | {'x' * 60}" for i in range(1, 51))
+    result, _ = _trim_tool_result("query", f"id | name\n{rows}\n(50 rows)")
+    kept = len(result.split("\n")) - 3
+    assert result.endswith(f"(rows 1-{kept} of 50; {50 - kept} more — call query again with offset={kept})")
+
+
+def test_trim_query_dict_repr_cut_between_rows():
+    text = str([{"id": i, "name": "x" * 20} for i in range(200)])
+    result, _ = _trim_tool_result("query", text)
+    body = result.split("\n")[0]
+    assert body.endswith("}]")
+    assert "more rows omitted" in result
+
+
+def test_trim_read_file_cuts_on_line_boundary():
+    text = "\n".join(f"line {i} " + "y" * 50 for i in range(100))
+    result, _ = _trim_tool_result("read_file", text)
+    kept = result.split("\n")[:-1]
+    assert all(line.endswith("y" * 50) for line in kept)
+    assert "lines omitted" in result
+
+
 def test_trim_result_no_limit_when_zero():
     # A tool with limit=0 should not be trimmed.
     # Simulate by using a tool name that maps to 0 via monkey-patch — or just
@@ -143,6 +377,63 @@ def test_apply_window_preserves_head_count():
     assert result[1] == messages[1]
 
 
+def test_apply_window_slides_in_chunks():
+    # Between slides the kept tail only grows, so the cached prefix stays identical.
+    kept_starts = []
+    for n in range(15, 27):
+        result, _ = _apply_window(list(range(n)))
+        kept_starts.append(result[2])
+    assert len(set(kept_starts)) < len(kept_starts)
+    assert kept_starts == sorted(kept_starts)
+
+
+def test_apply_window_does_not_start_with_tool_message():
+    messages = [0, 1] + [
+        ToolMessage(content=str(i), tool_call_id=str(i)) if i % 2 else AIMessage(content=str(i))
+        for i in range(19)
+    ]
+    result, truncated = _apply_window(messages)
+    assert truncated is True
+    assert not isinstance(result[2], ToolMessage)
+
+
+# ── _apply_token_budget ────────────────────────────────────────────
+
+def _tool_turns(n: int, size: int) -> list:
+    msgs = []
+    for i in range(n):
+        tc = {"name": "read_file", "args": {"path": f"/data/{i}"}, "id": str(i)}
+        msgs.append(AIMessage(content="", tool_calls=[tc]))
+        msgs.append(ToolMessage(content="x" * size, tool_call_id=str(i)))
+    return msgs
+
+
+def test_estimate_tokens_counts_cjk_heavier_than_ascii():
+    assert _estimate_tokens("あいうえお" * 10) > _estimate_tokens("abcde" * 10)
+
+
+def test_token_budget_keeps_everything_when_it_fits():
+    messages = [SystemMessage(content="sys"), HumanMessage(content="task")] + _tool_turns(3, 10)
+    result, truncated = _apply_token_budget(messages, budget=10_000)
+    assert result == messages
+    assert truncated is False
+
+
+def test_token_budget_drops_oldest_whole_turns():
+    messages = [SystemMessage(content="sys"), HumanMessage(content="task")] + _tool_turns(10, 350)
+    result, truncated = _apply_token_budget(messages, budget=500)
+    assert truncated is True
+    assert result[:2] == messages[:2]                # head preserved
+    assert result[-1] is messages[-1]                # newest turn preserved
+    assert isinstance(result[2], AIMessage)          # no orphan ToolMessage
+
+
+def test_token_budget_keeps_newest_turn_even_if_oversized():
+    messages = [SystemMessage(content="sys"), HumanMessage(content="task")] + _tool_turns(2, 5000)
+    result, _ = _apply_token_budget(messages, budget=100)
+    assert result[-2:] == messages[-2:]
+
+
 # ── apply_fixers ───────────────────────────────────────────────────
 
 def _make_tool_with_schema(properties: dict):
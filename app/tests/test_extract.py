@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_WEBSEARCH = Path(__file__).resolve().parents[2] / "mcp" / "websearch"
+if not _WEBSEARCH.exists():
+    pytest.skip("mcp/websearch is not part of this checkout", allow_module_level=True)
+pytest.importorskip("bs4")
+sys.path.insert(0, str(_WEBSEARCH))
+
+from extract import bm25_scores, estimate_tokens, main_blocks, make_chunks, select_chunks  # noqa: E402
+
+_PAGE = """<html><body>
+<div class="site-header"><a href="/">Home</a></div>
+<div id="main-content">
+  <h1>Installing the widget</h1>
+  <p>The widget installs with a single command and needs no extra configuration at all.</p>
+  <ul class="related-links"><li><a href="/a">Another article about widgets and gadgets</a></li></ul>
+  <p>See <a href="/x">this very long link text that dominates the paragraph</a> ok.</p>
+  <h2>Configuring the widget</h2>
+  <p>Configuration lives in widget.toml; every option has a sensible default value.</p>
+</div>
+<div class="sidebar"><p>Subscribe to our newsletter for weekly widget news and offers.</p></div>
+</body></html>"""
+
+
+def test_main_blocks_drop_boilerplate_and_link_lists():
+    texts = [t for t, _ in main_blocks(_PAGE)]
+    assert texts[0] == "Installing the widget"
+    assert any(t.startswith("The widget installs") for t in texts)
+    assert not any("newsletter" in t for t in texts)          # class="sidebar"
+    assert not any("Another article" in t for t in texts)     # class="related-links"
+    assert not any("dominates" in t for t in texts)           # link density > 0.5
+    assert ("Configuring the widget", True) in main_blocks(_PAGE)
+
+
+def test_make_chunks_starts_a_chunk_at_each_heading():
+    blocks = [("Intro", True), ("a" * 40, False), ("b" * 40, False), ("Next", True), ("c" * 40, False)]
+    assert make_chunks(blocks) == ["Intro\n" + "a" * 40 + "\n" + "b" * 40, "Next\n" + "c" * 40]
+    long_chunks = make_chunks([("word " * 300, False)], max_chars=600)
+    assert len(long_chunks) > 1 and all(len(c) <= 600 for c in long_chunks)
+
+
+def test_bm25_ranks_the_matching_chunk_first():
+    chunks = ["pricing and plans for teams", "how to configure the widget options", "company history"]
+    scores = bm25_scores(chunks, "configuration")   # matched through the 5-char stem
+    assert scores.index(max(scores)) == 1
+    assert scores[0] == scores[2] == 0
+
+
+def test_select_chunks_with_query_fits_the_budget_in_document_order():
+    chunks = ["widget install guide", "widget notes " + "filler " * 60, "unrelated text", "widget faq"]
+    picked, omitted = select_chunks(chunks, "widget", budget_tokens=15)
+    # The long matching chunk does not fit; the smaller, lower-ranked one still does.
+    assert picked == ["widget install guide", "widget faq"]
+    assert omitted == 2
+
+
+def test_select_chunks_without_query_is_a_prefix():
+    chunks = ["a" * 40, "b" * 80, "c" * 8]    # 10, 20 and 2 tokens
+    assert select_chunks(chunks, "", budget_tokens=25) == (["a" * 40], 2)
+
+
+def test_select_chunks_cuts_a_single_oversized_chunk():
+    picked, omitted = select_chunks(["x" * 400, "y"], "", budget_tokens=10)
+    assert estimate_tokens(picked[0]) == 10 and picked[0] == "x" * len(picked[0])
+    assert omitted == 1
@@ -1,3 +1,5 @@
+import difflib
+import random
 import sys
 from pathlib import Path
 from unittest.mock import MagicMock
@@ -11,6 +13,7 @@ from agent.base.fixers import (
     correct_tool_name,
     fix_plan_tool_names,
 )
+from agent.base.fuzzy_index import FuzzyIndex
 from core.models import Step
 
 
@@ -36,6 +39,18 @@ def test_correct_tool_name_alias():
     assert fix is not None
 
 
+def test_correct_tool_name_alias_bulk_insert():
+    tool_map = {"query": MagicMock(), "bulk_insert": MagicMock()}
+    assert correct_tool_name("execute_many", tool_map)[0] == "bulk_insert"
+    assert correct_tool_name("insert_rows", tool_map)[0] == "bulk_insert"
+
+
+def test_correct_tool_name_alias_recall_many():
+    tool_map = {"recall": MagicMock(), "recall_many": MagicMock()}
+    assert correct_tool_name("get_memories", tool_map)[0] == "recall_many"
+    assert correct_tool_name("get_memory", tool_map)[0] == "recall"
+
+
 def test_correct_tool_name_fuzzy():
     tool_map = {"execute_command": MagicMock()}
     name, fix = correct_tool_name("execute_comand", tool_map)  # one-char typo
@@ -135,6 +150,21 @@ def test_fix_args_alias():
     assert len(fixes) == 1
 
 
+def test_fix_args_bulk_insert_aliases():
+    tc = {"name": "bulk_insert", "args": {"table_name": "sales", "cols": ["item"], "values": [["a"]]}}
+    tool_map = {"bulk_insert": _make_tool_with_schema({"table": {}, "columns": {}, "rows": {}})}
+    fixed_tc, fixes = _fix_args(tc, tool_map)
+    assert fixed_tc["args"] == {"table": "sales", "columns": ["item"], "rows": [["a"]]}
+    assert len(fixes) == 3
+
+
+def test_fix_args_query_paging_aliases():
+    tc = {"name": "query", "args": {"sql": "SELECT 1", "max_rows": 10, "cursor": 20}}
+    tool_map = {"query": _make_tool_with_schema({"sql": {}, "limit": {}, "offset": {}})}
+    fixed_tc, _ = _fix_args(tc, tool_map)
+    assert fixed_tc["args"] == {"sql": "SELECT 1", "limit": 10, "offset": 20}
+
+
 def test_fix_args_fuzzy():
     tc = {"name": "execute_command", "args": {"comand": "ls"}}  # typo
     tool_map = {"execute_command": _make_tool_with_schema({"command": {}})}
@@ -200,3 +230,48 @@ def test_fix_content_noop_when_no_backslash():
     fixed_tc, fix = _fix_content(tc)
     assert fix is None
     assert fixed_tc["args"]["content"] == "already\nfine"
+
+
+# ── FuzzyIndex ────────────────────────────────────────────────────
+
+def test_fuzzy_index_matches_difflib():
+    # Pruning must never change the answer, ties and empty strings included.
+    rng = random.Random(0)
+    for _ in range(500):
+        names = {"".join(rng.choice("abcde_") for _ in range(rng.randint(0, 8))) for _ in range(rng.randint(1, 12))}
+        cutoff = rng.choice([0.0, 0.5, 0.75, 0.8, 1.0])
+        index = FuzzyIndex(names, cutoff)
+        for _ in range(5):
+            word = "".join(rng.choice("abcde_") for _ in range(rng.randint(0, 9)))
+            expected = difflib.get_close_matches(word, list(names), n=1, cutoff=cutoff)
+            assert index.best(word) == (expected[0] if expected else None), (word, names, cutoff)
+
+
+def test_fix_args_schema_change_on_new_tool_object():
+    # The schema cache is per tool object: a reconnected tool gets its own schema.
+    tc = {"name": "t", "args": {"pathh": "/f"}}
+    fixed_tc, _ = _fix_args(tc, {"t": _make_tool_with_schema({"path": {}})})
+    assert fixed_tc["args"] == {"path": "/f"}
+    fixed_tc, _ = _fix_args(tc, {"t": _make_tool_with_schema({"paths": {}})})
+    assert fixed_tc["args"] == {"paths": "/f"}
+
+
+def test_schema_cache_does_not_keep_tools_alive():
+    import gc
+    import weakref
+
+    from agent.base import fixers
+    from agent.components.result_store import ResultStore
+
+    store = ResultStore()
+    store.put("read_file", "x" * 100_000)
+    tc = {"name": "read_result", "args": {"handel": "r1"}}
+    fixed_tc, _ = _fix_args(tc, {"read_result": store.tool})
+    assert fixed_tc["args"] == {"handle": "r1"}
+    assert id(store.tool) in fixers._SCHEMA_CACHE
+
+    alive, key = weakref.ref(store), id(store.tool)
+    del store
+    gc.collect()
+    assert alive() is None
+    assert key not in fixers._SCHEMA_CACHE
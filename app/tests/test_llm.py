@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import core.llm as llm
+from config import FEATURES
+
+
+def _tool(name: str, props: dict):
+    return SimpleNamespace(name=name, description=f"{name} tool", args_schema={"properties": props})
+
+
+def test_get_llm_reuses_instances_per_options(monkeypatch):
+    monkeypatch.setitem(FEATURES, "num_predict_limit", False)
+    assert llm.get_llm("exec") is llm.get_llm("plan")
+
+    monkeypatch.setitem(FEATURES, "num_predict_limit", True)
+    exec_model = llm.get_llm("exec")
+    assert exec_model is llm.get_llm("exec")
+    assert exec_model is not llm.get_llm("plan")       # different num_predict
+
+
+def test_get_llm_instances_share_http_transport(monkeypatch):
+    monkeypatch.setitem(FEATURES, "num_predict_limit", True)
+    transports = {id(llm.get_llm(p)._async_client._client._transport) for p in ("router", "exec")}
+    assert transports == {id(llm._shared_transport())}
+
+
+def test_bind_tools_cached_by_schema_hash():
+    model = MagicMock()
+    model.bind_tools.side_effect = lambda tools: object()
+    tools = [_tool("read_file", {"path": {}})]
+
+    first = llm.bind_tools(model, tools)
+    same = llm.bind_tools(model, [_tool("read_file", {"path": {}})])   # equal schema, new objects
+    other = llm.bind_tools(model, [_tool("read_file", {"path": {}, "head": {}})])
+
+    assert first is same
+    assert other is not first
+    assert model.bind_tools.call_count == 2
@@ -0,0 +1,79 @@
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import agent.components.mcp_pool as mcp_pool
+from agent.components.mcp_pool import MCPSessionPool
+
+
+class _FakeClient:
+    """Stands in for MultiServerMCPClient; counts how often each server is spawned."""
+
+    def __init__(self, fail: set[str] | None = None):
+        self.opened: dict[str, int] = {}
+        self.sessions: dict[str, SimpleNamespace] = {}
+        self.fail = fail or set()
+
+    @asynccontextmanager
+    async def session(self, name):
+        if name in self.fail:
+            raise RuntimeError(f"{name} unavailable")
+        self.opened[name] = self.opened.get(name, 0) + 1
+        session = SimpleNamespace(name=name, send_ping=AsyncMock(return_value=None))
+        self.sessions[name] = session
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def _fake_load_tools(monkeypatch):
+    async def _load(session, server_name=None):
+        return [SimpleNamespace(name=f"{server_name}_tool")]
+    monkeypatch.setattr(mcp_pool, "load_mcp_tools", _load)
+
+
+@pytest.mark.asyncio
+async def test_acquire_cold_then_warm_reuses_sessions():
+    client = _FakeClient()
+    pool = MCPSessionPool({"sqlite": {}, "time": {}}, client=client)
+
+    tools, tool_map, stats = await pool.acquire()
+    assert sorted(tool_map) == ["sqlite_tool", "time_tool"]
+    assert stats["mcp_cold_start"] is True
+
+    _, _, stats = await pool.acquire()
+    assert stats["mcp_cold_start"] is False
+    assert stats["mcp_reconnects"] == 0
+    assert client.opened == {"sqlite": 1, "time": 1}   # no respawn on warm acquire
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_acquire_reconnects_after_failed_ping():
+    client = _FakeClient()
+    pool = MCPSessionPool({"sqlite": {}}, client=client)
+    await pool.acquire()
+
+    client.sessions["sqlite"].send_ping.side_effect = RuntimeError("Connection closed")
+    _, tool_map, stats = await pool.acquire()
+
+    assert stats["mcp_reconnects"] == 1
+    assert client.opened["sqlite"] == 2
+    assert "sqlite_tool" in tool_map
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_server_is_skipped():
+    client = _FakeClient(fail={"websearch"})
+    pool = MCPSessionPool({"sqlite": {}, "websearch": {}}, client=client)
+
+    _, tool_map, _ = await pool.acquire()
+
+    assert list(tool_map) == ["sqlite_tool"]
+    await pool.close()
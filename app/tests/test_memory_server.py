@@ -0,0 +1,72 @@
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_SERVER = Path(__file__).resolve().parents[2] / "mcp" / "tools" / "memory_server.py"
+if not _SERVER.exists():
+    pytest.skip("mcp/tools is not part of this checkout", allow_module_level=True)
+pytest.importorskip("mcp.server.fastmcp")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    spec = importlib.util.spec_from_file_location("memory_server", _SERVER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "MEMORY_FILE", tmp_path / "memory.json")
+    return module
+
+
+def test_log_replays_into_a_new_process(server):
+    store = server._Store(server.MEMORY_FILE)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.delete("a")
+    fresh = server._Store(server.MEMORY_FILE)
+    assert fresh.data == {"b": "2"}
+    assert fresh.keys == ["b"]
+
+
+def test_torn_last_line_is_skipped_and_terminated(server):
+    log = server.MEMORY_FILE.with_suffix(".log")
+    log.write_text(json.dumps({"op": "set", "key": "a", "value": "1"}) + '\n{"op": "set", "ke', encoding="utf-8")
+    store = server._Store(server.MEMORY_FILE)
+    assert store.data == {"a": "1"}
+    store.set("b", "2")
+    assert server._Store(server.MEMORY_FILE).data == {"a": "1", "b": "2"}
+
+
+def test_processes_see_each_others_writes(server):
+    a, b = server._Store(server.MEMORY_FILE), server._Store(server.MEMORY_FILE)
+    a.set("from_a", "1")
+    assert b.get("from_a") == "1"
+    b.set("from_b", "2")
+    assert a.with_prefix("from_") == [("from_a", "1"), ("from_b", "2")]
+
+
+def test_compaction_keeps_other_processes_writes(server):
+    a, b = server._Store(server.MEMORY_FILE), server._Store(server.MEMORY_FILE)
+    a.set("k1", "1")
+    b.set("k2", "2")        # b has the log open
+    a.compact()
+    assert not server.MEMORY_FILE.with_suffix(".log").exists()
+    b.set("k3", "3")        # after a's compaction, b must not write into a dead file
+    a.set("k4", "4")
+    assert a.get("k3") == "3"
+    assert server._Store(server.MEMORY_FILE).data == {"k1": "1", "k2": "2", "k3": "3", "k4": "4"}
+    assert json.loads(server.MEMORY_FILE.read_text(encoding="utf-8")) == {"k1": "1", "k2": "2"}
+
+
+def test_search_memories_ranks_key_matches_first(server):
+    server.remember("project_deadline", "締め切りは 3 月末")
+    server.remember("favorite_color", "blue")
+    server.remember("notes", "the project deadline moved")
+    result = server.search_memories("deadline")
+    assert result.splitlines()[0].startswith("- project_deadline:")
+    assert "favorite_color" not in result
+    assert "締め切り" in server.search_memories("締切")
@@ -3,7 +3,7 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from core.models import Step, format_checklist, parse_steps
+from core.models import Step, format_checklist, parse_steps, ready_steps
 
 
 def test_parse_steps_basic():
@@ -57,3 +57,33 @@ def test_format_checklist_mixed():
     assert lines[0].startswith("✅")
     assert lines[1].startswith("❌")
     assert lines[2].startswith("⏳")
+
+
+def test_parse_steps_strips_dependency_annotation():
+    steps = parse_steps("1. list_tables\n2. get_current_datetime [after: -]\n3. write_file: report [after: 1, 2]")
+    assert steps[0].deps is None
+    assert steps[1].deps == []
+    assert steps[1].text == "2. get_current_datetime"
+    assert steps[2].deps == [1, 2]
+
+
+def test_ready_steps_follows_dag():
+    steps = parse_steps("1. a [after: -]\n2. b [after: -]\n3. c [after: 1, 2]\n4. d")
+    assert [s.number for s in ready_steps(steps)] == [1, 2]
+    steps[0].status = steps[1].status = "done"
+    assert [s.number for s in ready_steps(steps)] == [3]
+
+
+def test_ready_steps_without_annotation_is_sequential():
+    steps = parse_steps("1. a\n2. b")
+    assert [s.number for s in ready_steps(steps)] == [1]
+
+
+def test_ready_steps_resolves_renumbered_replan_steps():
+    # After a replan the done step 1 is kept and the new plan restarts at 1.
+    steps = [
+        Step(number=1, text="1. old", status="done"),
+        Step(number=1, text="1. new", status="failed"),
+        Step(number=2, text="2. next", deps=[1]),
+    ]
+    assert ready_steps(steps) == []
@@ -6,8 +6,9 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from config import FEATURES
 from core.models import Step
-from agent.components.planner import _apply_replan, gather_current_state, make_plan_steps
+from agent.components.planner import _apply_replan, compile_step, gather_current_state, make_plan_steps
 
 
 def _make_tool(return_value=None, side_effect=None):
@@ -133,3 +134,180 @@ async def test_apply_replan_merges_done_steps():
     # new steps follow
     assert merged[1].text == "1. revised step A"
     assert merged[2].text == "2. revised step B"
+
+
+def _schema_tool(properties: dict, required: list[str]):
+    tool = MagicMock()
+    tool.args_schema = {"properties": properties, "required": required}
+    return tool
+
+
+def test_compile_step_json_args():
+    tool_map = {"query": _schema_tool({"sql": {}}, ["sql"])}
+    tc = compile_step(Step(number=2, text='2. query: {"sql": "SELECT 1"}'), tool_map)
+    assert tc["name"] == "query"
+    assert tc["args"] == {"sql": "SELECT 1"}
+    assert tc["id"].startswith("plan_step_2_")
+
+
+def test_compile_step_rejects_inexact_args():
+    tool_map = {"write_file": _schema_tool({"path": {}, "content": {}}, ["path", "content"])}
+    assert compile_step(Step(number=1, text='1. write_file: {"path": "/data/a"}'), tool_map) is None
+    assert compile_step(Step(number=1, text='1. write_file: {"path": "/a", "mode": "w", "content": ""}'), tool_map) is None
+
+
+def test_compile_step_fixes_arg_and_tool_names():
+    tool_map = {"write_file": _schema_tool({"path": {}, "content": {}}, ["path", "content"])}
+    tc = compile_step(Step(number=1, text='1. writefile: {"file": "/data/a", "content": ""}'), tool_map)
+    assert tc["name"] == "write_file"
+    assert tc["args"] == {"path": "/data/a", "content": ""}
+
+
+def test_compile_step_literal_forms():
+    tool_map = {
+        "list_directory": _schema_tool({"path": {}}, ["path"]),
+        "get_current_datetime": _schema_tool({}, []),
+        "query": _schema_tool({"sql": {}}, ["sql"]),
+        "remember": _schema_tool({"key": {}, "value": {}}, ["key", "value"]),
+    }
+    cases = {
+        "1. list_directory: /data":                  {"path": "/data"},
+        '2. list_directory: "/data/reports"':        {"path": "/data/reports"},
+        "3. get_current_datetime: 現在時刻を取得":    {},
+        "4. get_current_datetime":                   {},
+        "5. query: SELECT COUNT(*) FROM sales":      {"sql": "SELECT COUNT(*) FROM sales"},
+        "7. query: `DELETE FROM logs WHERE id < 5;`": {"sql": "DELETE FROM logs WHERE id < 5;"},
+        '6. remember: key=city value="Tokyo Tower"': {"key": "city", "value": "Tokyo Tower"},
+    }
+    for text, args in cases.items():
+        assert compile_step(Step(number=int(text[0]), text=text), tool_map)["args"] == args
+
+
+def test_compile_step_prose_is_not_a_literal():
+    tool_map = {
+        "query": _schema_tool({"sql": {}}, ["sql"]),
+        "read_file": _schema_tool({"path": {}}, ["path"]),
+        "execute_command": _schema_tool({"command": {}}, ["command"]),
+    }
+    prose = [
+        "1. query: Create a sales table with columns id, item, amount",
+        "1. query: Select the top 5 products by revenue",
+        "1. query: delete old rows from logs",
+        "1. query: SELECT the top 5 products by revenue",          # upper-case but not SQL
+        '1. query: "count the rows in sales"',
+        "1. query: SELECT 1; DROP TABLE sales",                    # more than one statement
+        "1. query: SELECT 'unterminated",
+        "1. read_file: /data/a.txt and summarise",                 # trailing text
+        "1. read_file: /data/reports を確認",
+        '1. execute_command: "list the files in /data"',           # quoted prose
+    ]
+    for text in prose:
+        assert compile_step(Step(number=1, text=text), tool_map) is None, text
+    tc = compile_step(Step(number=1, text="1. execute_command: `ls -la /data`"), tool_map)
+    assert tc["args"] == {"command": "ls -la /data"}
+
+
+def test_compile_step_free_text_needs_llm():
+    tool_map = {"query": _schema_tool({"sql": {}}, ["sql"])}
+    assert compile_step(Step(number=1, text="1. query: count rows in sales"), tool_map) is None
+    assert compile_step(Step(number=1, text='1. unknown_tool: {"a": 1}'), tool_map) is None
+
+
+def test_compile_step_literal_needs_fast_path(monkeypatch):
+    monkeypatch.setitem(FEATURES, "step_fast_path", False)
+    tool_map = {"list_directory": _schema_tool({"path": {}}, ["path"])}
+    assert compile_step(Step(number=1, text="1. list_directory: /data"), tool_map) is None
+    assert compile_step(Step(number=1, text='1. list_directory: {"path": "/data"}'), tool_map) is not None
+
+
+# ── gather_current_state + StateCache ─────────────────────────────
+
+@pytest.fixture
+def _fresh_state_cache(monkeypatch):
+    import agent.components.state_cache as state_cache
+    cache = state_cache.StateCache()
+    monkeypatch.setattr(state_cache, "_CACHE", cache)
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_gather_current_state_served_from_cache(_fresh_state_cache):
+    tool_map = {
+        "list_tables":    _make_tool([{"type": "text", "text": "['sales']"}]),
+        "query":          _make_tool("[(0, 'id', 'INTEGER')]"),
+        "list_directory": _make_tool("a.txt"),
+        "list_memories":  _make_tool("(none)"),
+    }
+    first = await gather_current_state(tool_map)
+    second = await gather_current_state(tool_map)
+
+    assert "[State]" not in first
+    assert "refreshed: none" in second
+    assert "a.txt" in second and "INTEGER" in second
+    for tool in tool_map.values():
+        assert tool.ainvoke.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_gather_current_state_refreshes_invalidated_domain(_fresh_state_cache):
+    tool_map = {
+        "list_tables":    _make_tool([{"type": "text", "text": "['sales']"}]),
+        "query":          _make_tool("[(0, 'id', 'INTEGER')]"),
+        "list_directory": _make_tool("a.txt"),
+        "list_memories":  _make_tool("(none)"),
+    }
+    await gather_current_state(tool_map)
+    _fresh_state_cache.invalidate({"name": "write_file", "args": {"path": "/data/b.txt", "content": ""}})
+    _fresh_state_cache.invalidate({"name": "query", "args": {"sql": "SELECT * FROM sales"}})   # read-only
+    state = await gather_current_state(tool_map)
+
+    assert "[State] refreshed: files;" in state
+    assert "cached): tables, memories, schemas(sales)" in state
+    assert tool_map["list_directory"].ainvoke.call_count == 2
+    assert tool_map["list_tables"].ainvoke.call_count == 1
+
+
+def test_state_cache_shell_command_invalidates_everything():
+    from agent.components.state_cache import StateCache
+    cache = StateCache()
+    tool = object()
+    for domain in ("sqlite", "fs", "memory"):
+        cache.put(domain, "k", tool, "v")
+    cache.invalidate({"name": "execute_command", "args": {"command": "rm /data/x"}})
+    assert all(cache.get(d, "k", tool) is None for d in ("sqlite", "fs", "memory"))
+
+
+@pytest.mark.asyncio
+async def test_gather_current_state_prefers_describe_schema(_fresh_state_cache):
+    tool_map = {
+        "describe_schema": _make_tool("sales (~3 rows)\n  id INTEGER PK, region TEXT"),
+        "list_tables":     _make_tool([{"type": "text", "text": "['sales']"}]),
+        "query":           _make_tool("unused"),
+        "list_directory":  _make_tool("a.txt"),
+        "list_memories":   _make_tool("(none)"),
+    }
+    state = await gather_current_state(tool_map)
+
+    assert "id INTEGER PK, region TEXT" in state
+    tool_map["describe_schema"].ainvoke.assert_called_once_with({})
+    tool_map["list_tables"].ainvoke.assert_not_called()
+    tool_map["query"].ainvoke.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_gather_current_state_searches_memories_for_prompt(_fresh_state_cache):
+    tool_map = {
+        "list_directory":  _make_tool("a.txt"),
+        "list_memories":   _make_tool("everything"),
+        "search_memories": _make_tool("- report_format: markdown  (score 0.80)"),
+    }
+    prompt = "レポートを /data/report.md に保存して"
+    state = await gather_current_state(tool_map, prompt)
+    again = await gather_current_state(tool_map, prompt)
+    await gather_current_state(tool_map, "別のファイルを作成して")
+
+    assert "Memories related to the request" in state and "report_format" in state
+    assert "cached): files, memories" in again
+    tool_map["list_memories"].ainvoke.assert_not_called()
+    assert tool_map["search_memories"].ainvoke.call_args_list[0].args[0]["query"] == prompt
+    assert tool_map["search_memories"].ainvoke.call_count == 2      # new prompt → new search
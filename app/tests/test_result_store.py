@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent.components.loop_helpers import _result_message
+from agent.components.result_store import READ_RESULT_TOOL_NAME, ResultStore
+
+
+def test_read_pages_through_stored_result():
+    store = ResultStore()
+    handle = store.put("read_file", "0123456789" * 10)
+    first = store.read(handle, offset=0, length=30)
+    assert "chars 0-30 of 100" in first
+    assert 'read_result(handle="r1", offset=30)' in first
+    last = store.read(handle, offset=90, length=30)
+    assert last.splitlines()[1] == "0123456789"
+    assert last.endswith("[end of result]")
+
+
+def test_unknown_handle_is_an_error():
+    store = ResultStore()
+    store.put("query", "rows")
+    assert store.read("r9").startswith("Error: unknown result handle 'r9'")
+
+
+def test_oldest_results_evicted_over_capacity():
+    store = ResultStore(max_chars=100)
+    store.put("a", "x" * 60)
+    store.put("b", "y" * 60)
+    assert len(store) == 1
+    assert store.read("r1").startswith("Error:")
+    assert "y" * 60 in store.read("r2")
+
+
+@pytest.mark.asyncio
+async def test_read_result_tool_invokes_store():
+    store = ResultStore()
+    store.put("fetch_page", "abcdefghij")
+    assert store.tool.name == READ_RESULT_TOOL_NAME
+    out = await store.tool.ainvoke({"handle": "r1", "offset": 2, "length": 3})
+    assert "\ncde\n" in out
+
+
+def test_result_message_stores_trimmed_result():
+    store = ResultStore()
+    full = "z" * 5000
+    msg = _result_message({"name": "read_file", "id": "c1"}, full, MagicMock(), store)
+    assert len(msg.content) < len(full)
+    assert "stored as r1 (5000 chars)" in msg.content
+    assert store.read("r1", offset=4990, length=10).splitlines()[1] == "z" * 10
+
+
+def test_result_message_short_result_not_stored():
+    store = ResultStore()
+    msg = _result_message({"name": "read_file", "id": "c1"}, "short", MagicMock(), store)
+    assert msg.content == "short"
+    assert len(store) == 0
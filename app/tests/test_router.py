@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 from pathlib import Path
@@ -7,7 +8,9 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from agent.components.router import IntentRouter, normalize_prompt
 from agent.executor import classify_intent
+from config import FEATURES, ROUTER_CLASSIFIER_THRESHOLD
 
 logger = logging.getLogger("agent")
 
@@ -85,3 +88,173 @@ async def test_chat_with_trailing_text():
     model = _make_model("CHAT (greeting)")
     intent = await classify_intent("おはよう", model, logger)
     assert intent == "chat"
+
+
+# ── IntentRouter (cache + classifier tiers) ───────────────────────
+
+_CHAT = ["元気ですか", "調子はどう", "好きな食べ物は何", "面白い話をして", "おすすめの映画ある", "今日は疲れた"]
+_AGENT = ["data.csv を読んで", "sales テーブルを集計して", "/data のファイル一覧", "report.txt を作成して",
+          "東京の天気を検索して", "orders テーブルの件数を数えて"]
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  Ｈｅｌｌｏ   World！！ ") == "hello world"
+
+
+@pytest.mark.asyncio
+async def test_router_cache_hit_after_llm_decision(tmp_path):
+    router = IntentRouter(log_file=tmp_path / "router.jsonl")
+    assert router.lookup("売上を集計して") is None
+    await router.record("売上を集計して", "agent", 2.0)
+    assert router.lookup("売上を集計して。") == ("agent", "cache")
+    assert router.stats["cache"] == 1
+    assert router.stats["saved_sec"] == pytest.approx(2.0)
+
+
+@pytest.mark.asyncio
+async def test_router_unconfident_llm_output_is_not_learned(tmp_path):
+    log_file = tmp_path / "router.jsonl"
+    router = IntentRouter(log_file=log_file)
+    await router.record("???", "agent", 1.0, confident=False)
+    assert router.lookup("???") is None
+    assert not log_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_classifier_needs_examples_then_routes_confidently(tmp_path):
+    log_file = tmp_path / "router.jsonl"
+    router = IntentRouter(log_file=log_file)
+    for p in _CHAT:
+        await router.record(p, "chat", 1.0)
+    for p in _AGENT:
+        await router.record(p, "agent", 1.0)
+
+    # A fresh router trains from the log written above.
+    reloaded = IntentRouter(log_file=log_file)
+    assert reloaded.classifier.examples == {"chat": 6, "agent": 6}
+    intent, p = reloaded.classifier.predict(normalize_prompt("customers テーブルを集計して"))
+    assert intent == "agent" and p >= ROUTER_CLASSIFIER_THRESHOLD
+    assert reloaded.lookup("customers テーブルを集計して") == ("agent", "classifier")
+    # Mixed signals stay below the threshold and go to the LLM.
+    assert reloaded.lookup("こんにちは、ファイルを作って") is None
+
+
+@pytest.mark.asyncio
+async def test_router_log_rotates_and_reloads_backup(tmp_path):
+    log_file = tmp_path / "router.jsonl"
+    router = IntentRouter(log_file=log_file, max_log_bytes=200)
+    for p in _CHAT:
+        await router.record(p, "chat", 1.0)
+
+    backup = tmp_path / "router.jsonl.1"
+    assert backup.exists()
+    assert log_file.stat().st_size < 200 + 100           # capped at about one record past the limit
+    lines = backup.read_text(encoding="utf-8").splitlines() + log_file.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == len(_CHAT)
+    assert IntentRouter(log_file=log_file).classifier.examples["chat"] == len(_CHAT)
+
+
+@pytest.mark.asyncio
+async def test_router_log_feature_off_learns_in_memory_only(tmp_path, monkeypatch):
+    monkeypatch.setitem(FEATURES, "router_log", False)
+    log_file = tmp_path / "router.jsonl"
+    router = IntentRouter(log_file=log_file)
+    await router.record("売上を集計して", "agent", 2.0)
+    assert router.lookup("売上を集計して") == ("agent", "cache")
+    assert not log_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_classify_intent_records_to_router(tmp_path):
+    router = IntentRouter(log_file=tmp_path / "router.jsonl")
+    await classify_intent("東京の天気を調べて", _make_model("AGENT"), logger, router)
+    assert router.lookup("東京の天気を調べて") == ("agent", "cache")
+    assert router.stats["llm"] == 1
+
+
+# ── run(): speculative agent preparation ──────────────────────────
+
+@pytest.fixture
+def _spec_env(monkeypatch, tmp_path):
+    import agent.executor as executor
+
+    calls = {"prepare": 0, "plan_state": None}
+
+    async def _load_tools(log):
+        calls["prepare"] += 1
+        await asyncio.sleep(0.01)
+        return [], {}, {"mcp_startup_sec": 0.01, "mcp_cold_start": False, "mcp_reconnects": 0}
+
+    async def _gather(tool_map, prompt):
+        return "STATE"
+
+    async def _plan(prompt, tools, tool_map, model, log, current_state=None):
+        calls["plan_state"] = current_state
+        return []
+
+    async def _exec_loop(*args, **kwargs):
+        return "done"
+
+    monkeypatch.setattr(executor, "_load_tools", _load_tools)
+    monkeypatch.setattr(executor, "gather_current_state", _gather)
+    monkeypatch.setattr(executor, "make_plan_steps", _plan)
+    monkeypatch.setattr(executor, "run_exec_loop", _exec_loop)
+    monkeypatch.setattr(executor, "get_router", lambda: IntentRouter(log_file=tmp_path / "r.jsonl"))
+    monkeypatch.setattr(executor.llm, "get_llm", lambda phase: MagicMock(model="m"))
+    monkeypatch.setitem(executor.SPECULATION_STATS, "cancelled", 0)
+    monkeypatch.setitem(executor.SPECULATION_STATS, "used", 0)
+    return executor, calls
+
+
+def _router_reply(executor, monkeypatch, text):
+    async def _acall(model, messages, phase="exec"):
+        await asyncio.sleep(0.02)
+        return MagicMock(content=text)
+    monkeypatch.setattr(executor.llm, "acall", _acall)
+
+
+@pytest.mark.asyncio
+async def test_speculative_prep_is_used_on_agent(_spec_env, monkeypatch):
+    executor, calls = _spec_env
+    _router_reply(executor, monkeypatch, "AGENT")
+
+    assert await executor.run("sales を集計して") == "done"
+    assert calls["prepare"] == 1
+    assert calls["plan_state"] == "STATE"          # state came from the speculation
+    assert executor.SPECULATION_STATS["used"] == 1
+
+
+@pytest.mark.asyncio
+async def test_speculative_prep_is_cancelled_on_chat(_spec_env, monkeypatch):
+    executor, calls = _spec_env
+    _router_reply(executor, monkeypatch, "CHAT")
+
+    await executor.run("最近どう")
+    assert executor.SPECULATION_STATS["cancelled"] == 1
+    assert calls["plan_state"] is None
+
+
+@pytest.mark.asyncio
+async def test_speculative_prep_is_cancelled_when_router_fails(_spec_env, monkeypatch):
+    executor, calls = _spec_env
+    started, cancelled = asyncio.Event(), []
+
+    async def _gather(tool_map, prompt):   # _load_tools is shielded; gathering is not
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def _classify(*args):
+        await started.wait()
+        raise RuntimeError("router down")
+
+    monkeypatch.setattr(executor, "gather_current_state", _gather)
+    monkeypatch.setattr(executor, "classify_intent", _classify)
+    with pytest.raises(RuntimeError):
+        await executor.run("sales を集計して")
+    await asyncio.sleep(0.01)   # let the cancellation reach the nested awaits
+    assert executor.SPECULATION_STATS["cancelled"] == 1
+    assert cancelled == [True]
@@ -0,0 +1,126 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.scheduler import LLMScheduler, QueueFull, track_request
+
+
+@pytest.mark.asyncio
+async def test_slot_bounds_concurrency():
+    sched = LLMScheduler(concurrency=2)
+    running, peak = 0, 0
+
+    async def _call():
+        nonlocal running, peak
+        async with sched.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(_call() for _ in range(6)))
+    assert peak == 2
+    assert sched.stats["llm_calls"] == 6
+    assert sched.stats["max_queue_depth"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_by_priority_then_fifo():
+    sched = LLMScheduler(concurrency=1)
+    order = []
+    release = asyncio.Event()
+
+    async def _holder():
+        async with sched.slot():
+            await release.wait()
+
+    async def _call(name, priority):
+        async with sched.slot(priority):
+            order.append(name)
+
+    holder = asyncio.create_task(_holder())
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.create_task(_call("exec-1", 2)),
+        asyncio.create_task(_call("exec-2", 2)),
+        asyncio.create_task(_call("chat", 0)),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *waiters)
+    assert order == ["chat", "exec-1", "exec-2"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_slot():
+    sched = LLMScheduler(concurrency=1)
+    release = asyncio.Event()
+
+    async def _holder():
+        async with sched.slot():
+            await release.wait()
+
+    async def _call():
+        async with sched.slot():
+            pass
+
+    holder = asyncio.create_task(_holder())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_call())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    release.set()
+    await holder
+    await asyncio.wait_for(_call(), timeout=1)   # slot is free again
+    assert sched.queue_depth == 0
+
+
+def test_admit_rejects_when_full_and_recovers():
+    sched = LLMScheduler(concurrency=1, max_pending=2)
+    a, b = sched.admit(), sched.admit()
+    with pytest.raises(QueueFull) as exc:
+        sched.admit()
+    assert exc.value.retry_after >= 1
+    assert sched.stats["rejected"] == 1
+
+    a.release()
+    a.release()   # idempotent
+    with sched.admit():
+        assert sched.pending_requests == 2
+    b.release()
+    assert sched.pending_requests == 0
+
+
+def test_retry_after_scales_with_the_full_queue():
+    sched = LLMScheduler(concurrency=2, max_pending=4)
+    sched._avg_request_sec = 10.0
+    admitted = [sched.admit() for _ in range(4)]
+    with pytest.raises(QueueFull) as exc:
+        sched.admit()
+    assert exc.value.retry_after == 20          # ceil(10 s · 4 pending / 2 slots)
+
+    sched._avg_request_sec = 0.1
+    assert sched.retry_after() == 1             # never below 1 s
+    for a in admitted:
+        a.release()
+
+
+@pytest.mark.asyncio
+async def test_request_stats_track_wait():
+    sched = LLMScheduler(concurrency=1)
+
+    async def _request():
+        stats = track_request()
+        async with sched.slot():
+            await asyncio.sleep(0.01)
+        return stats
+
+    first, second = await asyncio.gather(
+        asyncio.create_task(_request()), asyncio.create_task(_request())
+    )
+    assert first["llm_calls"] == second["llm_calls"] == 1
+    assert second["llm_queue_wait_sec"] > 0
@@ -0,0 +1,145 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_SERVER = Path(__file__).resolve().parents[2] / "mcp" / "tools" / "sqlite_server.py"
+if not _SERVER.exists():
+    pytest.skip("mcp/tools is not part of this checkout", allow_module_level=True)
+pytest.importorskip("mcp.server.fastmcp")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    spec = importlib.util.spec_from_file_location("sqlite_server", _SERVER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "DB_PATH", str(tmp_path / "agent.db"))
+    yield module
+    module._db._close()
+
+
+def test_statements_run_in_one_transaction(server):
+    server.query("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    assert server.query("INSERT INTO t VALUES (1); INSERT INTO t VALUES (2)").startswith("OK: 2 rows affected")
+    assert server.query("INSERT INTO t VALUES (3); INSERT INTO t VALUES (1)").startswith("SQL error")
+    assert server.query("SELECT COUNT(*) FROM t").splitlines()[1] == "2"   # all or nothing
+
+
+def test_model_written_begin_commit_is_not_nested(server):
+    server.query("CREATE TABLE t (id INTEGER)")
+    result = server.query("BEGIN; INSERT INTO t VALUES (1); INSERT INTO t VALUES (2); COMMIT;")
+    assert result.startswith("OK: 2 rows affected")
+    assert server.query("BEGIN TRANSACTION").startswith("OK")
+    assert server.query("SELECT COUNT(*) FROM t").splitlines()[1] == "2"
+    assert not server._db.writer().in_transaction
+
+
+def test_model_written_rollback_is_honored(server):
+    server.query("CREATE TABLE t (id INTEGER)")
+    result = server.query("INSERT INTO t VALUES (1); COMMIT; BEGIN; INSERT INTO t VALUES (2); ROLLBACK;")
+    assert "rolled back" in result
+    assert server.query("SELECT id FROM t").splitlines()[1:] == ["1", "(1 rows)"]
+
+
+def test_vacuum_and_attach_run_outside_the_transaction(server, tmp_path):
+    server.query("CREATE TABLE t (id INTEGER)")
+    assert server.query("VACUUM").startswith("OK")
+    assert server.query("INSERT INTO t VALUES (1); VACUUM").startswith("OK: 1 rows affected")
+    other = tmp_path / "other.db"
+    assert server.query(f"ATTACH DATABASE '{other}' AS other").startswith("OK")
+    assert server.query("CREATE TABLE other.u (x); DETACH DATABASE other").startswith("OK")
+    assert server.query("SELECT id FROM t").splitlines()[1] == "1"
+
+
+def test_describe_schema_lists_columns_indexes_and_row_estimates(server):
+    server.query(
+        "CREATE TABLE sales (id INTEGER PRIMARY KEY, region TEXT NOT NULL, amount REAL DEFAULT 0);"
+        "CREATE INDEX idx_sales_region ON sales(region);"
+        'CREATE TABLE "odd ""name""" (k TEXT PRIMARY KEY, v) WITHOUT ROWID;'
+        "CREATE UNIQUE INDEX idx_odd_v ON \"odd \"\"name\"\"\"(v)"
+    )
+    server.bulk_insert("sales", ["region", "amount"], [["east", 1.5], ["west", 2.0], ["east", 3.0]])
+    server.bulk_insert('odd "name"', ["k", "v"], [["a", 1], ["b", 2]])
+
+    assert server.describe_schema().splitlines() == [
+        'odd "name" (2 rows)',                                     # WITHOUT ROWID: COUNT(*)
+        "  k TEXT PK NOT NULL, v ANY",
+        "  unique index idx_odd_v(v)",
+        "sales (~3 rows)",                                          # MAX(rowid)
+        "  id INTEGER PK, region TEXT NOT NULL, amount REAL DEFAULT 0",
+        "  index idx_sales_region(region)",
+    ]
+    assert server.describe_schema("sales").startswith("sales (~3 rows)")
+    assert server.describe_schema("nope") == "No tables found matching ['nope']."
+
+
+def test_bulk_insert_reports_inserted_count(server):
+    server.query("CREATE TABLE sales (item TEXT, amount INTEGER)")
+    assert server.bulk_insert("sales", ["item", "amount"], [["apple", 100], ["banana", 80]]) == (
+        "OK: 2 rows inserted into sales (1 transaction)."
+    )
+    # Object rows and JSON-string arguments, as small models send them.
+    assert server.bulk_insert("sales", "", '[{"item": "cherry", "amount": 5}]').startswith("OK: 1 rows")
+    assert server.query("SELECT COUNT(*), SUM(amount) FROM sales").splitlines()[1] == "3 | 185"
+
+
+def test_bulk_insert_rolls_back_whole_batch_on_bad_row(server):
+    server.query("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    result = server.bulk_insert("t", ["id", "name"], [[1, "a"], [2, "b"], [3, None], [4, "d"]])
+    assert result.startswith("SQL error") and "NOT NULL" in result
+    assert server.query("SELECT COUNT(*) FROM t").splitlines()[1] == "0"
+    assert not server._db.writer().in_transaction
+    assert server.bulk_insert("t", ["id", "name"], [[1, "a"]]).startswith("OK: 1 rows")   # writer still usable
+
+
+def test_bulk_insert_rejects_column_mismatch(server):
+    server.query("CREATE TABLE t (a, b)")
+    assert server.bulk_insert("t", ["a", "b"], [[1, 2], [3]]) == "Error: row 1 does not have 2 values (a, b)"
+    assert server.bulk_insert("t", [], [[1, 2]]) == "Error: columns must list the column names"
+    assert server.bulk_insert("t", ["a"], []) == "Error: rows must be a non-empty list of rows"
+    assert server.bulk_insert("t", ["a", "nope"], [[1, 2]]).startswith("SQL error")
+    assert server.query("SELECT COUNT(*) FROM t").splitlines()[1] == "0"
+
+
+def test_query_pages_with_footer(server):
+    server.query("CREATE TABLE t (id INTEGER)")
+    server.bulk_insert("t", ["id"], [[i] for i in range(1, 8)])
+    lines = server.query("SELECT id FROM t ORDER BY id", limit=3, offset=3).splitlines()
+    assert lines[1:4] == ["4", "5", "6"]
+    assert lines[-1] == "(rows 4-6 of 7; 1 more — call query again with offset=6)"
+
+
+def test_query_pages_count_the_total_once(server):
+    server.query("CREATE TABLE t (id INTEGER)")
+    server.bulk_insert("t", ["id"], [[i] for i in range(1, 8)])
+    sql = "SELECT id FROM t ORDER BY id"
+    assert server.query(sql, limit=3).splitlines()[-1] == (
+        "(rows 1-3 of 7; 4 more — call query again with offset=3)"
+    )
+
+    # Later pages reuse the counted total instead of reading the rest of the result.
+    reader = server._db.reader()
+    (stmt,) = server._split_statements(sql)
+    server._totals.put(reader, server._totals.version(reader), stmt, 70, False)
+    assert server.query(sql, limit=3, offset=3).splitlines()[-1] == (
+        "(rows 4-6 of 70; 64 more — call query again with offset=6)"
+    )
+
+    # A commit moves data_version, so the total is counted again.
+    server.query("INSERT INTO t VALUES (8)")
+    assert server.query(sql, limit=3, offset=3).splitlines()[-1] == (
+        "(rows 4-6 of 8; 2 more — call query again with offset=6)"
+    )
+
+
+def test_query_total_is_capped(server, monkeypatch):
+    monkeypatch.setattr(server, "QUERY_COUNT_CAP", 5)
+    server.query("CREATE TABLE t (id INTEGER)")
+    server.bulk_insert("t", ["id"], [[i] for i in range(20)])
+    assert server.query("SELECT id FROM t", limit=2).splitlines()[-1] == (
+        "(rows 1-2 of 5+; 3+ more — call query again with offset=2)"
+    )
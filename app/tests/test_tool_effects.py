@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent.base.tool_effects import affected_domains, conflicts, domain, invalidates, is_mutating
+
+
+def _tc(name: str, **args) -> dict:
+    return {"name": name, "args": args}
+
+
+def test_domain_groups_tools_by_server():
+    assert domain(_tc("read_file")) == "fs"
+    assert domain(_tc("query")) == "sqlite"
+    assert domain(_tc("some_new_tool")) == "some_new_tool"
+
+
+def test_query_mutation_depends_on_sql():
+    assert is_mutating(_tc("query", sql="SELECT * FROM t")) is False
+    assert is_mutating(_tc("query", sql="  pragma table_info(t)")) is False
+    assert is_mutating(_tc("query", sql="INSERT INTO t VALUES (1)")) is True
+    assert is_mutating(_tc("query", sql="CREATE TABLE t (id INT)")) is True
+
+
+def test_query_is_read_only_only_if_every_statement_reads():
+    assert is_mutating(_tc("query", sql="SELECT 1; DELETE FROM t")) is True
+    assert is_mutating(_tc("query", sql="WITH x AS (SELECT 1) DELETE FROM t")) is True
+    assert is_mutating(_tc("query", sql="WITH x AS (SELECT 1) SELECT * FROM x; SELECT 2")) is False
+    assert is_mutating(_tc("query", sql="SELECT ';DELETE' AS s")) is False   # ';' inside a string
+    assert is_mutating(_tc("query", sql="PRAGMA journal_mode = DELETE")) is True
+    assert is_mutating(_tc("query", sql="PRAGMA journal_mode")) is False
+    assert affected_domains(_tc("query", sql="SELECT 1; DELETE FROM t")) == {"sqlite"}
+
+
+def test_bulk_insert_mutates_sqlite():
+    insert = _tc("bulk_insert", table="t", columns=["id"], rows=[[1]])
+    assert domain(insert) == "sqlite"
+    assert is_mutating(insert) is True
+    assert conflicts(insert, _tc("query", sql="SELECT * FROM t"))
+
+
+def test_independent_reads_do_not_conflict():
+    assert not conflicts(_tc("read_file", path="/data/a"), _tc("list_tables"))
+    assert not conflicts(_tc("read_file", path="/data/a"), _tc("read_file", path="/data/a"))
+    assert not conflicts(_tc("web_search", query="x"), _tc("get_current_datetime"))
+
+
+def test_write_conflicts_only_with_overlapping_paths():
+    write = _tc("write_file", path="/data/a.txt", content="x")
+    assert conflicts(write, _tc("read_file", path="/data/a.txt"))
+    assert conflicts(write, _tc("list_directory", path="/data"))
+    assert not conflicts(write, _tc("read_file", path="/data/b.txt"))
+
+
+def test_sql_write_conflicts_with_sql_read():
+    assert conflicts(_tc("query", sql="INSERT INTO t VALUES (1)"), _tc("query", sql="SELECT * FROM t"))
+
+
+def test_shell_conflicts_with_local_state_but_not_web():
+    cmd = _tc("execute_command", command="python3 /data/x.py")
+    assert conflicts(cmd, _tc("read_file", path="/data/out.txt"))
+    assert conflicts(_tc("list_tables"), cmd)
+    assert not conflicts(cmd, _tc("web_search", query="x"))
+
+
+def test_invalidates_by_path_table_and_key():
+    write = _tc("write_file", path="/data/a.txt", content="x")
+    assert invalidates(write, _tc("list_directory", path="/data"))
+    assert not invalidates(write, _tc("read_file", path="/data/b.txt"))
+    insert = _tc("query", sql="INSERT INTO sales VALUES (1)")
+    assert invalidates(insert, _tc("query", sql="SELECT * FROM items i, Sales s"))
+    assert not invalidates(insert, _tc("query", sql="SELECT * FROM items"))
+    assert invalidates(_tc("query", sql="CREATE TABLE x (id INT)"), _tc("query", sql="SELECT * FROM items"))
+    assert invalidates(_tc("query", sql="SELECT 1; DELETE FROM items"), _tc("query", sql="SELECT * FROM items"))
+    assert invalidates(_tc("query", sql="WITH x AS (SELECT 1) DELETE FROM t"), _tc("query", sql="SELECT * FROM items"))
+    assert invalidates(_tc("bulk_insert", table="sales", columns=["id"], rows=[[1]]), _tc("list_tables"))
+    assert not invalidates(_tc("remember", key="a", value="1"), _tc("recall", key="b"))
+    assert invalidates(_tc("remember", key="a", value="1"), _tc("search_memories", query="b"))
+
+
+def test_invalidates_shell_reach_and_reads():
+    cmd = _tc("execute_command", command="rm /data/x")
+    assert invalidates(cmd, _tc("recall", key="a"))
+    assert not invalidates(cmd, _tc("web_search", query="x"))
+    assert not invalidates(_tc("read_file", path="/data/a"), _tc("read_file", path="/data/a"))
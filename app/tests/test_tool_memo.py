@@ -0,0 +1,143 @@
+import json
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent.components import tool_memo
+from agent.components.loop_helpers import _invoke_tools
+from agent.components.tool_memo import ToolMemo, memo_key
+
+
+def _tc(name: str, **args) -> dict:
+    return {"name": name, "args": args}
+
+
+def _make_tool(return_value="ok"):
+    tool = MagicMock()
+    tool.ainvoke = AsyncMock(return_value=return_value)
+    return tool
+
+
+def test_key_ignores_argument_order():
+    assert memo_key(_tc("fetch_page", url="u", query="q")) == memo_key({"name": "fetch_page", "args": {"query": "q", "url": "u"}})
+    assert memo_key(_tc("read_file", path="/data/a")) != memo_key(_tc("read_file", path="/data/b"))
+
+
+def test_only_listed_read_only_calls_are_memoized():
+    memo, tool = ToolMemo(ttl={"read_file": 60, "query": 60}), object()
+    memo.put(_tc("read_file", path="/data/a"), tool, "A")
+    memo.put(_tc("query", sql="DELETE FROM t"), tool, "deleted")
+    memo.put(_tc("write_file", path="/data/a", content="x"), tool, "written")
+    assert memo.get(_tc("read_file", path="/data/a"), tool) == "A"
+    assert memo.get(_tc("query", sql="DELETE FROM t"), tool) is None
+    assert len(memo) == 1
+
+
+def test_query_hiding_a_write_behind_a_select_is_not_memoized():
+    memo, tool = ToolMemo(ttl={"query": 60}), object()
+    for sql in ("SELECT 1; DELETE FROM t", "WITH x AS (SELECT 1) DELETE FROM t"):
+        assert memo.ttl(_tc("query", sql=sql)) == 0
+        memo.put(_tc("query", sql=sql), tool, "OK")
+        assert memo.get(_tc("query", sql=sql), tool) is None
+    memo.put(_tc("query", sql="SELECT * FROM t"), tool, "rows")
+    assert memo.invalidate(_tc("query", sql="SELECT 1; DELETE FROM t")) == 1
+
+
+def test_time_dependent_sql_is_not_memoized():
+    memo = ToolMemo(ttl={"query": 60})
+    for sql in (
+        "SELECT datetime('now')",
+        "SELECT * FROM logs WHERE ts > date('now', '-1 day')",
+        "SELECT strftime('%s', 'NOW')",
+        "SELECT CURRENT_TIMESTAMP",
+        "SELECT * FROM t ORDER BY random() LIMIT 1",
+        "SELECT hex(randomblob(4))",
+        "SELECT changes(), total_changes(), last_insert_rowid()",
+    ):
+        assert memo.ttl(_tc("query", sql=sql)) == 0, sql
+    assert memo.ttl(_tc("query", sql="SELECT created_at FROM t WHERE randomness > 0")) == 60
+
+
+def test_entry_expires_and_is_bound_to_its_tool(monkeypatch):
+    memo, tool = ToolMemo(ttl={"get_current_datetime": 1}), object()
+    now = [100.0]
+    monkeypatch.setattr(tool_memo.time, "monotonic", lambda: now[0])
+    memo.put(_tc("get_current_datetime"), tool, "12:00:00")
+    assert memo.get(_tc("get_current_datetime"), object()) is None   # reconnected server
+    memo.put(_tc("get_current_datetime"), tool, "12:00:00")
+    assert memo.get(_tc("get_current_datetime"), tool) == "12:00:00"
+    now[0] += 1.5
+    assert memo.get(_tc("get_current_datetime"), tool) is None
+    assert memo.stats == {"hits": 1, "misses": 2, "invalidated": 0}
+
+
+def test_mutation_drops_only_overlapping_entries():
+    memo, tool = ToolMemo(ttl={"read_file": 60, "list_directory": 60, "query": 60}), object()
+    memo.put(_tc("read_file", path="/data/a.txt"), tool, "A")
+    memo.put(_tc("read_file", path="/data/b.txt"), tool, "B")
+    memo.put(_tc("list_directory", path="/data"), tool, "a.txt b.txt")
+    memo.put(_tc("query", sql="SELECT * FROM sales"), tool, "rows")
+    assert memo.invalidate(_tc("write_file", path="/data/a.txt", content="x")) == 2
+    assert memo.get(_tc("read_file", path="/data/b.txt"), tool) == "B"
+    assert memo.get(_tc("query", sql="SELECT * FROM sales"), tool) == "rows"
+    memo.invalidate(_tc("query", sql="UPDATE sales SET amount = 0"))
+    assert memo.get(_tc("query", sql="SELECT * FROM sales"), tool) is None
+
+
+def test_result_fetched_across_a_mutation_is_not_stored():
+    memo, tool = ToolMemo(ttl={"read_file": 60}), object()
+    generation = memo.generation()
+    memo.invalidate(_tc("write_file", path="/data/a.txt", content="x"))
+    memo.put(_tc("read_file", path="/data/a.txt"), tool, "old", generation)
+    assert len(memo) == 0
+
+
+@pytest.mark.asyncio
+async def test_invoke_tools_reuses_result_until_write(monkeypatch):
+    memo = ToolMemo(ttl={"read_file": 60})
+    monkeypatch.setattr("agent.components.loop_helpers.get_tool_memo", lambda: memo)
+    stats = tool_memo.track_request()
+    read, write = _make_tool("content"), _make_tool("written")
+    tool_map = {"read_file": read, "write_file": write}
+    tc = _tc("read_file", path="/data/a.txt")
+
+    assert await _invoke_tools([tc], tool_map) == [("content", False)]
+    hits: set[int] = set()
+    assert await _invoke_tools([_tc("read_file", path="/data/b.txt"), tc], tool_map, hits) == [
+        ("content", False), ("content", False),
+    ]
+    assert hits == {1}
+    assert read.ainvoke.await_count == 2
+    await _invoke_tools([_tc("write_file", path="/data/a.txt", content="x")], tool_map)
+    await _invoke_tools([tc], tool_map)
+    assert read.ainvoke.await_count == 3
+    assert stats == {"tool_memo_hits": 1, "tool_memo_misses": 3}
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_memoized(monkeypatch):
+    memo = ToolMemo(ttl={"read_file": 60})
+    monkeypatch.setattr("agent.components.loop_helpers.get_tool_memo", lambda: memo)
+    tool = _make_tool("Error: no such file")
+    tc = _tc("read_file", path="/data/missing.txt")
+    await _invoke_tools([tc], {"read_file": tool})
+    await _invoke_tools([tc], {"read_file": tool})
+    assert tool.ainvoke.await_count == 2
+
+
+def test_memo_hits_are_not_counted_as_tool_calls_or_retries(tmp_path, monkeypatch):
+    from core import utils
+    monkeypatch.setattr(utils, "LOG_LEVEL", "INFO")
+    monkeypatch.setattr(utils, "METRICS_FILE", tmp_path / "metrics.jsonl")
+    metrics = utils.MetricsLogger(model_name="m", prompt="p")
+    args = {"path": "/data/a.txt"}
+    metrics.log_turn(turn=1, tool_called=True, tool_name="read_file", is_error=False, args=args)
+    metrics.log_turn(turn=2, tool_called=True, tool_name="read_file", is_error=False, args=args, cached=True)
+    metrics.write_summary([])
+
+    record = json.loads((tmp_path / "metrics.jsonl").read_text(encoding="utf-8"))
+    assert (record["tool_calls"], record["memo_hit_calls"], record["retry_calls"]) == (1, 1, 0)
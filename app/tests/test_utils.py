@@ -5,7 +5,7 @@ from types import SimpleNamespace
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from core.models import Step
-from core.utils import _sanitize, _task_message, _tool_descriptions
+from core.utils import _llm_usage, _sanitize, _task_message, _tool_descriptions
 
 
 def test_sanitize_removes_tool_call_tags():
@@ -53,3 +53,17 @@ def test_task_message_pending_count():
     msg = _task_message("do the task", steps)
     assert "2 steps remaining" in msg
     assert "do the task" in msg
+
+
+def test_llm_usage_reads_ollama_metadata():
+    response = SimpleNamespace(response_metadata={
+        "prompt_eval_count": 120, "prompt_eval_duration": 4_000_000_000,
+        "eval_count": 30, "eval_duration": 2_500_000_000,
+    })
+    usage = _llm_usage(response)
+    assert usage == {"prompt_eval_count": 120, "prompt_eval_ms": 4000, "eval_count": 30, "eval_ms": 2500}
+
+
+def test_llm_usage_empty_without_metadata():
+    assert _llm_usage(SimpleNamespace(response_metadata={})) == {}
+    assert _llm_usage(SimpleNamespace()) == {}
@@ -0,0 +1,110 @@
+import importlib.util
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+_WEBSEARCH = Path(__file__).resolve().parents[2] / "mcp" / "websearch"
+if not _WEBSEARCH.exists():
+    pytest.skip("mcp/websearch is not part of this checkout", allow_module_level=True)
+for _module in ("ddgs", "bs4", "httpx", "mcp.server.fastmcp"):
+    pytest.importorskip(_module)
+
+_ARTICLE = """<html><body><nav><a href="/">Home</a> <a href="/about">About</a></nav>
+<article><h1>{title}</h1>
+<p>{title} is served by the local stand-in server used by the websearch tests.</p>
+<p>The second paragraph is here so that the article has enough readable text to count as content.</p>
+<p>A third paragraph closes the article with a few more words about caching and revalidation.</p>
+</article></body></html>"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    log: list = []
+
+    def do_GET(self):
+        inm = self.headers.get("If-None-Match")
+        self.log.append((self.path, inm))
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        if inm == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        body = _ARTICLE.format(title=self.path.strip("/").capitalize()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    _Handler.log = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", _Handler.log
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+async def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("WEBSEARCH_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.syspath_prepend(str(_WEBSEARCH))
+    spec = importlib.util.spec_from_file_location("websearch_server", _WEBSEARCH / "server.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    if module._client is not None:
+        await module._client.aclose()
+
+
+async def test_stale_page_is_revalidated_with_etag(server, site, monkeypatch):
+    base, log = site
+    first = await server.fetch_page(f"{base}/alpha")
+    assert "Alpha is served by the local stand-in server" in first
+    assert "Home" not in first                            # <nav> removed
+
+    monkeypatch.setattr(server, "CACHE_TTL", 0)           # every entry is stale now
+    assert await server.fetch_page(f"{base}/alpha") == first
+    assert log == [("/alpha", None), ("/alpha", '"v1"')]  # second request answered with 304
+
+
+async def test_fresh_page_is_served_from_disk_cache(server, site):
+    base, log = site
+    await server.fetch_page(f"{base}/alpha")
+    await server.fetch_page(f"{base}/alpha", query="caching")
+    assert len(log) == 1
+    assert any(server.CACHE_DIR.glob("*.json"))
+
+
+async def test_http_and_connection_errors_are_reported(server, site):
+    base, _ = site
+    assert (await server.fetch_page(f"{base}/missing")).startswith("Error: 404")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed_port = s.getsockname()[1]
+    result = await server.fetch_page(f"http://127.0.0.1:{closed_port}/")
+    assert result.startswith(f"Error: failed to fetch http://127.0.0.1:{closed_port}/")
+
+
+async def test_fetch_pages_dedups_and_keeps_order(server, site):
+    base, log = site
+    result = await server.fetch_pages([f"{base}/beta", f"{base}/alpha", f"{base}/beta"])
+    headers = [line for line in result.splitlines() if line.startswith("=== ")]
+    assert headers == [f"=== {base}/beta ===", f"=== {base}/alpha ==="]
+    assert sorted(path for path, _ in log) == ["/alpha", "/beta"]
+    assert await server.fetch_pages("") == "Error: no URLs given."
@@ -1,20 +1,125 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+import core.llm as llm
 from agent import run
+from agent.executor import SPECULATION_STATS
+from agent.components.mcp_pool import get_mcp_pool
+from agent.components.router import get_router
+from config import FEATURES
+from core import events
+from core.scheduler import Admission, QueueFull, get_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the MCP session pool so the first request does not pay the spawns.
+    if FEATURES.get("mcp_session_pool", True):
+        await get_mcp_pool().start()
+    yield
+    if FEATURES.get("mcp_session_pool", True):
+        await get_mcp_pool().close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 class ChatRequest(BaseModel):
     message: str
 
 
+def _admit() -> Admission | JSONResponse:
+    """Admit a request to the LLM scheduler, or build the 429 response."""
+    if not FEATURES.get("llm_scheduler", True):
+        return Admission(None)
+    try:
+        return get_scheduler(llm.OLLAMA_MODEL).admit()
+    except QueueFull as e:
+        return JSONResponse(
+            status_code=429,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 @app.post("/chat")
-async def chat(req: ChatRequest) -> dict:
-    answer = await run(req.message)
+async def chat(req: ChatRequest):
+    admission = _admit()
+    if isinstance(admission, JSONResponse):
+        return admission
+    with admission:
+        answer = await run(req.message)
     return {"answer": answer or "(応答なし)"}
 
 
+@app.get("/stats/scheduler")
+async def scheduler_stats() -> dict:
+    sched = get_scheduler(llm.OLLAMA_MODEL)
+    return {
+        **sched.stats,
+        "queue_depth":      sched.queue_depth,
+        "pending_requests": sched.pending_requests,
+        "concurrency":      sched.concurrency,
+        "max_pending":      sched.max_pending,
+    }
+
+
+@app.get("/stats/router")
+async def router_stats() -> dict:
+    router = get_router()
+    decided = sum(router.stats[t] for t in ("keyword", "cache", "classifier", "llm"))
+    return {
+        **router.stats,
+        "llm_skip_rate": round(1 - router.stats["llm"] / decided, 3) if decided else None,
+        "classifier_examples": router.classifier.examples,
+        "speculation": SPECULATION_STATS,
+    }
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Same pipeline as /chat, streamed as NDJSON progress events (see core/events.py).
+
+    The first line is sent immediately; the last line is always an "answer"
+    (or "error") event.  A saturated backend is rejected with 429 up front.
+    """
+    admission = _admit()
+    if isinstance(admission, JSONResponse):
+        return admission
+    queue: asyncio.Queue[dict | None] = asyncio.Queue()
+
+    async def _run() -> None:
+        try:
+            with admission:
+                answer = await run(req.message)
+            queue.put_nowait({"type": "answer", "answer": answer or "(応答なし)"})
+        except Exception as e:
+            queue.put_nowait({"type": "error", "error": f"{type(e).__name__}: {e}"})
+        finally:
+            queue.put_nowait(None)
+
+    async def _lines():
+        with events.event_sink(queue.put_nowait):
+            task = asyncio.create_task(_run())   # inherits the sink via contextvars
+        try:
+            yield json.dumps({"type": "start"}) + "\n"
+            while (event := await queue.get()) is not None:
+                yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        finally:
+            task.cancel()          # client went away: stop the pipeline
+            admission.release()    # idempotent; covers a task cancelled before it started
+
+    return StreamingResponse(
+        _lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 app.mount("/", StaticFiles(directory="static", html=True), name="static")
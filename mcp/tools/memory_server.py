@@ -1,59 +1,395 @@
-"""Memory MCP Server — セッションをまたいだ key-value メモリ（/data/memory.json）"""
+"""Memory MCP Server — セッションをまたいだ key-value メモリ（/data/memory.json）
 
+メモリは起動時に一度だけ読み込み、以降はプロセス内の dict（_Store）で応答する。
+永続化:
+  - 書き込み（remember / forget）は追記ログ /data/memory.log に 1 行 JSON で追記し fsync
+  - ログが MEMORY_COMPACT_OPS 行を超えたらバックグラウンドスレッドで memory.json に
+    スナップショットを書き出してログを消す（一時ファイル + fsync + rename で原子的）
+  - 起動時は memory.json → memory.log.old（旧形式のコンパクション途中で落ちた場合）→
+    memory.log の順に再生。途中で切れた最終行は読み飛ばす
+複数プロセス（stdio クライアントごとにサーバーが起動する）で同じファイルを共有できる:
+すべての操作は memory.lock の flock の下で行い、応答前に他プロセスが追記したログの
+続きを再生する。memory.json が変わった場合（他プロセスのコンパクション、シェル等からの
+書き換え: mtime / inode 変化）やログが消えた場合は全体を読み直す。
+
+search_memories はキーと値の文字 bigram + 英数字の単語からなる転置インデックスを
+メモリ上に持ち、IDF 重み付きの一致率で順位付けする（分かち書き不要で日本語も可、
+bigram 一致なので多少の表記揺れ・typo にも当たる）。
+"""
+
+import bisect
+import fcntl
 import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
 
 from mcp.server.fastmcp import FastMCP
 
 MEMORY_FILE = Path("/data/memory.json")
+COMPACT_OPS = int(os.environ.get("MEMORY_COMPACT_OPS", "200"))
+SEARCH_MAX_LIMIT = 20
+SEARCH_MIN_SCORE = 0.2         # share of the (known) query grams' IDF weight that must match
+SEARCH_VALUE_CHARS = 200       # values are previewed, recall() returns them in full
+_KEY_BONUS = 1.0               # extra weight for a gram found in the key
+
+_WORD_RE = re.compile(r"[0-9a-z_]+|[^\W0-9a-z_]+")
 
 mcp = FastMCP("memory")
 
 
-def _load() -> dict:
-    if MEMORY_FILE.exists():
-        return json.loads(MEMORY_FILE.read_text(encoding="utf-8"))
-    return {}
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _inode(path: Path) -> int | None:
+    try:
+        return path.stat().st_ino
+    except OSError:
+        return None
+
+
+def _stat_sig(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _grams(text: str) -> set[str]:
+    """ASCII words + character bigrams of every run, plus single kanji
+    (a kanji is a word on its own: 締切 should still find 締め切り)."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    grams: set[str] = set()
+    for run in _WORD_RE.findall(text):
+        if run.isascii():
+            grams.add(run)
+        else:
+            grams.update(c for c in run if "\u4e00" <= c <= "\u9fff")
+        grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+class _Store:
+    """In-memory key/value map backed by memory.json + an fsync'd append-only log.
+
+    Every operation runs under self.lock (threads) and an flock on memory.lock
+    (other server processes), after _sync() has caught up with the files.
+    """
+
+    def __init__(self, snapshot: Path):
+        self.snapshot = snapshot
+        self.log = snapshot.with_suffix(".log")
+        self.old_log = snapshot.with_suffix(".log.old")
+        self.lock_file = snapshot.with_suffix(".lock")
+        self.lock = threading.RLock()
+        self.data: dict[str, str] = {}
+        self.keys: list[str] = []           # sorted, for prefix search
+        self._index: dict[str, set[str]] = defaultdict(set)    # gram → keys
+        self._doc_grams: dict[str, tuple[set[str], set[str]]] = {}  # key → (key grams, all grams)
+        self._log_ops = 0
+        self._log_fh = None
+        self._log_ino: int | None = None    # the log file replayed so far ...
+        self._log_pos = 0                   # ... and up to which byte
+        self._snapshot_sig = None
+        self._compacting = False
+        self._lock_fd: int | None = None
+        self._lock_depth = 0
+        with self._locked():
+            self._load()
+
+    @contextmanager
+    def _locked(self):
+        with self.lock:
+            if self._lock_depth == 0:
+                if self._lock_fd is None:
+                    self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+                    self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # --- loading ------------------------------------------------------------
+
+    def _replay(self, path: Path, start: int = 0) -> int:
+        """Apply the complete log lines of *path* from byte *start*; returns the end position.
+
+        A line without its newline is either being written by a process that
+        crashed or is torn: it is left unread (and skipped once completed).
+        """
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                chunk = f.read()
+        except OSError:
+            return start
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue   # torn line from a crash, completed by the next append's newline
+            if rec.get("op") == "set":
+                self._put(rec["key"], rec["value"])
+            elif rec.get("op") == "del":
+                self._drop(rec["key"])
+            self._log_ops += 1
+        return start + end
+
+    def _load(self) -> None:
+        self._close_log()
+        self.data = {}
+        if self.snapshot.exists():
+            try:
+                self.data = json.loads(self.snapshot.read_text(encoding="utf-8"))
+            except ValueError:
+                self.data = {}
+        self._snapshot_sig = _stat_sig(self.snapshot)
+        self.keys = sorted(self.data)
+        self._index = defaultdict(set)
+        self._doc_grams = {}
+        for key, value in self.data.items():
+            self._index_add(key, value)
+        self._log_ops = 0
+        self._replay(self.old_log)
+        self._log_ino = _inode(self.log)
+        self._log_pos = self._replay(self.log) if self._log_ino is not None else 0
+
+    def _sync(self) -> None:
+        """Catch up with writes by other processes (call under _locked)."""
+        ino = _inode(self.log)
+        if _stat_sig(self.snapshot) != self._snapshot_sig or (self._log_ino is not None and ino != self._log_ino):
+            # Compacted by another process, or memory.json replaced from outside.
+            self._load()
+        elif ino is not None:
+            self._log_ino = ino
+            self._log_pos = self._replay(self.log, self._log_pos)
+
+    def _put(self, key: str, value: str) -> None:
+        if key not in self.data:
+            bisect.insort(self.keys, key)
+        else:
+            self._index_remove(key)
+        self.data[key] = value
+        self._index_add(key, value)
+
+    def _drop(self, key: str) -> bool:
+        if key not in self.data:
+            return False
+        del self.data[key]
+        self.keys.pop(bisect.bisect_left(self.keys, key))
+        self._index_remove(key)
+        return True
+
+    # --- search index ---------------------------------------------------------
 
+    def _index_add(self, key: str, value: str) -> None:
+        key_grams = _grams(key)
+        all_grams = key_grams | _grams(str(value))
+        self._doc_grams[key] = (key_grams, all_grams)
+        for g in all_grams:
+            self._index[g].add(key)
 
-def _save(data: dict) -> None:
-    MEMORY_FILE.write_text(
-        json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
+    def _index_remove(self, key: str) -> None:
+        _, all_grams = self._doc_grams.pop(key, (set(), set()))
+        for g in all_grams:
+            keys = self._index.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[g]
+
+    def search(self, query: str, limit: int) -> tuple[list[tuple[str, str, float]], int]:
+        """Rank entries by IDF-weighted gram overlap with *query*; returns (top, n_matches)."""
+        with self._locked():
+            self._sync()
+            n = len(self.data)
+            # Grams that occur nowhere in the store carry no signal (a long task prompt
+            # used as the query is mostly such grams), so they are left out of the total.
+            weights = {g: math.log(1 + n / len(self._index[g])) for g in _grams(query) if g in self._index}
+            if not weights:
+                return [], 0
+            total = sum(weights.values()) * (1 + _KEY_BONUS)
+            scores: dict[str, float] = defaultdict(float)
+            for g, w in weights.items():
+                for key in self._index[g]:
+                    scores[key] += w * (1 + _KEY_BONUS if g in self._doc_grams[key][0] else 1.0)
+            hits = [(k, sc / total) for k, sc in scores.items() if sc / total >= SEARCH_MIN_SCORE]
+            hits.sort(key=lambda h: (-h[1], h[0]))
+            return [(k, self.data[k], sc) for k, sc in hits[:limit]], len(hits)
+
+    # --- persistence ----------------------------------------------------------
+
+    def _close_log(self) -> None:
+        if self._log_fh is not None:
+            self._log_fh.close()
+            self._log_fh = None
+
+    def _append(self, rec: dict) -> None:
+        """Append one record (call under _locked, after _sync)."""
+        if self._log_fh is None:
+            self.log.parent.mkdir(parents=True, exist_ok=True)
+            self._log_fh = open(self.log, "ab")
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        if self._log_fh.seek(0, os.SEEK_END) > self._log_pos:
+            line = b"\n" + line   # terminate a torn line left by a crashed writer
+        self._log_fh.write(line)
+        self._log_fh.flush()
+        os.fsync(self._log_fh.fileno())
+        self._log_ino, self._log_pos = _inode(self.log), self._log_fh.tell()
+        self._log_ops += 1
+        if self._log_ops >= COMPACT_OPS and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self) -> None:
+        """Write a snapshot of the current state and drop the replayed log.
+
+        Runs entirely under the flock, so no other process appends in between;
+        a crash after the rename only leaves a log that replays to the same state.
+        """
+        try:
+            with self._locked():
+                self._sync()
+                tmp = self.snapshot.with_suffix(".json.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.snapshot)
+                _fsync_dir(self.snapshot.parent)
+                self._close_log()
+                self.log.unlink(missing_ok=True)
+                self.old_log.unlink(missing_ok=True)
+                self._snapshot_sig = _stat_sig(self.snapshot)
+                self._log_ino, self._log_pos, self._log_ops = None, 0, 0
+        finally:
+            self._compacting = False
+
+    # --- operations -----------------------------------------------------------
+
+    def get(self, key: str) -> str | None:
+        with self._locked():
+            self._sync()
+            return self.data.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        with self._locked():
+            self._sync()
+            self._append({"op": "set", "key": key, "value": value})
+            self._put(key, value)
+
+    def delete(self, key: str) -> bool:
+        with self._locked():
+            self._sync()
+            if key not in self.data:
+                return False
+            self._append({"op": "del", "key": key})
+            return self._drop(key)
+
+    def with_prefix(self, prefix: str) -> list[tuple[str, str]]:
+        with self._locked():
+            self._sync()
+            if not prefix:
+                return list(self.data.items())
+            i = bisect.bisect_left(self.keys, prefix)
+            out = []
+            while i < len(self.keys) and self.keys[i].startswith(prefix):
+                out.append((self.keys[i], self.data[self.keys[i]]))
+                i += 1
+            return out
+
+
+_store: _Store | None = None
+
+
+def _get_store() -> _Store:
+    global _store
+    if _store is None or _store.snapshot != MEMORY_FILE:
+        _store = _Store(MEMORY_FILE)
+    return _store
 
 
 @mcp.tool()
 def remember(key: str, value: str) -> str:
     """Save or update a memory entry."""
-    data = _load()
-    data[key] = value
-    _save(data)
+    _get_store().set(key, value)
     return f"Remembered: {key} = {value}"
 
 
 @mcp.tool()
 def recall(key: str) -> str:
     """Retrieve a memory entry by key."""
-    return _load().get(key, f"No memory found for key: '{key}'")
+    value = _get_store().get(key)
+    return value if value is not None else f"No memory found for key: '{key}'"
+
+
+@mcp.tool()
+def recall_many(keys: list[str] | str) -> str:
+    """Retrieve several memory entries in one call. keys: list of keys (or comma-separated string)."""
+    if isinstance(keys, str):
+        keys = [k.strip() for k in keys.split(",") if k.strip()]
+    store = _get_store()
+    lines = []
+    for key in keys:
+        value = store.get(key)
+        lines.append(f"- {key}: {value}" if value is not None else f"- {key}: (not found)")
+    return "\n".join(lines) if lines else "No keys given."
+
+
+@mcp.tool()
+def list_memories(prefix: str = "") -> str:
+    """List stored memory entries. prefix: only keys starting with this string (e.g. "user_")."""
+    items = _get_store().with_prefix(prefix)
+    if not items:
+        return f"No memories with prefix '{prefix}'." if prefix else "No memories stored."
+    return "\n".join(f"- {k}: {v}" for k, v in items)
 
 
 @mcp.tool()
-def list_memories() -> str:
-    """List all stored memory entries."""
-    data = _load()
-    if not data:
-        return "No memories stored."
-    return "\n".join(f"- {k}: {v}" for k, v in data.items())
+def search_memories(query: str, limit: int = 5) -> str:
+    """Search memories by words in their keys and values (fuzzy, works for Japanese).
+    Use this when you do not know the exact key, instead of list_memories. Returns the best matches first."""
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    hits, n_matches = _get_store().search(query, limit)
+    if not hits:
+        return f"No memories match '{query}'."
+    lines = []
+    for key, value, score in hits:
+        value = str(value)
+        if len(value) > SEARCH_VALUE_CHARS:
+            value = value[:SEARCH_VALUE_CHARS] + "…"
+        lines.append(f"- {key}: {value}  (score {score:.2f})")
+    if n_matches > len(hits):
+        lines.append(f"({len(hits)} of {n_matches} matches; raise limit or refine the query for more)")
+    return "\n".join(lines)
 
 
 @mcp.tool()
 def forget(key: str) -> str:
     """Delete a memory entry by key."""
-    data = _load()
-    if key not in data:
+    if not _get_store().delete(key):
         return f"Key not found: '{key}'"
-    del data[key]
-    _save(data)
     return f"Forgotten: {key}"
 
 
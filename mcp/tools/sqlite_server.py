@@ -1,38 +1,440 @@
-"""SQLite MCP Server — /data/agent.db への SQL 操作"""
+"""SQLite MCP Server — /data/agent.db への SQL 操作
 
+接続はプロセス内で使い回す（_Connections）:
+  - writer: WAL モード、synchronous=NORMAL。書き込みは BEGIN IMMEDIATE で 1 トランザクション
+    （SQL 中の BEGIN / COMMIT / ROLLBACK はそのトランザクションに対して解釈し、
+    トランザクション内で実行できない VACUUM / ATTACH / DETACH はその外で実行する）
+  - reader: query_only の読み取り専用接続。WAL なので書き込み中でもブロックされない
+  - busy_timeout（SQLITE_BUSY_TIMEOUT_MS）でシェル実行の Python スクリプトとのロック競合を待つ
+  - cached_statements でプリペアドステートメントを再利用
+/data/agent.db が削除・置換された場合（inode 変化）は自動で開き直す。
+"""
+
+import json
+import os
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
 
 from mcp.server.fastmcp import FastMCP
 
 DB_PATH = "/data/agent.db"
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+CACHED_STATEMENTS = int(os.environ.get("SQLITE_CACHED_STATEMENTS", "256"))
+# query の結果はページ単位で返す（既定 QUERY_LIMIT 行、最大 QUERY_MAX_LIMIT 行）。
+# 総行数はカーソルを読み進めて数えるが、QUERY_COUNT_CAP 行で打ち切る。
+# 数えた総行数は SQL ごとに覚えておき（_Totals）、次のページでは数え直さない。
+QUERY_LIMIT = int(os.environ.get("SQLITE_QUERY_LIMIT", "50"))
+QUERY_MAX_LIMIT = int(os.environ.get("SQLITE_QUERY_MAX_LIMIT", "500"))
+QUERY_COUNT_CAP = int(os.environ.get("SQLITE_QUERY_COUNT_CAP", "100000"))
+_FETCH_CHUNK = 256
+_TOTALS_MAX = 64
+
+# Transaction control written by the model ("BEGIN; INSERT ...; COMMIT;").
+_TX_CONTROL_RE = re.compile(r"^\s*(BEGIN|COMMIT|END|ROLLBACK)\b(.*)$", re.IGNORECASE | re.DOTALL)
+# Statements SQLite refuses inside a transaction.
+_NO_TX_RE = re.compile(r"^\s*(VACUUM|ATTACH|DETACH)\b", re.IGNORECASE)
 
 mcp = FastMCP("sqlite")
 
 
+def _inode(path: str) -> int | None:
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+class _Connections:
+    """Persistent writer + read-only reader connection to DB_PATH."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._writer: sqlite3.Connection | None = None
+        self._reader: sqlite3.Connection | None = None
+        self._path: str | None = None
+        self._ino: int | None = None
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            DB_PATH,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=CACHED_STATEMENTS,
+            check_same_thread=False,
+            isolation_level=None,          # autocommit; transactions are explicit
+        )
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return conn
+
+    def _close(self) -> None:
+        for conn in (self._writer, self._reader):
+            if conn is not None:
+                conn.close()
+        self._writer = self._reader = None
+
+    def _check(self) -> None:
+        # DB_PATH changed (tests) or the file was deleted / replaced from the shell.
+        if self._writer is not None and (self._path != DB_PATH or _inode(DB_PATH) != self._ino):
+            self._close()
+
+    def writer(self) -> sqlite3.Connection:
+        self._check()
+        if self._writer is None:
+            self._writer = self._open()
+            self._writer.execute("PRAGMA journal_mode = WAL")
+            self._writer.execute("PRAGMA synchronous = NORMAL")
+            self._path, self._ino = DB_PATH, _inode(DB_PATH)
+        return self._writer
+
+    def reader(self) -> sqlite3.Connection:
+        self.writer()                      # creates the file and switches it to WAL first
+        if self._reader is None:
+            self._reader = self._open()
+            self._reader.execute("PRAGMA query_only = ON")
+        return self._reader
+
+
+_db = _Connections()
+
+
+class _Totals:
+    """Row totals of recent reader queries, so paging through a result counts it once.
+
+    An entry is valid while the reader connection and its PRAGMA data_version
+    are unchanged: data_version moves with every commit made by another
+    connection (our writer as well as a shell-run script).
+    """
+
+    def __init__(self, max_entries: int = _TOTALS_MAX):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[sqlite3.Connection, int, int, bool]] = OrderedDict()
+
+    @staticmethod
+    def version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get(self, conn: sqlite3.Connection, version: int, sql: str) -> tuple[int, bool] | None:
+        entry = self._entries.get(sql)
+        if entry is None or entry[0] is not conn or entry[1] != version:
+            return None
+        self._entries.move_to_end(sql)
+        return entry[2], entry[3]
+
+    def put(self, conn: sqlite3.Connection, version: int, sql: str, total: int, capped: bool) -> None:
+        self._entries[sql] = (conn, version, total, capped)
+        self._entries.move_to_end(sql)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+_totals = _Totals()
+
+
+def _split_statements(sql: str) -> list[str]:
+    """Split a SQL script into complete statements (';' inside strings/triggers is kept)."""
+    statements, buf = [], ""
+    for part in sql.split(";"):
+        buf += part + ";"
+        if sqlite3.complete_statement(buf):
+            if buf.strip(" \t\r\n;"):
+                statements.append(buf.strip())
+            buf = ""
+    if buf.strip(" \t\r\n;"):
+        statements.append(buf.strip())
+    return statements
+
+
 @mcp.tool()
 def list_tables() -> str:
     """List all tables in the SQLite database (/data/agent.db)."""
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute(
+    with _db.lock:
+        rows = _db.reader().execute(
             "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
         ).fetchall()
     return str([r[0] for r in rows]) if rows else "No tables found."
 
 
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _row_estimate(conn: sqlite3.Connection, table: str) -> str:
+    """Cheap row count: sqlite_stat1 (after ANALYZE), else MAX(rowid), else COUNT(*)."""
+    try:
+        row = conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE tbl = ? AND stat IS NOT NULL LIMIT 1", (table,)
+        ).fetchone()
+        if row:
+            return f"~{row[0].split()[0]}"
+    except sqlite3.Error:
+        pass   # no sqlite_stat1 until ANALYZE has run
+    try:
+        max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {_quote_ident(table)}").fetchone()[0]
+        return f"~{max_rowid or 0}"
+    except sqlite3.Error:
+        pass   # WITHOUT ROWID
+    try:
+        return str(conn.execute(f"SELECT COUNT(*) FROM {_quote_ident(table)}").fetchone()[0])
+    except sqlite3.Error:
+        return "?"   # e.g. a virtual table whose module is not loaded
+
+
 @mcp.tool()
-def query(sql: str) -> str:
-    """Execute a SQL statement. SELECT returns rows; INSERT/UPDATE/DELETE returns affected count."""
+def describe_schema(tables: str = "") -> str:
+    """Describe every table in one call: columns (type, PK, NOT NULL, default), approximate row count and indexes.
+
+    tables: optional comma-separated table names to describe (default: all tables).
+    Output, one block per table:
+        sales (~120 rows)
+          id INTEGER PK, region TEXT NOT NULL, amount REAL DEFAULT 0
+          index idx_sales_region(region)
+    """
+    wanted = {t.strip() for t in tables.split(",") if t.strip()}
+    with _db.lock:
+        conn = _db.reader()
+        columns = conn.execute(
+            "SELECT m.name, p.name, p.type, p.pk, p.\"notnull\", p.dflt_value"
+            " FROM sqlite_master m JOIN pragma_table_info(m.name) p"
+            " WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'"
+            " ORDER BY m.name, p.cid"
+        ).fetchall()
+        indexes = conn.execute(
+            "SELECT m.name, il.name, il.\"unique\", group_concat(ii.name, ', ')"
+            " FROM sqlite_master m JOIN pragma_index_list(m.name) il"
+            " JOIN pragma_index_info(il.name) ii"
+            " WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' AND il.origin != 'pk'"
+            " GROUP BY m.name, il.name ORDER BY m.name, il.name"
+        ).fetchall()
+
+        by_table: dict[str, list[str]] = {}
+        for table, col, ctype, pk, notnull, default in columns:
+            if wanted and table not in wanted:
+                continue
+            desc = f"{col} {ctype or 'ANY'}"
+            if pk:
+                desc += " PK"
+            if notnull:
+                desc += " NOT NULL"
+            if default is not None:
+                desc += f" DEFAULT {default}"
+            by_table.setdefault(table, []).append(desc)
+
+        if not by_table:
+            missing = f" matching {sorted(wanted)}" if wanted else ""
+            return f"No tables found{missing}."
+        blocks = []
+        for table, cols in by_table.items():
+            lines = [f"{table} ({_row_estimate(conn, table)} rows)", "  " + ", ".join(cols)]
+            lines += [
+                f"  {'unique index' if unique else 'index'} {name}({cols_})"
+                for t, name, unique, cols_ in indexes if t == table
+            ]
+            blocks.append("\n".join(lines))
+    return "\n".join(blocks)
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "NULL"
+    return str(value).replace("\n", "\\n").replace("|", "\\|")
+
+
+def _rows_result(
+    cur: sqlite3.Cursor, limit: int = QUERY_LIMIT, offset: int = 0,
+    total_key: tuple[sqlite3.Connection, int, str] | None = None,
+) -> str:
+    """Format one page of *cur* as a header + rows table.
+
+    Rows are pulled with fetchmany, so memory scales with the page size.
+    Rows before *offset* and after the page are only counted, never kept.
+    total_key — (reader, data_version, sql): the total is counted on the first
+    page and reused from _totals for the next ones while the data is unchanged.
+    """
+    limit = max(1, min(limit, QUERY_MAX_LIMIT))
+    offset = max(0, offset)
+    cols = [d[0] for d in cur.description]
+
+    skipped = 0
+    while skipped < offset:
+        chunk = cur.fetchmany(min(_FETCH_CHUNK, offset - skipped))
+        if not chunk:
+            break
+        skipped += len(chunk)
+    page = cur.fetchmany(limit)
+
+    total, capped = skipped + len(page), False
+    known = _totals.get(*total_key) if total_key is not None and len(page) == limit else None
+    if known is not None:
+        total, capped = known
+    elif len(page) == limit:
+        while True:
+            chunk = cur.fetchmany(min(_FETCH_CHUNK, QUERY_COUNT_CAP - total))
+            if not chunk:
+                break
+            total += len(chunk)
+            if total >= QUERY_COUNT_CAP:
+                capped = True
+                break
+        if total_key is not None:
+            _totals.put(*total_key, total, capped)
+
+    if not page:
+        return "No rows returned." if total == 0 else f"No rows at offset {offset} (total {total} rows)."
+    lines = [" | ".join(cols)]
+    lines += [" | ".join(_cell(v) for v in row) for row in page]
+    first, last = offset + 1, offset + len(page)
+    total_text = f"{total}+" if capped else str(total)
+    if last < total or capped:
+        lines.append(
+            f"(rows {first}-{last} of {total_text}; {total - last}{'+' if capped else ''} more — "
+            f"call query again with offset={last})"
+        )
+    else:
+        lines.append(f"({len(page)} rows)" if offset == 0 else f"(rows {first}-{last} of {total_text})")
+    return "\n".join(lines)
+
+
+def _tx_control(stmt: str) -> str | None:
+    """Classify transaction control: "begin", "commit", "rollback", or None for other SQL.
+
+    ROLLBACK TO <savepoint> is an ordinary statement inside the transaction.
+    """
+    m = _TX_CONTROL_RE.match(stmt)
+    if not m or (m.group(1).upper() == "ROLLBACK" and re.search(r"\bTO\b", m.group(2), re.IGNORECASE)):
+        return None
+    return {"BEGIN": "begin", "COMMIT": "commit", "END": "commit", "ROLLBACK": "rollback"}[m.group(1).upper()]
+
+
+def _run_write(statements: list[str], limit: int = QUERY_LIMIT, offset: int = 0) -> str:
+    """Run *statements* on the writer in one transaction (one commit for the whole batch).
+
+    The model's own BEGIN / COMMIT / ROLLBACK act on that transaction instead of
+    nesting (BEGIN inside it is a no-op, COMMIT / ROLLBACK end it early and the
+    next statement opens a new one).  VACUUM / ATTACH / DETACH cannot run in a
+    transaction: the statements before them are committed first.
+    """
+    conn = _db.writer()
+    committed, pending, result, rolled_back = 0, 0, None, False
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.execute(sql)
+        for stmt in statements:
+            control = _tx_control(stmt)
+            if control == "begin":
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                continue
+            if control is not None:
+                if conn.in_transaction:
+                    conn.execute("COMMIT" if control == "commit" else "ROLLBACK")
+                if control == "commit":
+                    committed += pending
+                else:
+                    rolled_back = True
+                pending = 0
+                continue
+            if _NO_TX_RE.match(stmt):
+                if conn.in_transaction:
+                    conn.execute("COMMIT")
+                    committed, pending = committed + pending, 0
+            elif not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(stmt)
             if cur.description:
-                cols = [d[0] for d in cur.description]
-                rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-                return str(rows) if rows else "No rows returned."
-            conn.commit()
-            return f"OK: {cur.rowcount} rows affected."
+                result = _rows_result(cur, limit, offset)
+            elif cur.rowcount > 0:
+                pending += cur.rowcount
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+        committed += pending
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    if result is not None:
+        return result
+    if rolled_back:
+        return f"OK: {committed} rows affected (the rest was rolled back by ROLLBACK)."
+    suffix = f" ({len(statements)} statements, 1 transaction)" if len(statements) > 1 else ""
+    return f"OK: {committed} rows affected.{suffix}"
+
+
+@mcp.tool()
+def query(sql: str, limit: int = QUERY_LIMIT, offset: int = 0) -> str:
+    """Execute SQL. SELECT returns a table (header line, then one line per row); INSERT/UPDATE/DELETE returns affected count.
+    At most `limit` rows are returned; the footer shows the total and the offset for the next page.
+    Several statements separated by ';' run in ONE transaction (all or nothing).
+    To insert more than one row, call bulk_insert once instead of query per row."""
+    try:
+        statements = _split_statements(sql)
+        if not statements:
+            return "SQL error: empty statement"
+        with _db.lock:
+            if len(statements) == 1 and _tx_control(statements[0]) is None:
+                # (a lone BEGIN on the reader would pin it to an old snapshot)
+                try:
+                    # Reads go to the query_only reader and never wait on a writer.
+                    reader = _db.reader()
+                    version = _totals.version(reader)
+                    cur = reader.execute(statements[0])
+                    if cur.description:
+                        return _rows_result(cur, limit, offset, (reader, version, statements[0]))
+                except sqlite3.OperationalError as e:
+                    if "readonly" not in str(e):
+                        raise
+            return _run_write(statements, limit, offset)
+    except sqlite3.Error as e:
+        return f"SQL error: {e}"
+
+
+def _coerce_json(value):
+    # Small models often send the list as a JSON string.
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+@mcp.tool()
+def bulk_insert(table: str, columns: list[str] | str, rows: list[list] | list[dict] | str) -> str:
+    """Insert MANY rows into a table with ONE call (single transaction, all or nothing).
+    Use this instead of calling query once per row.
+    Example: table="sales", columns=["item", "amount"], rows=[["apple", 100], ["banana", 80]].
+    rows may also be a list of objects: [{"item": "apple", "amount": 100}, ...]."""
+    columns = _coerce_json(columns)
+    rows = _coerce_json(rows)
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(",") if c.strip()]
+    if not isinstance(rows, list) or not rows:
+        return "Error: rows must be a non-empty list of rows"
+    if all(isinstance(r, dict) for r in rows):
+        if not columns:
+            columns = list(rows[0].keys())
+        rows = [[r.get(c) for c in columns] for r in rows]
+    if not columns:
+        return "Error: columns must list the column names"
+    bad = [i for i, r in enumerate(rows) if not isinstance(r, (list, tuple)) or len(r) != len(columns)]
+    if bad:
+        return f"Error: row {bad[0]} does not have {len(columns)} values ({', '.join(columns)})"
+
+    sql = (
+        f"INSERT INTO {_quote_ident(table)} ({', '.join(_quote_ident(c) for c in columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    try:
+        with _db.lock:
+            conn = _db.writer()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(sql, rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
     except sqlite3.Error as e:
         return f"SQL error: {e}"
+    return f"OK: {len(rows)} rows inserted into {table} (1 transaction)."
 
 
 if __name__ == "__main__":
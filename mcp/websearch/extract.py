@@ -0,0 +1,226 @@
+"""Main-content extraction and query-ranked chunk selection for fetch_page.
+
+  main_blocks(html)            — readability 風の本文抽出。<article>/<main> か、段落テキストが
+                                 最も多い要素を本文ルートとし、リンク密度の高いブロック
+                                 （ナビ・関連記事リスト等）や boilerplate な class/id を除く
+  make_chunks(blocks)          — ブロックを CHUNK_CHARS 程度のチャンクにまとめる（見出しで区切る）
+  select_chunks(chunks, query, budget_tokens)
+                               — query があれば BM25 で順位付けし、上位チャンクを予算内で
+                                 本文順に返す。query が無ければ先頭から予算まで
+
+パーサーは lxml があれば lxml、無ければ html.parser。
+"""
+
+import importlib.util
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from bs4 import BeautifulSoup
+
+PARSER = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+
+CHUNK_CHARS = 600
+MIN_BLOCK_CHARS = 25             # shorter non-heading blocks are usually UI labels
+MAX_LINK_DENSITY = 0.5
+BM25_K1 = 1.5
+BM25_B = 0.75
+_STEM_CHARS = 5
+
+_DROP_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form",
+              "nav", "footer", "header", "aside", "button", "select"]
+_BLOCK_TAGS = ["p", "li", "pre", "blockquote", "td", "dd", "dt", "figcaption",
+               "h1", "h2", "h3", "h4", "h5", "h6"]
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_BOILERPLATE_RE = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|sidebar|side-bar|breadcrumbs?|comments?|share|social|"
+    r"cookie|consent|banner|advert|ads?|promo|related|recommend|subscribe|newsletter|popup|modal)"
+    r"($|[\s_-])",
+    re.IGNORECASE,
+)
+_CONTENT_HINT_RE = re.compile(r"article|body|content|main|post|entry|story", re.IGNORECASE)
+_WORD_RE = re.compile(r"[0-9a-z_]+|[^\W0-9a-z_]+")
+
+
+def _is_boilerplate(el) -> bool:
+    attrs = el.attrs or {}
+    if attrs.get("role") in ("navigation", "banner", "contentinfo", "complementary"):
+        return True
+    names = " ".join(attrs.get("class", []) or []) + " " + str(attrs.get("id", ""))
+    # "layout-with-sidebar main-content" wraps the article itself: keep it.
+    return bool(_BOILERPLATE_RE.search(names)) and not _CONTENT_HINT_RE.search(names)
+
+
+def _text(el) -> str:
+    return " ".join(el.get_text(" ", strip=True).split())
+
+
+def _link_density(el, text_len: int) -> float:
+    if not text_len:
+        return 1.0
+    link_len = sum(len(a.get_text(" ", strip=True)) for a in el.find_all("a"))
+    return link_len / text_len
+
+
+def _content_root(soup):
+    """<article> / <main> when present, else the element holding the most paragraph text."""
+    for selector in ("article", "main", "[role=main]"):
+        candidates = soup.select(selector)
+        if candidates:
+            best = max(candidates, key=lambda el: len(_text(el)))
+            if len(_text(best)) >= 200:
+                return best
+    scores: Counter = Counter()
+    for p in soup.find_all(["p", "pre"]):
+        n = len(_text(p))
+        if n < MIN_BLOCK_CHARS:
+            continue
+        parent = p.parent
+        if parent is not None:
+            scores[id(parent)] += n
+            if parent.parent is not None:
+                scores[id(parent.parent)] += n / 2
+    if not scores:
+        return soup.body or soup
+    best_id = scores.most_common(1)[0][0]
+    for el in soup.find_all(True):
+        if id(el) == best_id:
+            return el
+    return soup.body or soup
+
+
+def main_blocks(html: str) -> list[tuple[str, bool]]:
+    """Return the main content as (text, is_heading) blocks in document order."""
+    soup = BeautifulSoup(html, PARSER)
+    for tag in soup(_DROP_TAGS):
+        tag.decompose()
+    for el in soup.find_all(True):
+        if not el.decomposed and el.name not in ("html", "body") and _is_boilerplate(el):
+            el.decompose()
+
+    root = _content_root(soup)
+    blocks: list[tuple[str, bool]] = []
+    for el in root.find_all(_BLOCK_TAGS):
+        if el.find(_BLOCK_TAGS):
+            continue   # only leaf blocks, so nested <li><p> is not emitted twice
+        text = _text(el)
+        heading = el.name in _HEADINGS
+        if not text or (not heading and len(text) < MIN_BLOCK_CHARS):
+            continue
+        if not heading and _link_density(el, len(text)) > MAX_LINK_DENSITY:
+            continue
+        blocks.append((text, heading))
+
+    if sum(len(t) for t, _ in blocks) < 200:
+        # Pages that keep their text in bare <div>s: fall back to the root's lines.
+        lines = [" ".join(line.split()) for line in root.get_text("\n").splitlines()]
+        blocks = [(line, False) for line in lines if len(line) >= MIN_BLOCK_CHARS] or blocks
+    return blocks
+
+
+def make_chunks(blocks: list[tuple[str, bool]], max_chars: int = CHUNK_CHARS) -> list[str]:
+    """Merge consecutive blocks into ~max_chars chunks; a heading opens a new chunk."""
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for text, heading in blocks:
+        if current and (heading or size + len(text) > max_chars):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        while len(text) > max_chars:
+            # An overlong paragraph is split on its own.
+            cut = text.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            chunks.append(text[:cut].strip())
+            text = text[cut:].strip()
+        current.append(text)
+        size += len(text)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _terms(text: str) -> list[str]:
+    """ASCII words (plus a 5-char prefix as a poor man's stem: configure ~ configuration)
+    + character bigrams (and single kanji) of non-ASCII runs."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    terms: list[str] = []
+    for run in _WORD_RE.findall(text):
+        if run.isascii():
+            terms.append(run)
+            if len(run) > _STEM_CHARS:
+                terms.append(run[:_STEM_CHARS] + "*")
+            continue
+        terms.extend(c for c in run if "\u4e00" <= c <= "\u9fff")
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def bm25_scores(chunks: list[str], query: str) -> list[float]:
+    """Okapi BM25 score of every chunk for *query* (IDF over the page's chunks)."""
+    docs = [Counter(_terms(c)) for c in chunks]
+    if not docs:
+        return []
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    n = len(docs)
+    scores = [0.0] * n
+    for term in set(_terms(query)):
+        df = sum(1 for d in docs if term in d)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf = d.get(term, 0)
+            if tf:
+                length = sum(d.values())
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+    return scores
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII chars per token, ~1 token per other character."""
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def select_chunks(chunks: list[str], query: str, budget_tokens: int) -> tuple[list[str], int]:
+    """Pick chunks within *budget_tokens*, best BM25 first when *query* is given,
+    otherwise (or when nothing matches) the leading chunks.
+
+    Returns (chunks in document order, number of chunks left out).
+    """
+    order = list(range(len(chunks)))
+    ranked = False
+    if query.strip():
+        scores = bm25_scores(chunks, query)
+        if any(scores):
+            # Chunks sharing no term with the query are not worth their tokens.
+            order = sorted((i for i in order if scores[i] > 0), key=lambda i: (-scores[i], i))
+            ranked = True
+    picked: list[int] = []
+    used = 0
+    for i in order:
+        cost = estimate_tokens(chunks[i])
+        if used + cost > budget_tokens:
+            if picked:
+                if ranked:
+                    continue   # a smaller, lower-ranked chunk may still fit
+                break          # the beginning of the article must not have holes
+            # Not even the best chunk fits: cut it to the budget.
+            return [_cut_to_budget(chunks[i], budget_tokens)], len(chunks) - 1
+        picked.append(i)
+        used += cost
+    picked.sort()
+    return [chunks[i] for i in picked], len(chunks) - len(picked)
+
+
+def _cut_to_budget(text: str, budget_tokens: int) -> str:
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
@@ -5,22 +5,155 @@ DuckDuckGo を使ったウェブ検索 MCP サーバー（APIキー不要）
 
 ツール:
   web_search  - DuckDuckGo でキーワード検索し、タイトル・URL・概要を返す
-  fetch_page  - 指定 URL のページ本文テキストを取得する
+  fetch_page  - 指定 URL のページ本文を取得する。query を渡すとその内容に関係する部分だけを返す
+  fetch_pages - 複数 URL を並列に取得する（1 回のツール呼び出しで済む）
+
+本文抽出とチャンク選択は extract.py（readability 風の本文抽出 + BM25）。返すのは
+WEBSEARCH_PAGE_TOKENS トークン（推定）以内の上位チャンクのみ。
+
+HTTP はプロセス共有の httpx.AsyncClient（keep-alive、h2 があれば HTTP/2）で行い、
+検索結果とページはディスクキャッシュ（_DiskCache）に保存する:
+  - WEBSEARCH_CACHE_TTL 秒以内はネットワークに出ない
+  - 期限切れのページは ETag / Last-Modified で再検証し、304 なら本文を使い回す
+  - 合計 WEBSEARCH_CACHE_MAX_BYTES を超えたら古いもの（最終アクセス順）から削除
+URL はそのまま使うので、WEBSEARCH_CACHE_DIR を一時ディレクトリにすればローカルのテスト用
+HTTP サーバー相手にもそのまま動かせる。
 """
 
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
 import httpx
-from bs4 import BeautifulSoup
 from ddgs import DDGS
 from mcp.server.fastmcp import FastMCP
 
+from extract import estimate_tokens, main_blocks, make_chunks, select_chunks
+
+CACHE_DIR = Path(os.environ.get("WEBSEARCH_CACHE_DIR", "/tmp/websearch-cache"))
+CACHE_TTL = int(os.environ.get("WEBSEARCH_CACHE_TTL", "3600"))
+CACHE_MAX_BYTES = int(os.environ.get("WEBSEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FETCH_TIMEOUT = 15
+FETCH_CONCURRENCY = 4
+# ≈ TOOL_RESULT_MAX_CHARS["fetch_page"] (1500 chars) on the agent side for English text,
+# so the agent's blind cut rarely has to kick in.
+PAGE_TOKENS = int(os.environ.get("WEBSEARCH_PAGE_TOKENS", "375"))
+USER_AGENT = "Mozilla/5.0"
+
 mcp = FastMCP("websearch")
 
 
+class _DiskCache:
+    """Size-bounded JSON-per-entry cache; eviction by last access (file mtime).
+
+    get / put do blocking file I/O (put may glob the whole directory to evict):
+    async code calls them through asyncio.to_thread.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: int | None = None   # computed on first write
+
+    def _path(self, key: str) -> Path:
+        return self.root / (hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)                  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def put(self, key: str, entry: dict) -> None:
+        data = json.dumps({**entry, "key": key}, ensure_ascii=False).encode()
+        if len(data) > self.max_bytes // 4:
+            return   # one huge page must not flush the whole cache
+        path = self._path(key)
+        with self._lock:
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                if self._size is None:
+                    self._size = sum(p.stat().st_size for p in self.root.glob("*.json"))
+                old = path.stat().st_size if path.exists() else 0
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError:
+                return
+            self._size += len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        files = []
+        for p in self.root.glob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        self._size = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for _, size, p in files:
+            if self._size <= target:
+                break
+            p.unlink(missing_ok=True)
+            self._size -= size
+
+
+_cache = _DiskCache(CACHE_DIR, CACHE_MAX_BYTES)
+_client: httpx.AsyncClient | None = None
+_ddgs: DDGS | None = None
+_ddgs_lock = threading.Lock()
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Process-wide client: connection pool + keep-alive across tool calls."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            follow_redirects=True,
+            timeout=FETCH_TIMEOUT,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+        )
+    return _client
+
+
+def _search_sync(query: str, max_results: int) -> list[dict]:
+    global _ddgs
+    with _ddgs_lock:
+        if _ddgs is None:
+            _ddgs = DDGS()
+        return list(_ddgs.text(query, max_results=max_results))
+
+
+def _fresh(entry: dict) -> bool:
+    return time.time() - entry.get("fetched_at", 0) < CACHE_TTL
+
+
 @mcp.tool()
-def web_search(query: str, max_results: int = 5) -> str:
+async def web_search(query: str, max_results: int = 5) -> str:
     """Search the web using DuckDuckGo. Returns titles, URLs and snippets."""
-    with DDGS() as ddgs:
-        results = list(ddgs.text(query, max_results=max_results))
+    key = f"search:{max_results}:{query.strip().lower()}"
+    entry = await asyncio.to_thread(_cache.get, key)
+    if entry is not None and _fresh(entry):
+        results = entry["results"]
+    else:
+        results = await asyncio.to_thread(_search_sync, query, max_results)
+        if results:
+            await asyncio.to_thread(_cache.put, key, {"results": results, "fetched_at": time.time()})
     if not results:
         return "No results found."
     lines = []
@@ -29,21 +162,85 @@ def web_search(query: str, max_results: int = 5) -> str:
     return "\n\n".join(lines)
 
 
-@mcp.tool()
-def fetch_page(url: str) -> str:
-    """Fetch and extract text content from a web page (max 8000 chars)."""
+async def _get_html(url: str) -> str:
+    """Page body via the cache; stale entries are revalidated with ETag / Last-Modified.
+
+    Raises httpx.HTTPStatusError / httpx.RequestError like client.get().
+    """
+    key = f"page:{url}"
+    entry = await asyncio.to_thread(_cache.get, key)
+    if entry is not None and _fresh(entry):
+        return entry["body"]
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    resp = await _get_client().get(url, headers=headers)
+    if resp.status_code == 304 and entry is not None:
+        await asyncio.to_thread(_cache.put, key, {**entry, "fetched_at": time.time()})
+        return entry["body"]
+    resp.raise_for_status()
+
+    if "no-store" not in resp.headers.get("cache-control", ""):
+        await asyncio.to_thread(_cache.put, key, {
+            "body":          resp.text,
+            "etag":          resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+            "fetched_at":    time.time(),
+        })
+    return resp.text
+
+
+def _extract(html: str, query: str, budget_tokens: int) -> str:
+    chunks = make_chunks(main_blocks(html))
+    if not chunks:
+        return "(no readable text found on the page)"
+    picked, omitted = select_chunks(chunks, query, budget_tokens)
+    text = "\n\n".join(picked)
+    if omitted:
+        hint = "matching the query" if query.strip() else "in order"
+        text += f"\n\n[{len(picked)} of {len(chunks)} sections shown ({hint}, ~{estimate_tokens(text)} tokens)]"
+    return text
+
+
+async def _fetch_text(url: str, query: str, budget_tokens: int) -> str:
     try:
-        with httpx.Client(follow_redirects=True, timeout=15) as client:
-            resp = client.get(url, headers={"User-Agent": "Mozilla/5.0"})
-            resp.raise_for_status()
+        html = await _get_html(url)
     except httpx.HTTPStatusError as e:
         return f"Error: {e.response.status_code} {e.response.reason_phrase} for {url}"
     except httpx.RequestError as e:
         return f"Error: failed to fetch {url}: {e}"
-    soup = BeautifulSoup(resp.text, "html.parser")
-    for tag in soup(["script", "style", "nav", "footer", "header"]):
-        tag.decompose()
-    return soup.get_text(separator="\n", strip=True)[:8000]
+    return await asyncio.to_thread(_extract, html, query, budget_tokens)
+
+
+@mcp.tool()
+async def fetch_page(url: str, query: str = "") -> str:
+    """Fetch the main text of a web page. Pass query (what you are looking for) to get only
+    the most relevant sections; without it the beginning of the article is returned."""
+    return await _fetch_text(url, query, PAGE_TOKENS)
+
+
+@mcp.tool()
+async def fetch_pages(urls: list[str] | str, query: str = "") -> str:
+    """Fetch several web pages concurrently in ONE call (use instead of calling fetch_page per URL).
+    urls: list of URLs (or comma-separated string). query: what you are looking for (recommended)."""
+    if isinstance(urls, str):
+        urls = [u.strip() for u in urls.split(",") if u.strip()]
+    urls = list(dict.fromkeys(urls))   # drop duplicates, keep order
+    if not urls:
+        return "Error: no URLs given."
+    per_page = max(100, 2 * PAGE_TOKENS // len(urls))
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def _one(url: str) -> str:
+        async with sem:
+            return await _fetch_text(url, query, per_page)
+
+    texts = await asyncio.gather(*(_one(u) for u in urls))
+    return "\n\n".join(f"=== {u} ===\n{t}" for u, t in zip(urls, texts))
 
 
 if __name__ == "__main__":
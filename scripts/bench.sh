@@ -185,7 +185,7 @@ with open(sys.argv[1], encoding="utf-8") as f:
 
 stats = collections.defaultdict(lambda: {
     "tca": [], "err_rate": [], "step_cr": [],
-    "replans": [], "turns": [], "elapsed": [], "count": 0
+    "replans": [], "retries": [], "turns": [], "elapsed": [], "count": 0
 })
 for r in records:
     m = r.get("model", "unknown")
@@ -193,6 +193,7 @@ for r in records:
     stats[m]["err_rate"].append(r.get("error_rate", 0))
     stats[m]["step_cr"].append(r.get("step_completion_rate"))  # may be None (react mode)
     stats[m]["replans"].append(r.get("replan_count", 0))
+    stats[m]["retries"].append(r.get("retry_calls", 0))
     stats[m]["turns"].append(r.get("total_turns", 0))
     stats[m]["elapsed"].append(r.get("elapsed_sec", 0))
     stats[m]["count"] += 1
@@ -203,15 +204,15 @@ avg_nullable = lambda lst: (lambda v: round(v, 3) if v is not None else None)(
 )
 
 print(f"\n{'Model':<20} {'Runs':>4} {'StepCR':>7} {'TCA':>6} "
-      f"{'ErrRate':>8} {'Replans':>8} {'AvgTurns':>9} {'AvgSec':>8}")
-print("-" * 80)
+      f"{'ErrRate':>8} {'Replans':>8} {'Retries':>8} {'AvgTurns':>9} {'AvgSec':>8}")
+print("-" * 89)
 for model, d in sorted(stats.items()):
     scr = avg_nullable(d['step_cr'])
     scr_str = f"{scr:.3f}" if scr is not None else "  N/A"
     print(f"{model:<20} {d['count']:>4} {scr_str:>7} {avg(d['tca']):>6.3f} "
-          f"{avg(d['err_rate']):>8.3f} {avg(d['replans']):>8.1f} "
+          f"{avg(d['err_rate']):>8.3f} {avg(d['replans']):>8.1f} {avg(d['retries']):>8.1f} "
           f"{avg(d['turns']):>9.1f} {avg(d['elapsed']):>8.0f}")
-print("=" * 80)
+print("=" * 89)
 PYEOF
 )
     echo "$SUMMARY" | tee -a "$RESULTS_FILE"